@@ -0,0 +1,71 @@
+"""add booking slot range
+
+Revision ID: 3c6d9e0b74a1
+Revises: e5b18f3c2a07
+Create Date: 2026-10-17 14:41:09.552731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3c6d9e0b74a1'
+down_revision: Union[str, Sequence[str], None] = 'e5b18f3c2a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('bookings', sa.Column('slot_start', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('bookings', sa.Column('slot_end', sa.DateTime(timezone=True), nullable=True))
+
+    # Local date/time in the business timezone -> UTC instant. Bookings from
+    # before multi-business rows carry no business_id: use the active one.
+    # Rows whose strings don't parse stay NULL.
+    op.execute("""
+        UPDATE bookings AS b
+        SET slot_start = (b.date || ' ' || b.time)::timestamp AT TIME ZONE biz.timezone,
+            slot_end = (b.date || ' ' || b.time)::timestamp AT TIME ZONE biz.timezone
+                       + biz.slot_duration_minutes * interval '1 minute'
+        FROM businesses AS biz
+        WHERE biz.id = COALESCE(
+                b.business_id,
+                (SELECT id FROM businesses WHERE is_active ORDER BY created_at LIMIT 1)
+              )
+          AND b.date ~ '^\\d{4}-\\d{2}-\\d{2}$'
+          AND b.time ~ '^\\d{2}:\\d{2}$'
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bookings_confirmed_slot_start', 'bookings', ['slot_start'],
+            unique=False, postgresql_where=sa.text("status = 'CONFIRMED'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_bookings_active_slot_start', 'bookings', ['business_id', 'slot_start'],
+            unique=False, postgresql_where=sa.text("status IN ('PENDING', 'CONFIRMED')"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # The reminder job was its only user
+        op.drop_index(
+            'ix_bookings_status_date', table_name='bookings',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bookings_status_date', 'bookings', ['status', 'date'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index('ix_bookings_active_slot_start', table_name='bookings', postgresql_concurrently=True)
+        op.drop_index('ix_bookings_confirmed_slot_start', table_name='bookings', postgresql_concurrently=True)
+
+    op.drop_column('bookings', 'slot_end')
+    op.drop_column('bookings', 'slot_start')
@@ -0,0 +1,39 @@
+"""add llm result cache
+
+Revision ID: 4b7e2a91c0d3
+Revises: c8bbde018466
+Create Date: 2026-10-16 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e2a91c0d3'
+down_revision: Union[str, Sequence[str], None] = 'c8bbde018466'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('llm_result_cache',
+    sa.Column('cache_key', sa.String(), nullable=False),
+    sa.Column('prompt_hash', sa.String(), nullable=False),
+    sa.Column('model_version', sa.String(), nullable=True),
+    sa.Column('intent', sa.String(), nullable=True),
+    sa.Column('result_json', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_llm_result_cache_expires_at'), 'llm_result_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_llm_result_cache_expires_at'), table_name='llm_result_cache')
+    op.drop_table('llm_result_cache')
@@ -0,0 +1,61 @@
+"""typed session failure counters
+
+Revision ID: 7d3f0c9a61b2
+Revises: 4b7e2a91c0d3
+Create Date: 2026-10-17 10:04:18.226915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3f0c9a61b2'
+down_revision: Union[str, Sequence[str], None] = '4b7e2a91c0d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # fail_count was str(int); handoff_offered held "0"/"1" and, after a
+    # reset, "false" — anything unparseable counts as 0 / not offered.
+    op.alter_column(
+        'sessions', 'fail_count',
+        existing_type=sa.String(),
+        type_=sa.Integer(),
+        postgresql_using="CASE WHEN fail_count ~ '^[0-9]+$' THEN fail_count::integer ELSE 0 END",
+        server_default='0',
+    )
+    op.alter_column(
+        'sessions', 'handoff_offered',
+        existing_type=sa.String(),
+        type_=sa.Boolean(),
+        postgresql_using="COALESCE(lower(handoff_offered) IN ('1', 'true', 't'), false)",
+        server_default=sa.false(),
+    )
+    op.execute("UPDATE sessions SET fail_count = 0 WHERE fail_count IS NULL")
+    op.execute("UPDATE sessions SET handoff_offered = false WHERE handoff_offered IS NULL")
+    op.alter_column('sessions', 'fail_count', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('sessions', 'handoff_offered', existing_type=sa.Boolean(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'sessions', 'handoff_offered',
+        existing_type=sa.Boolean(),
+        type_=sa.String(),
+        postgresql_using="CASE WHEN handoff_offered THEN '1' ELSE '0' END",
+        server_default=None,
+        nullable=True,
+    )
+    op.alter_column(
+        'sessions', 'fail_count',
+        existing_type=sa.Integer(),
+        type_=sa.String(),
+        postgresql_using="fail_count::text",
+        server_default=None,
+        nullable=True,
+    )
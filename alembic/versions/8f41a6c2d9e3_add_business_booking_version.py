@@ -0,0 +1,45 @@
+"""add business booking version
+
+Revision ID: 8f41a6c2d9e3
+Revises: 3c6d9e0b74a1
+Create Date: 2026-10-17 16:08:55.301846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41a6c2d9e3'
+down_revision: Union[str, Sequence[str], None] = '3c6d9e0b74a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'businesses',
+        sa.Column('booking_version', sa.Integer(), server_default='0', nullable=False),
+    )
+
+    # Availability is now loaded per business: ux_bookings_active_slot
+    # (business_id, date, time) serves it, nothing queries (date, time) alone
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_bookings_active_slot', table_name='bookings',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bookings_active_slot', 'bookings', ['date', 'time'],
+            unique=False, postgresql_where=sa.text("status IN ('PENDING', 'CONFIRMED')"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+    op.drop_column('businesses', 'booking_version')
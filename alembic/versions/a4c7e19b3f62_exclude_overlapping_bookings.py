@@ -0,0 +1,57 @@
+"""exclude overlapping active bookings
+
+Revision ID: a4c7e19b3f62
+Revises: f3a81c5e9d20
+Create Date: 2026-10-17 22:41:09.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e19b3f62'
+down_revision: Union[str, Sequence[str], None] = 'f3a81c5e9d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Bookings without a business (before multi-tenancy) share one
+NO_BUSINESS = "'00000000-0000-0000-0000-000000000000'::uuid"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # The advisory-locked overlap check only covered writers that took the
+    # lock. Same rule as the unique index: keep CONFIRMED (else oldest)
+    # bookings and expire PENDING holds overlapping them; overlapping
+    # CONFIRMED bookings need a human and make the constraint fail loudly.
+    op.execute(f"""
+        UPDATE bookings b SET status = 'EXPIRED'
+        WHERE b.status = 'PENDING'
+          AND EXISTS (
+            SELECT 1 FROM bookings o
+            WHERE o.id <> b.id
+              AND o.status IN ('PENDING', 'CONFIRMED')
+              AND coalesce(o.business_id, {NO_BUSINESS}) = coalesce(b.business_id, {NO_BUSINESS})
+              AND o.slot_start < b.slot_end
+              AND o.slot_end > b.slot_start
+              AND (o.status = 'CONFIRMED' OR (o.created_at, o.id) < (b.created_at, b.id))
+          )
+    """)
+
+    op.execute(f"""
+        ALTER TABLE bookings ADD CONSTRAINT ex_bookings_active_overlap
+        EXCLUDE USING gist (
+            (coalesce(business_id, {NO_BUSINESS})) WITH =,
+            tstzrange(slot_start, slot_end) WITH &&
+        )
+        WHERE (status IN ('PENDING', 'CONFIRMED') AND slot_start IS NOT NULL AND slot_end IS NOT NULL)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ex_bookings_active_overlap', 'bookings', type_='exclude')
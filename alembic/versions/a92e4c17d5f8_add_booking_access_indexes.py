@@ -0,0 +1,57 @@
+"""add booking access indexes
+
+Revision ID: a92e4c17d5f8
+Revises: 7d3f0c9a61b2
+Create Date: 2026-10-17 11:26:53.718402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a92e4c17d5f8'
+down_revision: Union[str, Sequence[str], None] = '7d3f0c9a61b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_STATUSES = sa.text("status IN ('PENDING', 'CONFIRMED')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY: bookings is large and written on every confirmation —
+    # don't hold a write lock while the indexes build.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bookings_phone_status_created', 'bookings',
+            ['phone_number', 'status', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_bookings_active_slot', 'bookings', ['date', 'time'],
+            unique=False, postgresql_where=ACTIVE_STATUSES,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_bookings_status_date', 'bookings', ['status', 'date'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Leading column of ix_bookings_phone_status_created
+        op.drop_index(
+            'ix_bookings_phone_number', table_name='bookings',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bookings_phone_number', 'bookings', ['phone_number'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index('ix_bookings_status_date', table_name='bookings', postgresql_concurrently=True)
+        op.drop_index('ix_bookings_active_slot', table_name='bookings', postgresql_concurrently=True)
+        op.drop_index('ix_bookings_phone_status_created', table_name='bookings', postgresql_concurrently=True)
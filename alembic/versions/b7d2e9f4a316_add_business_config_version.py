@@ -0,0 +1,56 @@
+"""add business config version
+
+Revision ID: b7d2e9f4a316
+Revises: 8f41a6c2d9e3
+Create Date: 2026-10-17 18:42:10.527319
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e9f4a316'
+down_revision: Union[str, Sequence[str], None] = '8f41a6c2d9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'businesses',
+        sa.Column('config_version', sa.Integer(), server_default='0', nullable=False),
+    )
+
+    # Any change to the business's configuration — including hand-written
+    # SQL — bumps config_version, which invalidates cached configs.
+    # booking_version churns with every booking and doesn't count.
+    op.execute(
+        """
+        CREATE FUNCTION bump_business_config_version() RETURNS trigger AS $$
+        BEGIN
+            IF to_jsonb(NEW) - 'booking_version' - 'config_version'
+               IS DISTINCT FROM to_jsonb(OLD) - 'booking_version' - 'config_version' THEN
+                NEW.config_version := OLD.config_version + 1;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER businesses_config_version
+        BEFORE UPDATE ON businesses
+        FOR EACH ROW EXECUTE FUNCTION bump_business_config_version()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS businesses_config_version ON businesses")
+    op.execute("DROP FUNCTION IF EXISTS bump_business_config_version()")
+    op.drop_column('businesses', 'config_version')
@@ -0,0 +1,59 @@
+"""tenant scoped sessions
+
+Revision ID: d5a0c8e31f47
+Revises: b7d2e9f4a316
+Create Date: 2026-10-17 19:27:43.918205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a0c8e31f47'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e9f4a316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows from the single-salon days belong to the salon that was active then
+ACTIVE_BUSINESS = "(SELECT id FROM businesses WHERE is_active ORDER BY created_at LIMIT 1)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Inbound routing: WhatsApp phone_number_id / Twilio "To" -> business
+    op.add_column('businesses', sa.Column('whatsapp_phone_number_id', sa.String(), nullable=True))
+    op.add_column('businesses', sa.Column('sms_number', sa.String(), nullable=True))
+    op.create_index(
+        'ix_businesses_whatsapp_phone_number_id', 'businesses', ['whatsapp_phone_number_id'], unique=True,
+    )
+    op.create_index('ix_businesses_sms_number', 'businesses', ['sms_number'], unique=True)
+
+    op.execute(f"UPDATE sessions SET business_id = {ACTIVE_BUSINESS} WHERE business_id IS NULL")
+    op.execute(f"UPDATE bookings SET business_id = {ACTIVE_BUSINESS} WHERE business_id IS NULL")
+    op.execute("DELETE FROM sessions WHERE business_id IS NULL")  # no business at all: nothing to keep
+
+    # The same phone can now talk to several salons: one session per (business, phone)
+    op.alter_column('sessions', 'business_id', existing_type=sa.UUID(), nullable=False)
+    op.drop_constraint('sessions_pkey', 'sessions', type_='primary')
+    op.create_primary_key('sessions_pkey', 'sessions', ['business_id', 'session_id'])
+
+    op.drop_constraint('conversation_sessions_pkey', 'conversation_sessions', type_='primary')
+    op.create_primary_key('conversation_sessions_pkey', 'conversation_sessions', ['business_id', 'session_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fails if a phone has sessions with more than one business
+    op.drop_constraint('conversation_sessions_pkey', 'conversation_sessions', type_='primary')
+    op.create_primary_key('conversation_sessions_pkey', 'conversation_sessions', ['session_id'])
+
+    op.drop_constraint('sessions_pkey', 'sessions', type_='primary')
+    op.create_primary_key('sessions_pkey', 'sessions', ['session_id'])
+    op.alter_column('sessions', 'business_id', existing_type=sa.UUID(), nullable=True)
+
+    op.drop_index('ix_businesses_sms_number', table_name='businesses')
+    op.drop_index('ix_businesses_whatsapp_phone_number_id', table_name='businesses')
+    op.drop_column('businesses', 'sms_number')
+    op.drop_column('businesses', 'whatsapp_phone_number_id')
@@ -0,0 +1,54 @@
+"""unique active booking slot
+
+Revision ID: e5b18f3c2a07
+Revises: a92e4c17d5f8
+Create Date: 2026-10-17 13:02:37.914265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b18f3c2a07'
+down_revision: Union[str, Sequence[str], None] = 'a92e4c17d5f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_STATUSES = sa.text("status IN ('PENDING', 'CONFIRMED')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Check-then-insert let concurrent customers hold the same slot. Keep the
+    # CONFIRMED (else oldest) booking per slot and expire the extra PENDING
+    # holds; two CONFIRMED bookings in one slot need a human and make the
+    # index build fail loudly.
+    op.execute("""
+        UPDATE bookings SET status = 'EXPIRED'
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, status, row_number() OVER (
+                    PARTITION BY business_id, date, time
+                    ORDER BY status = 'CONFIRMED' DESC, created_at
+                ) AS rank
+                FROM bookings
+                WHERE status IN ('PENDING', 'CONFIRMED')
+            ) ranked
+            WHERE rank > 1 AND status = 'PENDING'
+        )
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ux_bookings_active_slot', 'bookings', ['business_id', 'date', 'time'],
+            unique=True, postgresql_where=ACTIVE_STATUSES,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_bookings_active_slot', table_name='bookings', postgresql_concurrently=True)
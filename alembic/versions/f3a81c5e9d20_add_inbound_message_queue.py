@@ -0,0 +1,59 @@
+"""add inbound message queue
+
+Revision ID: f3a81c5e9d20
+Revises: d5a0c8e31f47
+Create Date: 2026-10-17 20:14:52.603117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a81c5e9d20'
+down_revision: Union[str, Sequence[str], None] = 'd5a0c8e31f47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inbound_messages',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('channel', sa.String(), nullable=False),
+    sa.Column('business_id', sa.UUID(), nullable=False),
+    sa.Column('session_id', sa.String(), nullable=False),
+    sa.Column('message_id', sa.String(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('reply_from', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('reply_text', sa.Text(), nullable=True),
+    sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['business_id'], ['businesses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ux_inbound_messages_channel_message', 'inbound_messages', ['channel', 'message_id'], unique=True,
+    )
+    op.create_index(
+        'ix_inbound_messages_pending', 'inbound_messages', ['business_id', 'session_id', 'id'],
+        postgresql_where=sa.text("status IN ('queued', 'processing')"),
+    )
+    op.create_index(
+        'ix_inbound_messages_done_processed_at', 'inbound_messages', ['processed_at'],
+        postgresql_where=sa.text("status = 'done'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inbound_messages_done_processed_at', table_name='inbound_messages')
+    op.drop_index('ix_inbound_messages_pending', table_name='inbound_messages')
+    op.drop_index('ux_inbound_messages_channel_message', table_name='inbound_messages')
+    op.drop_table('inbound_messages')
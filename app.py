@@ -1,11 +1,13 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, Header
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, Request, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+import hashlib
 import json
 import os
 import requests
 import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 from database import engine
 from models import Base
@@ -22,15 +24,24 @@ from services.calendar_service import (
 )
 from services.booking_service import (
     booking_to_event_times,
+    list_open_slots,
+    service_duration,
 )
+from services.availability_index import availability_index
+from services.llm_output_parser import canonical_service
 import stripe
 from channels.whatsapp import router as whatsapp_router
 from channels.sms import router as sms_router
 from apscheduler.schedulers.background import BackgroundScheduler
 from services.reminder_service import run_reminder_job
+from services.llm_cache import purge_expired_llm_cache
+from services.inbound_queue import inbound_workers, purge_processed_inbound_messages
+from services.engine_pool import EngineBusy
 from channels.whatsapp import send_whatsapp_message
-from services.business_loader import build_business_info
+from services.business_loader import business_config_cache
 from services.stripe_checkout import create_checkout_session_for_booking
+from services import metrics
+from prompts import system_prompt_stats
 load_dotenv()
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
@@ -109,22 +120,129 @@ class Message(BaseModel):
     session_id: str
     text: str
     message_id: str | None = None
+    business_id: uuid.UUID | None = None   # widget of one salon; default: the active business
 
 # =========================================================
 # CHAT ENDPOINT (UNCHANGED LOGIC)
 # =========================================================
 @app.post("/chat")
 def chat(msg: Message, db: Session = Depends(get_db)):
-    business_info = build_business_info(db)
-    return handle_message(
-        session_id=msg.session_id,
-        user_text=msg.text,
-        message_id=msg.message_id,
-        channel="web",
-        db=db,
-        business_info=business_info,
-        calendar_service=calendar_service,
-        GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
+    # business_info comes from the config cache, refreshed by the turn itself
+    try:
+        return handle_message(
+            session_id=msg.session_id,
+            user_text=msg.text,
+            message_id=msg.message_id,
+            channel="web",
+            db=db,
+            calendar_service=calendar_service,
+            GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
+            business_id=msg.business_id,
+        )
+    except EngineBusy:
+        raise HTTPException(status_code=503, detail="Too many messages, try again shortly", headers={"Retry-After": "1"})
+
+# =========================================================
+# AVAILABILITY (website widget / owner dashboard)
+# =========================================================
+AVAILABILITY_DEFAULT_DAYS = 14
+AVAILABILITY_MAX_DAYS = 62
+
+def availability_etag(business_info: dict, booking_version: int, local_now: datetime, *parts) -> str:
+    """
+    Changes when a booking takes/frees a slot, the business config changes,
+    or a slot boundary passes (past slots drop out of today).
+    """
+    slot_minutes = business_info["slot_duration_minutes"]
+    minute_of_day = local_now.hour * 60 + local_now.minute
+    key = json.dumps([
+        business_info["id"],
+        booking_version,
+        local_now.date().isoformat(),
+        minute_of_day // slot_minutes,
+        business_info["business_hours"],
+        slot_minutes,
+        business_info["same_day_cutoff"],
+        business_info["service_durations"],
+        *parts,
+    ], sort_keys=True, default=str)
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+@app.get("/availability")
+def availability(
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    service: str | None = None,
+    business_id: uuid.UUID | None = None,
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    # Cached config: the business row itself comes back with the bookings below
+    config = business_config_cache.get(db, business_id) if business_id is not None else business_config_cache.active(db)
+    if config is None:
+        if business_id is not None:
+            raise HTTPException(status_code=404, detail="Unknown business")
+        raise HTTPException(status_code=503, detail="No active business")
+
+    business_info = config.info
+    local_now = datetime.now(ZoneInfo(business_info["timezone"]))
+
+    try:
+        start = date.fromisoformat(date_from) if date_from else local_now.date()
+        end = date.fromisoformat(date_to) if date_to else start + timedelta(days=AVAILABILITY_DEFAULT_DAYS - 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from/to must be YYYY-MM-DD")
+
+    if end < start:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    if (end - start).days + 1 > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {AVAILABILITY_MAX_DAYS} days per request")
+
+    dates = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    business, days = availability_index.current_days(db, business_info, dates)
+
+    if business is None or not business.is_active:
+        business_config_cache.reload(config.id)
+        if business_id is not None:
+            raise HTTPException(status_code=404, detail="Unknown business")
+        raise HTTPException(status_code=503, detail="No active business")
+
+    if business.config_version != config.version:
+        # Edited in another process: reload (hours and durations change the slots)
+        business_config_cache.reload(config.id)
+        config = business_config_cache.get(db, config.id)
+        business_info = config.info
+        local_now = datetime.now(ZoneInfo(business_info["timezone"]))
+        business, days = availability_index.current_days(db, business_info, dates)
+
+    if service is not None:
+        service = canonical_service(service, business_info["services"])
+        if service is None:
+            raise HTTPException(status_code=404, detail="Unknown service")
+
+    etag = availability_etag(business_info, business.booking_version, local_now, start, end, service)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        metrics.incr("availability.not_modified")
+        return Response(status_code=304, headers=headers)
+
+    open_slots = list_open_slots(db, business_info, dates, local_now, service, days)
+
+    metrics.incr("availability.computed")
+
+    return JSONResponse(
+        {
+            "business": business_info["name"],
+            "timezone": business_info["timezone"],
+            "service": service,
+            "slot_duration_minutes": business_info["slot_duration_minutes"],
+            "duration_minutes": service_duration(business_info, service),
+            "from": dates[0],
+            "to": dates[-1],
+            "days": [{"date": d, "slots": open_slots[d]} for d in dates],
+        },
+        headers=headers,
     )
 
 # =========================================================
@@ -137,7 +255,11 @@ def create_checkout_session(booking_id: str, db: Session = Depends(get_db)):
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
-    return create_checkout_session_for_booking(booking,db)
+    try:
+        return create_checkout_session_for_booking(booking,db)
+    finally:
+        # Also keeps payment_last_error when Stripe fails
+        db.commit()
 
 # =========================================================
 # PAYMENTS — STRIPE WEBHOOK ENDPOINT (FINAL VERSION)
@@ -239,7 +361,10 @@ async def stripe_webhook(
         # -------------------------------------------------
         # RESET FSM SESSION STATE
         # -------------------------------------------------
+        business_info = business_config_cache.get(db, booking.business_id).info
+
         session = db.query(Session).filter(
+            Session.business_id == booking.business_id,
             Session.session_id == booking.phone_number
         ).first()
 
@@ -265,18 +390,14 @@ async def stripe_webhook(
         # -------------------------------------------------
         try:
 
-            business = db.query(Business).filter(
-                Business.id == booking.business_id
-            ).first()
-
             start_iso, end_iso = booking_to_event_times(
                 booking.date,
                 booking.time,
-                business.slot_duration_minutes,
-                business.timezone
+                service_duration(business_info, booking.service),
+                business_info["timezone"]
             )
 
-            event_title = f"{business.name} - {booking.service}"
+            event_title = f"{business_info['name']} - {booking.service}"
 
             event_id = create_calendar_event(
                 service=calendar_service,
@@ -284,7 +405,7 @@ async def stripe_webhook(
                 title=event_title,
                 start_iso=start_iso,
                 end_iso=end_iso,
-                timezone=business.timezone
+                timezone=business_info["timezone"]
             )
 
             booking.calendar_event_id = event_id
@@ -323,7 +444,8 @@ async def stripe_webhook(
             )
             send_whatsapp_message(
                 phone=booking.phone_number,
-                text=confirmation_message
+                text=confirmation_message,
+                phone_number_id=business_info["whatsapp_phone_number_id"]
             )
 
             print(f"✅ Confirmation message sent to {booking.phone_number}")
@@ -348,7 +470,8 @@ def payment_status(booking_id: str, db: Session = Depends(get_db)):
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     now = datetime.now(timezone.utc)
-    expire_payment_if_needed(booking, db, now)
+    if expire_payment_if_needed(booking, db, now):
+        db.commit()
     return {
         "booking_id": booking.id,
         "booking_status": booking.status,
@@ -359,6 +482,15 @@ def payment_status(booking_id: str, db: Session = Depends(get_db)):
         "paid_at": booking.paid_at,
     }
 
+# =========================================================
+# ENGINE METRICS
+# =========================================================
+metrics.register("system_prompt", system_prompt_stats)
+
+@app.get("/metrics")
+def engine_metrics():
+    return metrics.snapshot()
+
 # =========================================================
 # WHATSAPP
 # =========================================================
@@ -375,4 +507,17 @@ scheduler = BackgroundScheduler()
 def start_scheduler():
     if not scheduler.running:
         scheduler.add_job(run_reminder_job, "interval", seconds=45)
+        scheduler.add_job(purge_expired_llm_cache, "interval", minutes=30)
+        scheduler.add_job(purge_processed_inbound_messages, "interval", minutes=30)
         scheduler.start()
+
+# =========================================================
+# INBOUND QUEUE WORKERS (WhatsApp turns + replies)
+# =========================================================
+@app.on_event("startup")
+def start_inbound_workers():
+    inbound_workers.start()
+
+@app.on_event("shutdown")
+def stop_inbound_workers():
+    inbound_workers.stop()
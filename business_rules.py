@@ -55,11 +55,18 @@ def validate_booking(date_str: str, time_str: str, business_info: dict):
     (is_valid: bool, invalid_slot: "date"|"time"|None, error_msg: str|None)
     """
 
-    # Parse business rules config
-    business_hours = business_info.get("business_hours", {})
-    start_time = parse_time(business_hours.get("start", "09:00"))
-    end_time = parse_time(business_hours.get("end", "19:00"))
-    same_day_cutoff = parse_time(business_info.get("same_day_cutoff", "17:00"))
+    # Parse business rules config (pre-parsed when it comes from the config cache)
+    if "opens_at" in business_info:
+        start_time = business_info["opens_at"]
+        end_time = business_info["closes_at"]
+        same_day_cutoff = business_info["same_day_cutoff_at"]
+        tz = business_info["tzinfo"]
+    else:
+        business_hours = business_info.get("business_hours", {})
+        start_time = parse_time(business_hours.get("start", "09:00"))
+        end_time = parse_time(business_hours.get("end", "19:00"))
+        same_day_cutoff = parse_time(business_info.get("same_day_cutoff", "17:00"))
+        tz = ZoneInfo(business_info.get("timezone", "America/New_York"))
 
     # Parse booking date/time
     try:
@@ -72,7 +79,6 @@ def validate_booking(date_str: str, time_str: str, business_info: dict):
     except Exception:
         return False, "time", "That time doesn’t look valid. Please share a time like 3 PM or 15:30."
 
-    tz = ZoneInfo(business_info.get("timezone", "America/New_York"))
     now_local = datetime.now(tz)
     today_local = now_local.date()
 
@@ -81,7 +87,7 @@ def validate_booking(date_str: str, time_str: str, business_info: dict):
         return False, "date", "That date is in the past. Please choose a future date."
 
     # Same-day cutoff check
-    if booking_date == today_local and booking_time < same_day_cutoff:
+    if same_day_cutoff and booking_date == today_local and booking_time < same_day_cutoff:
         return False, "time", f"Same-day bookings are available only after {same_day_cutoff.strftime('%H:%M')}."
 
     # Business hours check
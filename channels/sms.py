@@ -3,38 +3,60 @@ from fastapi import APIRouter, Request
 from fastapi.responses import PlainTextResponse
 from twilio.twiml.messaging_response import MessagingResponse
 from database import SessionLocal
-from services.conversation_engine import handle_message
+from services.conversation_engine import handle_message_async
 from twilio.rest import Client
-from services.business_loader import build_business_info
+from services.message_coalescer import message_coalescer
+from services.business_loader import business_config_cache
+from services.engine_pool import EngineBusy, engine_pool
 
 router = APIRouter()
 
+def route_business(to_number: str | None):
+    with SessionLocal() as db:
+        return business_config_cache.route(db, "sms", to_number)
+
 @router.post("/sms/webhook")
 async def sms_webhook(request: Request):
 
     form = await request.form()
 
     phone = form.get("From")
+    to_number = form.get("To")
     text = form.get("Body")
     message_id = form.get("MessageSid")
 
-    print(f"[SMS_INCOMING] {phone}: {text}")
+    print(f"[SMS_INCOMING] {phone} -> {to_number}: {text}")
+
+    business = await engine_pool.run(route_business, to_number)
+
+    if business is None:
+        print(f"[SMS_UNROUTED] no business for {to_number}")
+        return PlainTextResponse(str(MessagingResponse()), media_type="application/xml")
+
+    # Burst follower: merged into the leader's turn, which sends the one reply
+    burst = await message_coalescer.collect(f"{business.id}:{phone}", text, message_id)
+    if burst is None:
+        return PlainTextResponse(str(MessagingResponse()), media_type="application/xml")
 
     db = SessionLocal()
     from app import calendar_service, GOOGLE_CALENDAR_ID
-    business_info = build_business_info(db)
-    response = handle_message(
-        session_id=phone,
-        user_text=text,
-        message_id=message_id,
-        channel="sms",
-        db=db,
-        business_info=business_info,
-        calendar_service=calendar_service,
-        GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
-    )
-
-    db.close()
+    try:
+        response = await handle_message_async(
+            session_id=phone,
+            user_text=burst.text,
+            message_id=burst.message_id,
+            channel="sms",
+            db=db,
+            calendar_service=calendar_service,
+            GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
+            coalesced_message_ids=burst.coalesced_message_ids,
+            business_id=business.id,
+        )
+    except EngineBusy:
+        # Twilio doesn't redeliver; tell the customer instead of dropping it silently
+        response = {"reply": "We're getting a lot of messages right now. Please send that again in a minute."}
+    finally:
+        await engine_pool.run(db.close)
 
     reply_text = response.get("reply") or ""
 
@@ -45,7 +67,7 @@ async def sms_webhook(request: Request):
     return PlainTextResponse(str(twiml), media_type="application/xml")
 
 
-def send_sms_message(phone: str, text: str):
+def send_sms_message(phone: str, text: str, from_number: str | None = None):
     client = Client(
         os.getenv("TWILIO_ACCOUNT_SID"),
         os.getenv("TWILIO_AUTH_TOKEN")
@@ -53,6 +75,6 @@ def send_sms_message(phone: str, text: str):
 
     client.messages.create(
         body=text,
-        from_=os.getenv("TWILIO_PHONE_NUMBER"),
+        from_=from_number or os.getenv("TWILIO_PHONE_NUMBER"),
         to=phone
     )
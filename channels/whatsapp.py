@@ -1,20 +1,40 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from fastapi import APIRouter, Request
 from fastapi.responses import PlainTextResponse
 from database import SessionLocal
-from services.conversation_engine import handle_message
-from services.business_loader import build_business_info
+from services.business_loader import business_config_cache
+from services.inbound_queue import enqueue_messages
 
 router = APIRouter()
 
 VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "make_webhook_verify")
 
-def send_whatsapp_message(phone: str, text: str):
+# The fast ack's DB work (routing miss, enqueue) gets its own threads: on the
+# engine pool it would queue behind running turns and Meta would redeliver
+WHATSAPP_ACK_THREADS = int(os.getenv("WHATSAPP_ACK_THREADS", "4"))
+ack_executor = ThreadPoolExecutor(max_workers=WHATSAPP_ACK_THREADS, thread_name_prefix="whatsapp-ack")
+
+async def run_ack_step(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(ack_executor, fn, *args)
+
+def route_business(phone_number_id: str | None):
+    with SessionLocal() as db:
+        return business_config_cache.route(db, "whatsapp", phone_number_id)
+
+def send_whatsapp_message(phone: str, text: str, phone_number_id: str | None = None) -> bool:
+    """
+    False when the Graph API rejects the message (the inbound queue retries).
+    """
     if not text:
-        return
+        return True
 
-    url = f"https://graph.facebook.com/v18.0/{os.getenv('WHATSAPP_PHONE_NUMBER_ID')}/messages"
+    # Reply from the business's own number
+    phone_number_id = phone_number_id or os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+    url = f"https://graph.facebook.com/v18.0/{phone_number_id}/messages"
 
     headers = {
         "Authorization": f"Bearer {os.getenv('WHATSAPP_ACCESS_TOKEN')}",
@@ -28,12 +48,15 @@ def send_whatsapp_message(phone: str, text: str):
         "text": {"body": text}
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    # Runs on inbound queue workers; don't let a hung Graph API call hold one
+    response = requests.post(url, headers=headers, json=payload, timeout=10)
 
     if response.status_code != 200:
         print("❌ WhatsApp send failed:", response.text)
-    else:
-        print("✅ WhatsApp message sent")
+        return False
+
+    print("✅ WhatsApp message sent")
+    return True
 
 # =========================================================
 # WHATSAPP WEBHOOK — VERIFICATION (GET)
@@ -55,9 +78,13 @@ async def verify_whatsapp_webhook(request: Request):
 # =========================================================
 @router.post("/whatsapp/webhook")
 async def whatsapp_webhook(request: Request):
-
+    """
+    Validate, enqueue, ack. Meta redelivers anything not acked quickly,
+    so the turn and the reply happen on the inbound queue workers.
+    """
     payload = await request.json()
 
+    messages = []
     try:
         for entry in payload.get("entry", []):
             for change in entry.get("changes", []):
@@ -66,42 +93,45 @@ async def whatsapp_webhook(request: Request):
                 if "messages" not in value:
                     continue
 
+                phone_number_id = value.get("metadata", {}).get("phone_number_id")
+                business = await run_ack_step(route_business, phone_number_id)
+
+                if business is None:
+                    print(f"[WHATSAPP_UNROUTED] no business for phone_number_id={phone_number_id}")
+                    continue
+
                 for message in value["messages"]:
 
                     if message.get("type") != "text":
                         continue
 
-                    phone = message["from"]
-                    text = message["text"]["body"]
-                    message_id = message["id"]
+                    try:
+                        phone = message["from"]
+                        text = message["text"]["body"]
+                        message_id = message["id"]
+                    except (KeyError, TypeError) as e:
+                        # One malformed message doesn't cost the rest of the batch
+                        print(f"[WHATSAPP_MALFORMED] skipping message: missing {e}")
+                        continue
 
                     print(
                         f"[WHATSAPP_INCOMING] "
                         f"phone={phone} message_id={message_id} text={text}"
                     )
 
-                    with SessionLocal() as db:
-
-                        from app import calendar_service, GOOGLE_CALENDAR_ID
-
-                        business_info = build_business_info(db)
-
-                        response = handle_message(
-                            session_id=phone,
-                            user_text=text,
-                            message_id=message_id,
-                            channel="whatsapp",
-                            db=db,
-                            business_info=business_info,
-                            calendar_service=calendar_service,
-                            GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
-                        )
-
-                    reply_text = response.get("reply")
-
-                    if reply_text:
-                        send_whatsapp_message(phone, reply_text)
-    except Exception as e:
+                    messages.append({
+                        "channel": "whatsapp",
+                        "business_id": business.id,
+                        "session_id": phone,
+                        "message_id": message_id,
+                        "text": text,
+                        "reply_from": phone_number_id,
+                    })
+    except (KeyError, TypeError, AttributeError) as e:
+        # Malformed envelope: redelivering it won't help; keep what parsed before it
         print("Webhook error:", e)
 
+    # Anything else (routing, storing) fails the request: a non-200 makes Meta redeliver
+    await run_ack_step(enqueue_messages, messages)
+
     return {"status": "ok"}
@@ -1,15 +1,23 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from services.engine_pool import ENGINE_MAX_CONCURRENT_TURNS  # reads .env too
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# An engine turn holds its connection from start_turn to the finalize commit,
+# LLM round trip included (the session lock is transaction-scoped). The pool
+# therefore always covers every admitted turn, plus room for work outside
+# turns (webhook acks, availability, Stripe webhooks, reminders).
+DB_POOL_EXTRA_CONNECTIONS = int(os.getenv("DB_POOL_EXTRA_CONNECTIONS", "5"))
+
 engine = create_engine(
     DATABASE_URL,
-    pool_size=5,          # safe default for small VPS
+    pool_size=ENGINE_MAX_CONCURRENT_TURNS + DB_POOL_EXTRA_CONNECTIONS,
     max_overflow=10,      # allows burst webhook traffic
     pool_pre_ping=True,   # avoids stale connections
     pool_recycle=300,     # refresh connections every 5 mins
@@ -21,4 +29,12 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+@event.listens_for(SessionLocal, "after_commit")
+def count_commits(session):
+    # Per-session commit counter (read by the conversation logger per turn).
+    # Savepoint releases fire after_commit too; only real COMMITs count.
+    if session.in_nested_transaction():
+        return
+    session.info["commits"] = session.info.get("commits", 0) + 1
+
 Base = declarative_base()
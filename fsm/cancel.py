@@ -1,4 +1,4 @@
-from models import Booking
+from services.booking_service import find_booking
 from services.calendar_service import delete_calendar_event
 
 def handle_cancel_confirm_state(
@@ -13,6 +13,7 @@ def handle_cancel_confirm_state(
     YES_WORDS,
     NO_WORDS,
     reset_failures,
+    active_bookings,
 ):
     if session.booking_state != "CANCEL_CONFIRM":
         return None
@@ -20,13 +21,9 @@ def handle_cancel_confirm_state(
     if intent == "booking_confirm" or user_text.lower() in YES_WORDS:
 
         booking_to_cancel = (
-            db.query(Booking)
-            .filter(
-                Booking.phone_number == session_id,
-                Booking.id == session.pending_booking_id,
-                Booking.status == "CONFIRMED"
-            )
-            .first()
+            find_booking(active_bookings, "CONFIRMED", session.pending_booking_id)
+            if session.pending_booking_id
+            else None
         )
 
         if booking_to_cancel:
@@ -51,7 +48,6 @@ def handle_cancel_confirm_state(
         session.pending_booking_id = None
         session.updated_at = now
         reset_failures(session)
-        db.commit()
 
         return {
             "intent": "booking_cancelled",
@@ -63,7 +59,6 @@ def handle_cancel_confirm_state(
         session.pending_booking_id = None
         session.updated_at = now
         reset_failures(session)
-        db.commit()
 
         return {
             "intent": "cancel_aborted",
@@ -1,10 +1,8 @@
 from random import choice
 import uuid
-from sqlalchemy.exc import IntegrityError
 
-from models import Booking
 from business_rules import validate_booking
-from services.booking_service import is_slot_taken, suggest_slots_around
+from services.booking_service import create_pending_booking, suggest_slots_around
 from utils.extraction_utils import safe_extract_date, safe_extract_time
 from utils.time_utils import format_time_for_user
 
@@ -25,6 +23,7 @@ def handle_collecting_state(
     offer_handoff,
     reset_session,
     reset_failures,
+    active_bookings,
 ):
     if session.booking_state != "COLLECTING":
         return None
@@ -50,28 +49,23 @@ def handle_collecting_state(
         session.pending_time = extracted_time  # always HH:MM
 
     session.updated_at = now
-    db.commit()
     
     if data.get("service") or extracted_date or extracted_time:
         reset_failures(session)
-        db.commit()
 
     # -----------------------------
     # ASK ONLY FOR WHAT IS MISSING
     # -----------------------------
     if not session.pending_service:
         session.last_question = "service"
-        db.commit()
         return {"intent": "booking_in_progress", "reply": choice(SERVICE_QUESTIONS)}
 
     if not session.pending_date:
         session.last_question = "date"
-        db.commit()
         return {"intent": "booking_in_progress", "reply": choice(DATE_QUESTIONS)}
 
     if not session.pending_time:
         session.last_question = "time"
-        db.commit()
         return {"intent": "booking_in_progress", "reply": choice(TIME_QUESTIONS)}
 
     # -----------------------------
@@ -90,7 +84,6 @@ def handle_collecting_state(
         if should_handoff(session):
             offer_handoff(session, db, now)
             reset_session(session, now)
-            db.commit()
             return {
                 "intent": "handoff",
                 "reply": "Sorry — I’m having trouble booking that 😅 Please call +1-XXX-XXX-XXXX 📞 and we’ll book it for you."
@@ -102,7 +95,6 @@ def handle_collecting_state(
             session.pending_date = None
 
         session.updated_at = now
-        db.commit()
         if invalid_slot == "time" and session.pending_date:
             # suggest nearest valid slots on same day + tomorrow morning
             suggestions = suggest_slots_around(
@@ -110,7 +102,8 @@ def handle_collecting_state(
                 business_info=business_info,
                 date_str=session.pending_date,
                 time_hhmm="19:00",  # fallback anchor near closing
-                count=5
+                count=5,
+                service=session.pending_service,
             )
 
             same_day = suggestions.get("same_day", [])
@@ -136,19 +129,55 @@ def handle_collecting_state(
 
         return {"intent": "booking_invalid", "reply": error_msg}
     
-    # Check slot availability
-    if is_slot_taken(db, session.pending_date, session.pending_time):
+    # -----------------------------
+    # CLEANUP OLD PENDING BOOKINGS (avoid duplicates)
+    # -----------------------------
+    old_pending = [b for b in active_bookings if b.status == "PENDING"]
+
+    # The old hold is released only if the new one is taken: both in one savepoint
+    savepoint = db.begin_nested() if old_pending else None
+
+    for b in old_pending:
+        b.status = "CANCELLED"
+
+    if old_pending:
+        # Release the customer's own hold before the insert (it may be this very slot)
+        db.flush()
+
+    # -----------------------------
+    # CREATE PENDING BOOKING (the overlap constraint decides availability)
+    # -----------------------------
+    booking = create_pending_booking(
+        db,
+        business_info,
+        id=f"SALON-{str(uuid.uuid4())[:8].upper()}",
+        phone_number=session_id,
+        business_id=session.business_id,
+        service=session.pending_service,
+        date=session.pending_date,
+        time=session.pending_time,  # ALWAYS HH:MM
+        created_at=now,
+        channel=session.channel
+    )
+
+    if savepoint is not None:
+        if booking is None:
+            savepoint.rollback()    # lost the slot: the customer keeps their earlier hold
+        else:
+            savepoint.commit()
+
+    if booking is None:
         suggestions = suggest_slots_around(
             db=db,
             business_info=business_info,
             date_str=session.pending_date,
             time_hhmm=session.pending_time,
-            count=5
+            count=5,
+            service=session.pending_service,
         )
 
         session.pending_time = None
         session.updated_at = now
-        db.commit()
 
         same_day = suggestions.get("same_day", [])
         next_day = suggestions.get("next_day", [])
@@ -170,51 +199,11 @@ def handle_collecting_state(
             "reply": "\n".join(msg_lines)
         }
 
-
-    # -----------------------------
-    # CREATE PENDING BOOKING
-    # -----------------------------
-    # -----------------------------
-    # CLEANUP OLD PENDING BOOKINGS (avoid duplicates)
-    # -----------------------------
-    old_pending = (
-        db.query(Booking)
-        .filter(
-            Booking.phone_number == session_id,
-            Booking.status == "PENDING"
-        )
-        .all()
-    )
-
-    for b in old_pending:
-        b.status = "CANCELLED"
-
-    db.commit()
-
-    booking_id = f"SALON-{str(uuid.uuid4())[:8].upper()}"
-
-    booking = Booking(
-        id=booking_id,
-        phone_number=session_id,
-        business_id=session.business_id,
-        service=session.pending_service,
-        date=session.pending_date,
-        time=session.pending_time,  # ALWAYS HH:MM
-        status="PENDING",
-        created_at=now,
-        channel=session.channel
-    )
-
-    try:
-        db.add(booking)
-        db.commit()
-    except IntegrityError:
-        db.rollback()
+    active_bookings.append(booking)
 
     session.booking_state = "CONFIRMING"
     session.last_question = None
     session.updated_at = now
-    db.commit()
 
     return {
         "intent": "booking_pending",
@@ -1,6 +1,7 @@
+from fastapi import HTTPException
 from services.deposit_service import compute_deposit
 from services.calendar_service import create_calendar_event
-from services.booking_service import booking_to_event_times
+from services.booking_service import booking_to_event_times, service_duration
 from utils.extraction_utils import safe_extract_date, safe_extract_time
 from utils.time_utils import format_time_for_user
 from services.stripe_checkout import create_checkout_session_for_booking
@@ -40,22 +41,21 @@ def handle_confirming_state(
         if extracted_time:
             session.pending_time = extracted_time
 
-        # Cancel old pending booking record (avoid stale pending rows)
-        pending_booking.status = "CANCELLED"
-
         # Move back to collecting so it re-validates and re-creates pending booking
         session.booking_state = "COLLECTING"
         session.updated_at = now
-        db.commit()
 
         # After switching to COLLECTING, let app.py continue to COLLECTING block
         if not (session.pending_service and session.pending_date and session.pending_time):
+            # Cancel old pending booking record (avoid stale pending rows)
+            pending_booking.status = "CANCELLED"
             return {
                 "intent": "booking_modify",
                 "reply": "Got it — updating your booking. 👍"
             }
 
-        # If all fields already present, just fall through
+        # If all fields already present, just fall through: COLLECTING swaps the
+        # old hold for the new one, and keeps it if the new slot is gone
         return None
 
     # If we changed state to COLLECTING above, skip CONFIRMING actions
@@ -80,16 +80,32 @@ def handle_confirming_state(
                 pending_booking.payment_required = True
                 pending_booking.payment_status = "REQUIRES_PAYMENT"
 
-                db.commit()
-                # Create Stripe Checkout Session
-                result = create_checkout_session_for_booking(pending_booking,db)
+                # Create Stripe Checkout Session. A failure is answered here so the
+                # turn still commits (payment_last_error, an expired hold)
+                try:
+                    result = create_checkout_session_for_booking(pending_booking,db)
+                except HTTPException as e:
+                    session.updated_at = now
+                    if pending_booking.status != "PENDING":
+                        session.booking_state = "IDLE"
+                        session.pending_service = None
+                        session.pending_date = None
+                        session.pending_time = None
+                        session.last_question = None
+                        return {
+                            "intent": "payment_failed",
+                            "reply": f"Sorry — {e.detail[0].lower()}{e.detail[1:]}"
+                        }
+                    return {
+                        "intent": "payment_failed",
+                        "reply": "Sorry — I couldn’t create your payment link just now. Please reply YES to try again."
+                    }
 
                 checkout_url = result["checkout_url"]
 
                 session.booking_state = "PAYMENT_PENDING"
                 session.updated_at = now
 
-                db.commit()
 
                 return {
                     "intent": "payment_required",
@@ -117,7 +133,7 @@ def handle_confirming_state(
                     start_iso, end_iso = booking_to_event_times(
                         date_str=pending_booking.date,
                         time_hhmm=pending_booking.time,
-                        duration_minutes=business_info["slot_duration_minutes"],
+                        duration_minutes=service_duration(business_info, pending_booking.service),
                         timezone_name=business_info["timezone"]
                     )
 
@@ -142,7 +158,6 @@ def handle_confirming_state(
             session.last_question = None
             session.updated_at = now
             reset_failures(session)
-            db.commit()
 
             return {
                 "intent": "booking_confirmed",
@@ -168,7 +183,6 @@ def handle_confirming_state(
             session.last_question = None
             session.updated_at = now
             reset_failures(session)
-            db.commit()
 
             return {
                 "intent": "booking_cancelled",
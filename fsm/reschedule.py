@@ -2,13 +2,55 @@ from utils.extraction_utils import safe_extract_date, safe_extract_time
 from utils.time_utils import format_time_for_user
 from utils.date_utils import parse_date_us
 from services.booking_service import (
+    find_booking,
     is_slot_taken,
     suggest_slots_around,
     booking_to_event_times,
+    move_booking,
+    service_duration,
 )
 from services.calendar_service import update_calendar_event
 from business_rules import validate_booking
-from models import Booking
+
+
+def slot_unavailable_reply(db, business_info, date_str, time_hhmm, booking):
+    suggestions = suggest_slots_around(
+        db=db,
+        business_info=business_info,
+        date_str=date_str,
+        time_hhmm=time_hhmm,
+        count=5,
+        service=booking.service,
+        ignore=booking,
+    )
+
+    same_day = suggestions.get("same_day", [])
+    next_day = suggestions.get("next_day", [])
+
+    msg_lines = ["That time is already booked."]
+
+    if same_day:
+        pretty = ", ".join(
+            [format_time_for_user(x) for x in same_day]
+        )
+        msg_lines.append(
+            f"Here are some available times on the same day: {pretty}."
+        )
+
+    if next_day:
+        pretty_next = ", ".join(
+            [format_time_for_user(x) for x in next_day]
+        )
+        msg_lines.append(
+            f"If you prefer tomorrow, I can do: {pretty_next}."
+        )
+
+    msg_lines.append("Which time works for you?")
+
+    return {
+        "intent": "reschedule_unavailable",
+        "reply": "\n".join(msg_lines),
+    }
 
 
 def handle_reschedule_state(
@@ -31,6 +73,7 @@ def handle_reschedule_state(
     TIME_QUESTIONS,
     YES_WORDS,
     NO_WORDS,
+    active_bookings,
 ):
     # ==================================================
     # RESCHEDULE COLLECTING (PROPOSAL MODEL)
@@ -39,18 +82,13 @@ def handle_reschedule_state(
 
         # Load original booking
         original_booking = (
-            db.query(Booking)
-            .filter(
-                Booking.phone_number == session_id,
-                Booking.id == session.reschedule_target_booking_id,
-                Booking.status == "CONFIRMED",
-            )
-            .first()
+            find_booking(active_bookings, "CONFIRMED", session.reschedule_target_booking_id)
+            if session.reschedule_target_booking_id
+            else None
         )
 
         if not original_booking:
             reset_session(session, now)
-            db.commit()
             return {
                 "intent": "reschedule_failed",
                 "reply": "I couldn’t find that appointment anymore. Please try again.",
@@ -88,7 +126,6 @@ def handle_reschedule_state(
             }
 
         session.updated_at = now
-        db.commit()
 
         # -----------------------------
         # VALIDATE PROPOSAL
@@ -105,7 +142,6 @@ def handle_reschedule_state(
             if should_handoff(session):
                 offer_handoff(session, db, now)
                 reset_session(session, now)
-                db.commit()
                 return {
                     "intent": "handoff",
                     "reply": "Sorry — I’m having trouble rescheduling 😅 Please call +1-XXX-XXX-XXXX 📞 and we’ll help you.",
@@ -121,44 +157,15 @@ def handle_reschedule_state(
         # CHECK AVAILABILITY
         # -----------------------------
         if is_slot_taken(
-            db, session.reschedule_new_date, session.reschedule_new_time
+            db, business_info, session.reschedule_new_date, session.reschedule_new_time,
+            service=original_booking.service, ignore=original_booking,
         ):
-            suggestions = suggest_slots_around(
-                db=db,
-                business_info=business_info,
-                date_str=session.reschedule_new_date,
-                time_hhmm=session.reschedule_new_time,
-                count=5,
+            return slot_unavailable_reply(
+                db, business_info,
+                session.reschedule_new_date, session.reschedule_new_time,
+                original_booking,
             )
 
-            same_day = suggestions.get("same_day", [])
-            next_day = suggestions.get("next_day", [])
-
-            msg_lines = ["That time is already booked."]
-
-            if same_day:
-                pretty = ", ".join(
-                    [format_time_for_user(x) for x in same_day]
-                )
-                msg_lines.append(
-                    f"Here are some available times on the same day: {pretty}."
-                )
-
-            if next_day:
-                pretty_next = ", ".join(
-                    [format_time_for_user(x) for x in next_day]
-                )
-                msg_lines.append(
-                    f"If you prefer tomorrow, I can do: {pretty_next}."
-                )
-
-            msg_lines.append("Which time works for you?")
-
-            return {
-                "intent": "reschedule_unavailable",
-                "reply": "\n".join(msg_lines),
-            }
-
         # -----------------------------
         # DIFF-AWARE CONFIRMATION
         # -----------------------------
@@ -180,7 +187,6 @@ def handle_reschedule_state(
 
         session.booking_state = "RESCHEDULE_CONFIRM"
         session.updated_at = now
-        db.commit()
         reset_failures(session)
 
         return {
@@ -210,7 +216,6 @@ def handle_reschedule_state(
 
             session.booking_state = "RESCHEDULE_COLLECTING"
             session.updated_at = now
-            db.commit()
 
             # Re-run collecting logic immediately
             return handle_reschedule_state(
@@ -233,6 +238,7 @@ def handle_reschedule_state(
                 TIME_QUESTIONS=TIME_QUESTIONS,
                 YES_WORDS=YES_WORDS,
                 NO_WORDS=NO_WORDS,
+                active_bookings=active_bookings,
             )
 
         # -----------------------------
@@ -241,25 +247,35 @@ def handle_reschedule_state(
         if intent == "booking_confirm" or user_text.lower() in YES_WORDS:
 
             booking_to_update = (
-                db.query(Booking)
-                .filter(
-                    Booking.phone_number == session_id,
-                    Booking.id == session.reschedule_target_booking_id,
-                    Booking.status == "CONFIRMED",
-                )
-                .first()
+                find_booking(active_bookings, "CONFIRMED", session.reschedule_target_booking_id)
+                if session.reschedule_target_booking_id
+                else None
             )
 
             if not booking_to_update:
                 reset_session(session, now)
-                db.commit()
                 return {
                     "intent": "reschedule_failed",
                     "reply": "I couldn’t find that appointment anymore.",
                 }
 
-            booking_to_update.date = session.reschedule_new_date
-            booking_to_update.time = session.reschedule_new_time
+            # The overlap constraint is the real availability check — the
+            # slot may have been taken since the proposal was accepted.
+            if not move_booking(
+                db,
+                booking_to_update,
+                session.reschedule_new_date,
+                session.reschedule_new_time,
+                business_info,
+            ):
+                taken_date = session.reschedule_new_date
+                taken_time = session.reschedule_new_time
+
+                session.reschedule_new_time = None
+                session.booking_state = "RESCHEDULE_COLLECTING"
+                session.updated_at = now
+
+                return slot_unavailable_reply(db, business_info, taken_date, taken_time, booking_to_update)
 
             # Update Google Calendar
             if (
@@ -271,9 +287,9 @@ def handle_reschedule_state(
                     start_iso, end_iso = booking_to_event_times(
                         date_str=booking_to_update.date,
                         time_hhmm=booking_to_update.time,
-                        duration_minutes=business_info[
-                            "slot_duration_minutes"
-                        ],
+                        duration_minutes=service_duration(
+                            business_info, booking_to_update.service
+                        ),
                         timezone_name=business_info["timezone"],
                     )
 
@@ -294,7 +310,6 @@ def handle_reschedule_state(
                     print("Calendar update failed:", str(e))
 
             reset_session(session, now)
-            db.commit()
 
             return {
                 "intent": "booking_rescheduled",
@@ -309,7 +324,6 @@ def handle_reschedule_state(
         # -----------------------------
         if intent == "booking_cancel" or user_text.lower() in NO_WORDS:
             reset_session(session, now)
-            db.commit()
             return {
                 "intent": "reschedule_cancelled",
                 "reply": "No problem — I didn’t make any changes.",
@@ -1,17 +1,18 @@
-from sqlalchemy import Column, String, DateTime, JSON, Boolean, Integer
+from sqlalchemy import Column, String, DateTime, JSON, Boolean, Integer, BigInteger, false
 from database import Base
 from datetime import datetime, timezone
 from sqlalchemy import ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
-from sqlalchemy import Text
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Index, Text, text
+from sqlalchemy.dialects.postgresql import JSONB, ExcludeConstraint
 
 class Session(Base):
     __tablename__ = "sessions"
     booking_state = Column(String, default="IDLE")
+    # One session per (business, phone): the same customer can text several salons
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), primary_key=True)
     session_id = Column(String, primary_key=True, index=True)  # phone number
-    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), nullable=True)
     channel = Column(String)
     last_message_id = Column(String, nullable=True)
     last_intent = Column(String, nullable=True)
@@ -33,20 +34,56 @@ class Session(Base):
     expired_from_state = Column(String, nullable=True)
 
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    fail_count = Column(String, default="0")   # store as string to avoid migration issues
-    handoff_offered = Column(String, default="0")
+    fail_count = Column(Integer, default=0, server_default="0", nullable=False)
+    handoff_offered = Column(Boolean, default=False, server_default=false(), nullable=False)
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Per-customer lookups: session bootstrap (active bookings) and booking_status (latest)
+        Index("ix_bookings_phone_status_created", "phone_number", "status", "created_at"),
+        # One active booking per slot — the conflict target for new holds,
+        # and what availability loads (business_id, date IN ...) scan
+        Index(
+            "ux_bookings_active_slot", "business_id", "date", "time",
+            unique=True,
+            postgresql_where=text("status IN ('PENDING', 'CONFIRMED')"),
+        ),
+        # Reminder job: CONFIRMED appointments in the next reminder window
+        Index(
+            "ix_bookings_confirmed_slot_start", "slot_start",
+            postgresql_where=text("status = 'CONFIRMED'"),
+        ),
+        # Range queries over a business's active bookings
+        Index(
+            "ix_bookings_active_slot_start", "business_id", "slot_start",
+            postgresql_where=text("status IN ('PENDING', 'CONFIRMED')"),
+        ),
+        # No two active bookings of a business overlap, whoever writes them
+        # (needs btree_gist); bookings without a business count as one
+        ExcludeConstraint(
+            (text("coalesce(business_id, '00000000-0000-0000-0000-000000000000'::uuid)"), "="),
+            (text("tstzrange(slot_start, slot_end)"), "&&"),
+            name="ex_bookings_active_overlap",
+            using="gist",
+            where=text(
+                "status IN ('PENDING', 'CONFIRMED') AND slot_start IS NOT NULL AND slot_end IS NOT NULL"
+            ),
+        ),
+    )
 
     id = Column(String, primary_key=True)
     business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), nullable=True)
     channel = Column(String, default="whatsapp")
-    phone_number = Column(String, index=True)
+    phone_number = Column(String)
     service = Column(String)
     date = Column(String)
     time = Column(String)
 
+    # Typed copy of date/time in UTC, kept in sync by the booking service
+    slot_start = Column(DateTime(timezone=True), nullable=True)
+    slot_end = Column(DateTime(timezone=True), nullable=True)
+
     # EXISTING
     status = Column(String)  # PENDING | CONFIRMED | CANCELLED | EXPIRED
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -105,6 +142,7 @@ class Business(Base):
     same_day_cutoff_hour = Column(Integer, nullable=True)
 
     business_hours = Column(JSON, nullable=False)
+    # ["Haircut", ...] or [{"name": "Facial", "duration_minutes": 60}, ...]
     services = Column(JSON, nullable=False)
 
     deposit_required_after_hour = Column(Integer, nullable=True)
@@ -112,6 +150,17 @@ class Business(Base):
 
     is_active = Column(Boolean, default=True)
 
+    # Inbound routing: the WhatsApp Cloud API phone_number_id and the Twilio
+    # number customers text. Also the sender for this business's replies.
+    whatsapp_phone_number_id = Column(String, nullable=True, unique=True, index=True)
+    sms_number = Column(String, nullable=True, unique=True, index=True)
+
+    # Bumped by every commit that takes or frees a slot (availability index freshness)
+    booking_version = Column(Integer, default=0, server_default="0", nullable=False)
+
+    # Bumped by a trigger whenever any other column changes (business config cache freshness)
+    config_version = Column(Integer, default=0, server_default="0", nullable=False)
+
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 class StripeWebhookEvent(Base):
@@ -155,8 +204,8 @@ class ConversationMessage(Base):
 class ConversationSession(Base):
     __tablename__ = "conversation_sessions"
 
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), primary_key=True, index=True)
     session_id = Column(String, primary_key=True)
-    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), nullable=False, index=True)
     phone_number = Column(String, index=True)
 
     started_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -191,3 +240,60 @@ class FSMTransition(Base):
     trigger_intent = Column(String, nullable=True)
 
     timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_result_cache"
+
+    # sha256 of (normalized text, prompt hash, business-local date)
+    cache_key = Column(String, primary_key=True)
+
+    prompt_hash = Column(String, nullable=False)
+    model_version = Column(String, nullable=True)
+    intent = Column(String, nullable=True)
+
+    result_json = Column(JSONB, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class InboundMessage(Base):
+    """
+    Durable queue of inbound channel messages: the webhook enqueues and
+    acks, workers (services/inbound_queue.py) run the turn and reply.
+    """
+    __tablename__ = "inbound_messages"
+    __table_args__ = (
+        # A redelivered webhook is enqueued once
+        Index("ux_inbound_messages_channel_message", "channel", "message_id", unique=True),
+        # Workers: unfinished messages per sender (claim order, one turn per session at a time)
+        Index(
+            "ix_inbound_messages_pending", "business_id", "session_id", "id",
+            postgresql_where=text("status IN ('queued', 'processing')"),
+        ),
+        # Retention purge of handled messages
+        Index(
+            "ix_inbound_messages_done_processed_at", "processed_at",
+            postgresql_where=text("status = 'done'"),
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+
+    channel = Column(String, nullable=False)
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.id"), nullable=False)
+    session_id = Column(String, nullable=False)   # sender phone
+    message_id = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    reply_from = Column(String, nullable=True)    # e.g. WhatsApp phone_number_id the message came in on
+
+    status = Column(String, default="queued", nullable=False)  # queued | processing | done | dead
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)   # lease of the worker processing it
+    last_error = Column(Text, nullable=True)
+
+    # The turn's reply, kept so a failed send is retried without re-running the turn
+    reply_text = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,41 +1,30 @@
-def build_system_prompt(business_info: dict) -> str:
-    services = ", ".join(business_info.get("services", []))
-    start = business_info["business_hours"]["start"]
-    end = business_info["business_hours"]["end"]
-    tz = business_info.get("timezone", "America/New_York")
-    name = business_info.get("name", "our salon")
-    location = business_info.get("location", "")
-
-    return f"""
-You are an AI WhatsApp receptionist for {name}.
+import hashlib
+import json
+import re
+from typing import NamedTuple
 
-Your job:
-- Understand the user's message.
-- Output ONLY a valid JSON object (no markdown, no extra text).
-- Be consistent and deterministic.
 
-Business context:
-- Services offered: {services}
-- Business hours: {start} to {end} ({tz})
-- Location/address: {location}
+class SystemPrompt(NamedTuple):
+    text: str
+    prompt_hash: str     # short sha256 of text (LLM cache key part)
+    token_count: int     # approximate, precomputed once per render
+    version: object      # config_version (or fingerprint) the prompt was rendered from
 
-You must classify the user's message into exactly ONE intent from this list:
 
-CRITICAL RULE:
-You MUST choose ONLY from the listed intents.
-DO NOT invent new intents.
-DO NOT output intent names not present in this list.
-If unsure, choose "fallback".
+# (business key, variant) -> SystemPrompt (re-rendered when the config version changes)
+_PROMPT_CACHE: dict[tuple, SystemPrompt] = {}
 
-BOOKING intents:
-1) booking_request
+# (group header, [(intent, description)]) — rendered in this order, numbered 1..N
+INTENT_GROUPS = [
+    ("BOOKING intents:", [
+        ("booking_request", """
    - User wants to book a service or appointment.
    - Examples:
      "I want to book a haircut"
      "Book facial tomorrow"
      "Need an appointment at 6pm"
-
-2) booking_modify
+"""),
+        ("booking_modify", """
    - User wants to CHANGE details of an in-progress booking (service/date/time).
    - This includes messages like:
      "Actually make it facial"
@@ -45,20 +34,20 @@ BOOKING intents:
    - IMPORTANT:
      booking_modify is used ONLY when user is changing service/date/time,
      not when confirming/cancelling.
-
-3) booking_confirm
+"""),
+        ("booking_confirm", """
    - User explicitly confirms a booking.
    - Examples:
      "yes", "confirm", "okay", "sounds good", "book it"
-
-4) booking_cancel
+"""),
+        ("booking_cancel", """
    - User wants to cancel an existing confirmed booking OR cancel a pending booking.
    - Examples:
      "cancel my appointment"
      "cancel SALON-AB12CD34"
      "no cancel it"
-
-5) booking_reschedule
+"""),
+        ("booking_reschedule", """
    - User wants to reschedule an existing confirmed booking.
    - Examples:
      "reschedule my appointment"
@@ -72,96 +61,281 @@ BOOKING intents:
      "earlier slot please"
      "later time works better"
      "can I do a different time"
-
-STATUS intent:
-6) booking_status
+"""),
+    ]),
+    ("STATUS intent:", [
+        ("booking_status", """
    - User asks about their booking details/status.
    - Examples:
      "what's my booking status?"
      "do I have an appointment?"
      "show my appointment"
-
-FAQ intents:
-7) faq_hours
+"""),
+    ]),
+    ("FAQ intents:", [
+        ("faq_hours", """
    - User asks business hours.
    - Examples:
      "what time do you open?"
      "are you open today?"
      "closing time?"
-
-8) faq_address
+"""),
+        ("faq_address", """
    - User asks where you are located / address.
    - Examples:
      "where are you located?"
      "what's your address?"
-
-9) faq_services
+"""),
+        ("faq_services", """
    - User asks what services are available.
    - Examples:
      "what services do you offer?"
      "do you do facial?"
      "service list"
-
-10) faq_pricing
+"""),
+        ("faq_pricing", """
    - User asks price or cost.
    - Examples:
      "how much is haircut?"
      "price for beard trim?"
      "what are your rates?"
-
-HUMAN intent:
-11) talk_to_human
+"""),
+    ]),
+    ("HUMAN intent:", [
+        ("talk_to_human", """
    - User wants to speak to a human or call the salon.
    - Examples:
      "talk to a person"
      "human please"
      "call me"
      "agent"
-
-Other:
-12) inquiry
+"""),
+    ]),
+    ("Other:", [
+        ("inquiry", """
    - General non-booking question that isn't covered above.
-
-13) greeting
+"""),
+        ("greeting", """
    - User greets the business.
    - Examples:
      "hello"
      "hi"
      "hey"
      "good morning"
-
-14) fallback
+"""),
+        ("fallback", """
    - If message is unclear, irrelevant, or cannot be classified.
+"""),
+    ]),
+]
 
-------------------------------------
-Extraction Rules (very important):
-------------------------------------
-Classification and Extraction Procedure:
+ALL_INTENTS = [intent for _, items in INTENT_GROUPS for intent, _ in items]
 
-Step 1 — INTENT
-First determine the intent using the allowed intent list.
+# --------------------------------------------------
+# STATE-SCOPED VARIANTS
+# Only intents the engine can act on from that FSM state.
+# FAQ / human / status are routed before the FSM handlers,
+# so they stay reachable wherever the engine answers them.
+# --------------------------------------------------
+PROMPT_VARIANTS = {
+    "full": {
+        "intents": ALL_INTENTS,
+        "context": None,
+    },
+    "confirming": {
+        "intents": [
+            "booking_modify", "booking_confirm", "booking_cancel",
+            "faq_hours", "faq_address", "faq_services", "faq_pricing",
+            "booking_status", "talk_to_human", "greeting", "fallback",
+        ],
+        "context": "The customer was just asked to confirm a pending booking (YES / NO / change something).",
+    },
+    "cancel_confirm": {
+        "intents": [
+            "booking_confirm", "booking_cancel",
+            "faq_hours", "faq_address", "faq_services", "faq_pricing",
+            "booking_status", "talk_to_human", "greeting", "fallback",
+        ],
+        "context": "The customer was just asked whether to cancel their appointment. YES means booking_confirm, NO means booking_cancel.",
+    },
+    "reschedule": {
+        # normalize_intent() maps everything here to booking_reschedule;
+        # only the YES/NO signal and the new date/time matter.
+        "intents": ["booking_modify", "booking_confirm", "booking_cancel", "fallback"],
+        "context": "The customer is moving an existing appointment. A new date/time is booking_modify.",
+    },
+}
 
-Step 2 — EXTRACTION
-Only after choosing the intent, extract fields relevant to that intent.
+STATE_PROMPT_VARIANTS = {
+    "CONFIRMING": "confirming",
+    "CANCEL_CONFIRM": "cancel_confirm",
+    "RESCHEDULE_COLLECTING": "reschedule",
+    "RESCHEDULE_CONFIRM": "reschedule",
+}
+
+
+def prompt_variant_for(booking_state: str | None) -> str:
+    return STATE_PROMPT_VARIANTS.get(booking_state, "full")
+
+
+def business_fingerprint(business_info: dict) -> str:
+    raw = json.dumps(dict(business_info), sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough BPE estimate: one token per word or punctuation mark.
+    """
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def get_system_prompt(business_info: dict, booking_state: str | None = None) -> SystemPrompt:
+    """
+    Memoized prompt per business, config_version and FSM-state variant.
+    A hit is a dict lookup; a new version forces a re-render. Dicts
+    without a config_version fall back to a fingerprint of the whole
+    config. The text is byte-identical between renders so provider-side
+    prefix caching can kick in.
+    """
+    variant = prompt_variant_for(booking_state)
+    key = (str(business_info.get("id") or business_info.get("name")), variant)
+    version = business_info.get("config_version")
+    if version is None:
+        version = business_fingerprint(business_info)
+
+    cached = _PROMPT_CACHE.get(key)
+    if cached and cached.version == version:
+        return cached
+
+    text = render_system_prompt(business_info, variant)
+    prompt = SystemPrompt(
+        text=text,
+        prompt_hash=hashlib.sha256(text.encode("utf-8")).hexdigest()[:16],
+        token_count=estimate_tokens(text),
+        version=version,
+    )
+    _PROMPT_CACHE[key] = prompt
+    return prompt
+
+
+def invalidate_system_prompt(business_id=None):
+    if business_id is None:
+        _PROMPT_CACHE.clear()
+        return
 
-When intent is booking_request OR booking_modify:
+    for key in [k for k in _PROMPT_CACHE if k[0] == str(business_id)]:
+        _PROMPT_CACHE.pop(key, None)
+
+
+def system_prompt_stats() -> dict:
+    return {
+        f"{business}:{variant}": {"token_count": p.token_count, "prompt_hash": p.prompt_hash}
+        for (business, variant), p in list(_PROMPT_CACHE.items())
+    }
+
+
+def build_system_prompt(business_info: dict, booking_state: str | None = None) -> str:
+    return get_system_prompt(business_info, booking_state).text
+
+
+def render_intents(intents) -> str:
+    groups = []
+    number = 0
+
+    for header, items in INTENT_GROUPS:
+        lines = []
+        for intent, description in items:
+            if intent not in intents:
+                continue
+            number += 1
+            body = description.strip("\n")
+            lines.append(f"{number}) {intent}\n{body}")
+
+        if lines:
+            groups.append(header + "\n" + "\n\n".join(lines))
+
+    return "\n\n".join(groups)
+
+
+def render_extraction_rules(intents) -> str:
+    rules = []
+
+    booking_fields = [i for i in ("booking_request", "booking_modify") if i in intents]
+    if booking_fields:
+        rules.append(f"""When intent is {" OR ".join(booking_fields)}:
 Return extracted fields if present:
 - service: must match one of the allowed services exactly.
 - date: keep as user phrase if you cannot normalize (ex: "tomorrow", "next monday")
 - time: keep as user phrase if you cannot normalize (ex: "6:30pm", "evening")
 
-If user did NOT mention a field, return null for it.
+If user did NOT mention a field, return null for it.""")
 
-For booking_cancel or booking_reschedule:
+    ref_intents = [i for i in ("booking_cancel", "booking_reschedule") if i in intents]
+    if ref_intents:
+        rules.append(f"""For {" or ".join(ref_intents)}:
 If the user mentions a booking reference id like SALON-XXXXXXXX, return it as:
-- ref_id
+- ref_id""")
 
-For FAQ intents:
-- set faq_topic accordingly.
+    if any(i.startswith("faq_") for i in intents):
+        rules.append("""For FAQ intents:
+- set faq_topic accordingly.""")
 
-For faq_pricing:
+    if "faq_pricing" in intents:
+        rules.append("""For faq_pricing:
 If the user asks pricing for a specific service, include:
-- service
+- service""")
+
+    return "\n\n".join(rules)
+
+
+def render_system_prompt(business_info: dict, variant: str = "full") -> str:
+    services = ", ".join(business_info.get("services", []))
+    start = business_info["business_hours"]["start"]
+    end = business_info["business_hours"]["end"]
+    tz = business_info.get("timezone", "America/New_York")
+    name = business_info.get("name", "our salon")
+    location = business_info.get("location", "")
+
+    intents = PROMPT_VARIANTS[variant]["intents"]
+    context = PROMPT_VARIANTS[variant]["context"]
+    context_line = f"\nConversation state:\n- {context}\n" if context else ""
+
+    return f"""
+You are an AI WhatsApp receptionist for {name}.
+
+Your job:
+- Understand the user's message.
+- Output ONLY a valid JSON object (no markdown, no extra text).
+- Be consistent and deterministic.
+
+Business context:
+- Services offered: {services}
+- Business hours: {start} to {end} ({tz})
+- Location/address: {location}
+{context_line}
+You must classify the user's message into exactly ONE intent from this list:
+
+CRITICAL RULE:
+You MUST choose ONLY from the listed intents.
+DO NOT invent new intents.
+DO NOT output intent names not present in this list.
+If unsure, choose "fallback".
+
+{render_intents(intents)}
+
+------------------------------------
+Extraction Rules (very important):
+------------------------------------
+Classification and Extraction Procedure:
+
+Step 1 — INTENT
+First determine the intent using the allowed intent list.
+
+Step 2 — EXTRACTION
+Only after choosing the intent, extract fields relevant to that intent.
+
+{render_extraction_rules(intents)}
 
 ------------------------------------
 Output JSON Schema:
@@ -188,4 +362,4 @@ Rules:
 - Do NOT hallucinate service/date/time/ref_id.
 
 Return only JSON. No additional text.
-""".strip()
\ No newline at end of file
+""".strip()
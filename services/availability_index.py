@@ -0,0 +1,443 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import accumulate
+
+from sqlalchemy import and_, event, inspect, select, update
+
+from business_rules import parse_time
+from database import SessionLocal
+from models import Booking, Business
+from services import metrics
+from services.session_loader import ACTIVE_BOOKING_STATUSES
+
+AVAILABILITY_INDEX_MAX_DAYS = int(os.getenv("AVAILABILITY_INDEX_MAX_DAYS", "4096"))
+
+
+def _minutes(hhmm: str) -> int:
+    t = parse_time(hhmm)
+    return t.hour * 60 + t.minute
+
+
+def interval_minutes(slot_start, slot_end) -> int | None:
+    """
+    Booked length from the typed columns; None (grid slot) for legacy rows.
+    """
+    if slot_start is None or slot_end is None:
+        return None
+    return int((slot_end - slot_start).total_seconds() // 60)
+
+
+class SlotGrid:
+    """
+    Candidate start times for one business: start_min + i * slot_minutes,
+    business_hours start..end inclusive (the same candidates suggestions offer).
+    """
+
+    def __init__(self, business_info: dict):
+        hours = business_info.get("business_hours", {})
+        self.slot_minutes = int(business_info.get("slot_duration_minutes", 30))
+        self.start_min = _minutes(hours.get("start", "09:00"))
+        self.end_min = _minutes(hours.get("end", "19:00"))
+        self.size = max(0, (self.end_min - self.start_min) // self.slot_minutes + 1)
+
+    def starts(self):
+        return range(self.start_min, self.start_min + self.size * self.slot_minutes, self.slot_minutes)
+
+
+class DayAvailability:
+    """
+    Booked intervals [start, end) of one business day, in minutes, sorted
+    by start. max_ends[i] is the latest end among the first i + 1, so an
+    overlap check is one bisect even if legacy rows overlap each other.
+    Immutable: changes build a new one.
+    """
+
+    __slots__ = ("grid", "version", "starts", "ends", "max_ends")
+
+    def __init__(self, grid: SlotGrid, version: int, intervals=()):
+        intervals = sorted(intervals)
+        self.grid = grid
+        self.version = version
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+        self.max_ends = list(accumulate(self.ends, max))
+
+    @property
+    def intervals(self) -> list:
+        return list(zip(self.starts, self.ends))
+
+    def overlaps(self, start: int, end: int) -> bool:
+        # Bookings starting before `end`; one of them still running at `start` overlaps
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def is_taken(self, minute: int, minutes: int | None = None) -> bool:
+        return self.overlaps(minute, minute + (minutes or self.grid.slot_minutes))
+
+    def with_booking(self, minute: int, minutes: int | None, taken: bool, version: int) -> "DayAvailability":
+        interval = (minute, minute + (minutes or self.grid.slot_minutes))
+        intervals = self.intervals
+
+        if taken:
+            intervals.append(interval)
+        elif interval in intervals:
+            intervals.remove(interval)
+        else:
+            # Length unknown to the caller: free whatever starts there
+            intervals = [i for i in intervals if i[0] != minute]
+
+        return DayAvailability(self.grid, version, intervals)
+
+
+class AvailabilityIndex:
+    """
+    Process-local availability per (business, date), bounded LRU.
+
+    Freshness comes from Business.booking_version, bumped in the same
+    commit as any booking change that frees or takes a slot:
+    - every turn observes the business's current version (it's loaded
+      with the session context anyway) — older days reload lazily;
+    - this process's own commits patch their days in place.
+
+    Advisory only: the bookings overlap constraint decides writes.
+    """
+
+    def __init__(self, max_days: int = AVAILABILITY_INDEX_MAX_DAYS):
+        self.max_days = max_days
+        self._days = OrderedDict()     # (business_id, date) -> DayAvailability
+        self._dates = {}               # business_id -> {date, ...} cached
+        self._versions = {}            # business_id -> newest version seen
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+
+    def _store(self, business_id: str, date: str, day: DayAvailability):
+        self._days[(business_id, date)] = day
+        self._days.move_to_end((business_id, date))
+        self._dates.setdefault(business_id, set()).add(date)
+
+        while len(self._days) > self.max_days:
+            (old_business, old_date), _ = self._days.popitem(last=False)
+            self._dates[old_business].discard(old_date)
+
+    def _drop(self, business_id: str, date: str):
+        self._days.pop((business_id, date), None)
+        self._dates.get(business_id, set()).discard(date)
+
+    def observe_version(self, business_id, version):
+        if version is None:
+            return
+        business_id = str(business_id)
+        with self._lock:
+            if version > self._versions.get(business_id, -1):
+                self._versions[business_id] = version
+
+    def _fresh(self, business_id: str, date: str):
+        day = self._days.get((business_id, date))
+        if day is None:
+            return None
+        if day.version < self._versions.get(business_id, day.version + 1):
+            return None
+        self._days.move_to_end((business_id, date))
+        return day
+
+    def days(self, db, business_info: dict, dates) -> dict:
+        """
+        {date: DayAvailability}; all misses load in one query.
+        """
+        business_id = str(business_info["id"])
+        result, missing = {}, []
+
+        with self._lock:
+            for date in dates:
+                day = self._fresh(business_id, date)
+                if day is None:
+                    missing.append(date)
+                else:
+                    result[date] = day
+            self.hits += len(result)
+            self.misses += len(missing)
+
+        if missing:
+            _, loaded = self._load(db, business_info, missing)
+            self._store_loaded(db, business_id, loaded)
+            result.update(loaded)
+
+        return _overlay_uncommitted(db, business_id, result)
+
+    def current_days(self, db, business_info: dict, dates):
+        """
+        days() for callers that haven't read the business this request
+        (the availability API): its row comes back with the load of the
+        uncached days, so a request is one statement. Returns (business,
+        days), business being the (booking_version, config_version,
+        is_active) row, or (None, {}) when the business is gone. Days
+        that turn out stale for the version read are reloaded.
+        """
+        business_id = str(business_info["id"])
+        with self._lock:
+            missing = [date for date in dates if (business_id, date) not in self._days]
+
+        business, loaded = self._load(db, business_info, missing)
+        if business is None:
+            return None, {}
+        self.observe_version(business_id, business.booking_version)
+
+        result, stale = {}, []
+        with self._lock:
+            for date in dates:
+                if date in loaded:
+                    continue
+                day = self._fresh(business_id, date)
+                if day is None:
+                    stale.append(date)
+                else:
+                    result[date] = day
+            self.hits += len(result)
+            self.misses += len(loaded) + len(stale)
+
+        if stale:
+            _, reloaded = self._load(db, business_info, stale)
+            loaded.update(reloaded)
+
+        self._store_loaded(db, business_id, loaded)
+        result.update(loaded)
+        return business, _overlay_uncommitted(db, business_id, result)
+
+    def _store_loaded(self, db, business_id: str, loaded: dict):
+        # A load that sees this transaction's own writes isn't shareable yet
+        if _has_uncommitted(db, business_id):
+            return
+        with self._lock:
+            for date, day in loaded.items():
+                self._store(business_id, date, day)
+
+    def is_taken(self, db, business_info: dict, date: str, hhmm: str, minutes: int | None = None) -> bool:
+        return self.days(db, business_info, [date])[date].is_taken(_minutes(hhmm), minutes)
+
+    def _load(self, db, business_info: dict, dates):
+        # Business row and bookings in one statement: same snapshot
+        rows = db.execute(
+            select(
+                Business.booking_version, Business.config_version, Business.is_active,
+                Booking.date, Booking.time, Booking.slot_start, Booking.slot_end,
+            )
+            .select_from(Business)
+            .outerjoin(
+                Booking,
+                and_(
+                    Booking.business_id == Business.id,
+                    Booking.date.in_(dates),
+                    Booking.status.in_(ACTIVE_BOOKING_STATUSES),
+                ),
+            )
+            .where(Business.id == business_info["id"])
+        ).all()
+
+        business = rows[0] if rows else None
+        version = business.booking_version if business else 0
+        grid = SlotGrid(business_info)
+        intervals = {date: [] for date in dates}
+
+        for _, _, _, date, hhmm, slot_start, slot_end in rows:
+            if date is None:
+                continue
+            try:
+                minute = _minutes(hhmm)
+            except ValueError:
+                continue  # legacy free-text time, can't collide with a real slot
+            minutes = interval_minutes(slot_start, slot_end) or grid.slot_minutes
+            intervals[date].append((minute, minute + minutes))
+
+        return business, {date: DayAvailability(grid, version, intervals[date]) for date in dates}
+
+    def apply(self, business_id, version: int, changes):
+        """
+        Patch this business's cached days with a commit that moved its
+        version to `version`. Days that missed an earlier commit are dropped.
+        """
+        business_id = str(business_id)
+        by_date = {}
+        for date, hhmm, taken, minutes in changes:
+            by_date.setdefault(date, []).append((hhmm, taken, minutes))
+
+        with self._lock:
+            if version > self._versions.get(business_id, -1):
+                self._versions[business_id] = version
+
+            for date in list(self._dates.get(business_id, ())):
+                day = self._days[(business_id, date)]
+
+                if day.version >= version:
+                    continue  # loaded after this commit: already included
+
+                if day.version != version - 1 or None in by_date:
+                    self._drop(business_id, date)
+                    continue
+
+                for hhmm, taken, minutes in by_date.get(date, ()):
+                    day = day.with_booking(_minutes(hhmm), minutes, taken, version)
+                self._days[(business_id, date)] = DayAvailability(day.grid, version, day.intervals)
+
+            self.patches += 1
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._dates.clear()
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "days": len(self._days),
+                "max_days": self.max_days,
+                "hits": self.hits,
+                "misses": self.misses,
+                "patches": self.patches,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+availability_index = AvailabilityIndex()
+metrics.register("availability_index", availability_index.stats)
+
+
+# --------------------------------------------------
+# CHANGE TRACKING (per DB session, applied after commit)
+# --------------------------------------------------
+def record_slot_change(db, business_id, date: str | None, hhmm: str | None, taken: bool, minutes: int | None = None):
+    """
+    Note that a booking took or freed `minutes` from hhmm (None: one grid
+    slot) in this transaction.
+    date=None means "unknown slot": the business's days are dropped.
+    ORM changes are picked up by the flush hook; Core writes call this.
+    """
+    if business_id is None:
+        return  # pre-multi-business rows aren't part of any business's index
+    db.info.setdefault("availability_changes", []).append(
+        (db.get_nested_transaction(), str(business_id), date, hhmm, taken, minutes)
+    )
+
+
+def _has_uncommitted(db, business_id: str) -> bool:
+    return any(c[1] == business_id for c in db.info.get("availability_changes", ()))
+
+
+def _overlay_uncommitted(db, business_id: str, days: dict) -> dict:
+    # This transaction's own changes aren't in the index until it commits
+    for _, change_business, date, hhmm, taken, minutes in db.info.get("availability_changes", ()):
+        if change_business == business_id and date in days and hhmm:
+            day = days[date]
+            days[date] = day.with_booking(_minutes(hhmm), minutes, taken, day.version)
+    return days
+
+
+_UNKNOWN = object()
+
+
+def _old_and_new(state, attr_name):
+    history = state.attrs[attr_name].history
+    new = getattr(state.obj(), attr_name)
+    if history.deleted:
+        return history.deleted[0], new
+    if history.added:
+        return _UNKNOWN, new  # overwritten without the old value ever being loaded
+    return new, new
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def track_booking_changes(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Booking) and obj.status in ACTIVE_BOOKING_STATUSES:
+            minutes = interval_minutes(obj.slot_start, obj.slot_end)
+            record_slot_change(session, obj.business_id, obj.date, obj.time, True, minutes)
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.status in ACTIVE_BOOKING_STATUSES:
+            minutes = interval_minutes(obj.slot_start, obj.slot_end)
+            record_slot_change(session, obj.business_id, obj.date, obj.time, False, minutes)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Booking) or not session.is_modified(obj):
+            continue
+
+        state = inspect(obj)
+        old_status, new_status = _old_and_new(state, "status")
+        old_date, new_date = _old_and_new(state, "date")
+        old_time, new_time = _old_and_new(state, "time")
+        old_start, new_start = _old_and_new(state, "slot_start")
+        old_end, new_end = _old_and_new(state, "slot_end")
+
+        if _UNKNOWN in (old_status, old_date, old_time, old_start, old_end):
+            record_slot_change(session, obj.business_id, None, None, False)
+            continue
+
+        old = (old_status in ACTIVE_BOOKING_STATUSES, old_date, old_time, interval_minutes(old_start, old_end))
+        new = (new_status in ACTIVE_BOOKING_STATUSES, new_date, new_time, interval_minutes(new_start, new_end))
+        if old == new:
+            continue
+
+        if old[0]:
+            record_slot_change(session, obj.business_id, old_date, old_time, False, old[3])
+        if new[0]:
+            record_slot_change(session, obj.business_id, new_date, new_time, True, new[3])
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def bump_booking_versions(session):
+    if session.in_nested_transaction():
+        return
+
+    # before_commit runs ahead of the final flush — flush so its changes count
+    session.flush()
+
+    changes = session.info.get("availability_changes")
+    if not changes:
+        return
+
+    versions = {}
+    for business_id in sorted({c[1] for c in changes}):
+        # Taken last in the transaction, so the row lock is held only until COMMIT
+        versions[business_id] = session.execute(
+            update(Business)
+            .where(Business.id == business_id)
+            .values(booking_version=Business.booking_version + 1)
+            .returning(Business.booking_version)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+
+    session.info["availability_versions"] = versions
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def apply_booking_changes(session):
+    if session.in_nested_transaction():
+        return
+
+    changes = session.info.pop("availability_changes", [])
+    versions = session.info.pop("availability_versions", {})
+
+    for business_id, version in versions.items():
+        availability_index.apply(
+            business_id,
+            version,
+            [(date, hhmm, taken, minutes) for _, b, date, hhmm, taken, minutes in changes if b == business_id],
+        )
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def discard_booking_changes(session, previous_transaction):
+    changes = session.info.get("availability_changes")
+    if not changes:
+        return
+
+    if previous_transaction.nested:
+        session.info["availability_changes"] = [c for c in changes if c[0] is not previous_transaction]
+    else:
+        session.info.pop("availability_changes", None)
+        session.info.pop("availability_versions", None)
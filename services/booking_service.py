@@ -2,31 +2,179 @@ import re
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
 from models import Booking
-from business_rules import parse_time
+from business_rules import parse_time, validate_booking
+from services.availability_index import (
+    SlotGrid,
+    availability_index,
+    interval_minutes,
+    record_slot_change,
+)
 
-def is_slot_taken(db, date: str, time: str) -> bool:
-    existing = (
-        db.query(Booking)
-        .filter(
-            Booking.date == date,
-            Booking.time == time,
-            Booking.status.in_(["PENDING", "CONFIRMED"])
+def _to_minutes(hhmm: str) -> int:
+    t = parse_time(hhmm)
+    return t.hour * 60 + t.minute
+
+def service_duration(business_info: dict, service: str | None = None) -> int:
+    """
+    Minutes a booking of this service occupies; one slot when unknown.
+    """
+    durations = business_info.get("service_durations") or {}
+    return int(durations.get(service) or business_info.get("slot_duration_minutes", 30))
+
+def _without_booking(days: dict, booking) -> dict:
+    # A booking being moved doesn't block its own new time
+    if booking is None or booking.date not in days:
+        return days
+    try:
+        minute = _to_minutes(booking.time)
+    except ValueError:
+        return days  # legacy free-text time was never in the index
+
+    day = days[booking.date]
+    minutes = interval_minutes(booking.slot_start, booking.slot_end)
+    return {**days, booking.date: day.with_booking(minute, minutes, False, day.version)}
+
+def is_slot_taken(db, business_info: dict, date: str, time: str, service: str | None = None, ignore=None) -> bool:
+    """
+    Would a booking of `service` at date/time overlap an active one?
+    `ignore`: the booking being rescheduled.
+    """
+    days = _without_booking(availability_index.days(db, business_info, [date]), ignore)
+    return days[date].is_taken(_to_minutes(time), service_duration(business_info, service))
+
+def booking_slot_range(date_str: str, time_hhmm: str, business_info: dict, service: str | None = None):
+    """
+    (slot_start, slot_end) as aware datetimes in the business timezone,
+    for the typed columns that back range queries. The end follows the
+    service's duration.
+    """
+    tz = ZoneInfo(business_info["timezone"])
+    start = datetime.fromisoformat(f"{date_str} {time_hhmm}:00").replace(tzinfo=tz)
+    return start, start + timedelta(minutes=service_duration(business_info, service))
+
+def set_booking_slot(booking, date_str: str, time_hhmm: str, business_info: dict):
+    # date/time and slot_start/slot_end always change together
+    booking.date = date_str
+    booking.time = time_hhmm
+    booking.slot_start, booking.slot_end = booking_slot_range(
+        date_str, time_hhmm, business_info, booking.service
+    )
+
+def move_booking(db, booking, date_str: str, time_hhmm: str, business_info: dict) -> bool:
+    """
+    Reschedule `booking` unless the new time overlaps another active
+    booking (ex_bookings_active_overlap; legacy rows without slot_start
+    only by ux_bookings_active_slot). False (nothing changed) when it does.
+    """
+    try:
+        with db.begin_nested():
+            set_booking_slot(booking, date_str, time_hhmm, business_info)
+    except IntegrityError:
+        return False
+
+    return True
+
+def list_open_slots(db, business_info: dict, dates, now: datetime, service: str | None = None, days=None) -> dict:
+    """
+    {date: ["HH:MM", ...]}: start times where `service` fits without
+    overlapping a booking, that validate_booking accepts and haven't
+    started yet. All dates in one pass over the availability index
+    (`days`: already fetched from it).
+    """
+    if days is None:
+        days = availability_index.days(db, business_info, dates)
+    grid = SlotGrid(business_info)
+    minutes = service_duration(business_info, service)
+    local_now = now.astimezone(ZoneInfo(business_info["timezone"]))
+    today, now_min = local_now.date().isoformat(), local_now.hour * 60 + local_now.minute
+
+    open_slots = {}
+    for date in dates:
+        day = days[date]
+        free = []
+
+        for minute in grid.starts():
+            if day.is_taken(minute, minutes) or (date == today and minute <= now_min):
+                continue
+
+            hhmm = f"{minute // 60:02d}:{minute % 60:02d}"
+            is_valid, _, _ = validate_booking(date, hhmm, business_info)
+            if is_valid:
+                free.append(hhmm)
+
+        open_slots[date] = free
+
+    return open_slots
+
+def create_pending_booking(db, business_info: dict, **values):
+    """
+    One INSERT ... ON CONFLICT DO NOTHING: the overlap exclusion constraint
+    and the active-slot unique index decide, so concurrent holds can't
+    both win. Returns the new Booking, or None when an active booking
+    already covers part of the window.
+    """
+    slot_start, slot_end = booking_slot_range(
+        values["date"], values["time"], business_info, values.get("service")
+    )
+
+    stmt = (
+        insert(Booking)
+        .values(status="PENDING", slot_start=slot_start, slot_end=slot_end, **values)
+        .on_conflict_do_nothing()   # no target: covers exclusion constraints too
+        .returning(Booking)
+    )
+    booking = db.scalars(stmt).one_or_none()
+
+    if booking is not None:
+        # Core insert: the ORM flush hook doesn't see it
+        record_slot_change(
+            db, booking.business_id, booking.date, booking.time, True,
+            interval_minutes(booking.slot_start, booking.slot_end),
         )
+
+    return booking
+
+def get_latest_booking(db, phone_number: str, business_id):
+    return (
+        db.query(Booking)
+        .filter(Booking.phone_number == phone_number, Booking.business_id == business_id)
+        .order_by(Booking.created_at.desc())
         .first()
     )
-    return existing is not None
+
+def find_booking(bookings, status: str, booking_id: str | None = None):
+    """
+    Latest booking with this status (and id) from the turn's preloaded
+    active bookings. Reads in-memory status, so changes made earlier
+    in the same turn are respected.
+    """
+    matches = [
+        b for b in bookings
+        if b.status == status and (booking_id is None or b.id == booking_id)
+    ]
+    if not matches:
+        return None
+
+    return max(matches, key=lambda b: b.created_at.timestamp() if b.created_at else 0)
 
 def suggest_slots_around(
     db,
     business_info: dict,
     date_str: str,
     time_hhmm: str,
-    count: int = 5
+    count: int = 5,
+    service: str | None = None,
+    ignore=None,
 ) -> dict:
     """
-    Suggest slots earlier + later around the requested time.
-    If business hours are over, also suggest next-day morning slots.
+    Suggest slots earlier + later around the requested time where the
+    service fits without overlapping a booking (`ignore`: the booking
+    being rescheduled). If business hours are over, also suggest
+    next-day morning slots.
 
     Returns:
       {
@@ -35,6 +183,7 @@ def suggest_slots_around(
       }
     """
     slot_minutes = int(business_info.get("slot_duration_minutes", 30))
+    service_minutes = service_duration(business_info, service)
     start = business_info.get("business_hours", {}).get("start", "09:00")
     end = business_info.get("business_hours", {}).get("end", "19:00")
 
@@ -57,6 +206,17 @@ def suggest_slots_around(
     # clamp base within business hours for searching
     base_min = max(start_min, min(base_min, end_min))
 
+    try:
+        next_date = (datetime.fromisoformat(date_str).date() + timedelta(days=1)).isoformat()
+    except Exception:
+        next_date = None
+
+    # Both days up front: every candidate below is one bisect
+    days = _without_booking(
+        availability_index.days(db, business_info, [d for d in (date_str, next_date) if d]),
+        ignore,
+    )
+
     # gather candidates around base: base, -1, +1, -2, +2, ...
     offsets = [0]
     step = 1
@@ -83,24 +243,19 @@ def suggest_slots_around(
             continue
         seen.add(hhmm)
 
-        if not is_slot_taken(db, date_str, hhmm):
+        if not days[date_str].is_taken(candidate_min, service_minutes):
             same_day.append(hhmm)
 
     # If requested time is near/after closing OR no same-day suggestions found
     # suggest next-day morning slots
     next_day = []
     if base_min >= end_min or len(same_day) == 0:
-        try:
-            next_date = (datetime.fromisoformat(date_str).date() + timedelta(days=1)).isoformat()
-        except Exception:
-            next_date = None
-
         if next_date:
             morning_min = start_min
             attempts = 0
             while len(next_day) < min(3, count) and attempts < 20:
                 hhmm = to_hhmm(morning_min)
-                if not is_slot_taken(db, next_date, hhmm):
+                if not days[next_date].is_taken(morning_min, service_minutes):
                     next_day.append(hhmm)
                 morning_min += slot_minutes
                 attempts += 1
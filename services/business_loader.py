@@ -1,9 +1,58 @@
+import threading
+from datetime import time
+from types import MappingProxyType
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from business_rules import parse_time
 from models import Business
+from services import metrics
 
-def build_business_info(db):
-    business = db.query(Business).filter(Business.is_active == True).first()
 
+class BusinessConfig(NamedTuple):
+    """
+    One business's configuration, parsed once per config_version and
+    shared by every turn. `info` is the business_info mapping the engine
+    and FSM take; treat everything here as read-only.
+    """
+    id: str
+    version: int
+    tz: ZoneInfo
+    opens: time
+    closes: time
+    same_day_cutoff: time | None
+    services: frozenset
+    service_durations: MappingProxyType
+    deposit_required_after_hour: int | None
+    deposit_amount: int | None
+    routes: frozenset       # {(channel, number), ...} that reach this business
+    info: MappingProxyType
+
+
+# Inbound channel -> the Business column holding the number customers reach it on
+ROUTE_FIELDS = {
+    "whatsapp": "whatsapp_phone_number_id",
+    "sms": "sms_number",
+}
+
+
+def service_durations(services, default_minutes: int) -> dict:
+    """
+    {name: minutes} from Business.services. Plain names (the original
+    format) and entries without duration_minutes take one slot.
+    """
+    durations = {}
+    for service in services or []:
+        if isinstance(service, dict):
+            durations[service["name"]] = int(service.get("duration_minutes") or default_minutes)
+        else:
+            durations[service] = default_minutes
+    return durations
+
+def business_info_from(business: Business) -> dict:
+    durations = service_durations(business.services, business.slot_duration_minutes)
     return {
+        "id": str(business.id),
         "name": business.name,
         "type": business.type,
         "timezone": business.timezone,
@@ -14,7 +63,177 @@ def build_business_info(db):
             else None
         ),
         "business_hours": business.business_hours,
-        "services": business.services,
+        "services": list(durations),
+        "service_durations": durations,
         "deposit_required_after_hour": business.deposit_required_after_hour,
         "deposit_amount": business.deposit_amount,
+        "whatsapp_phone_number_id": business.whatsapp_phone_number_id,
+        "sms_number": business.sms_number,
     }
+
+def build_business_config(business: Business) -> BusinessConfig:
+    info = business_info_from(business)
+    hours = info["business_hours"] or {}
+
+    # Parsed once here instead of on every validate_booking call
+    info["tzinfo"] = ZoneInfo(info["timezone"])
+    info["opens_at"] = parse_time(hours.get("start", "09:00"))
+    info["closes_at"] = parse_time(hours.get("end", "19:00"))
+    info["same_day_cutoff_at"] = parse_time(info["same_day_cutoff"]) if info["same_day_cutoff"] else None
+    info["config_version"] = business.config_version or 0
+
+    return BusinessConfig(
+        id=info["id"],
+        version=info["config_version"],
+        tz=info["tzinfo"],
+        opens=info["opens_at"],
+        closes=info["closes_at"],
+        same_day_cutoff=info["same_day_cutoff_at"],
+        services=frozenset(info["services"]),
+        service_durations=MappingProxyType(info["service_durations"]),
+        deposit_required_after_hour=info["deposit_required_after_hour"],
+        deposit_amount=info["deposit_amount"],
+        routes=frozenset(
+            (channel, info[field]) for channel, field in ROUTE_FIELDS.items() if info[field]
+        ),
+        info=MappingProxyType(info),
+    )
+
+
+class BusinessConfigCache:
+    """
+    Process-wide BusinessConfig per business, the (channel, number) ->
+    business routing index, and which business is "the active one" for
+    unrouted traffic (/chat, single-salon deployments).
+
+    Freshness comes from Business.config_version, bumped by a trigger on
+    any config change: every turn already loads its Business row with the
+    session context and hands it to observe(), which rebuilds the config
+    (and its routes) only when the version moved. A number moved to
+    another business is picked up once a turn of the old owner sees the
+    change. reload() is the manual hook.
+    """
+
+    def __init__(self):
+        self._configs = {}          # business_id -> BusinessConfig
+        self._routes = {}           # (channel, number) -> business_id
+        self._fallback_routes = {}  # (channel, number) -> active business, channel not routed yet
+        self._active_id = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.rebuilds = 0
+
+    def _put(self, config: BusinessConfig):
+        old = self._configs.get(config.id)
+        for route in old.routes - config.routes if old else ():
+            if self._routes.get(route) == config.id:
+                del self._routes[route]
+        for route in config.routes:
+            self._routes[route] = config.id
+        if config.routes:
+            self._fallback_routes.clear()  # routing switched on: stop guessing
+        self._configs[config.id] = config
+
+    def observe(self, business: Business, active: bool = True) -> BusinessConfig:
+        """
+        The config for a Business row the caller already loaded.
+        """
+        business_id = str(business.id)
+        with self._lock:
+            config = self._configs.get(business_id)
+            if config is None or config.version != (business.config_version or 0):
+                config = build_business_config(business)
+                self._put(config)
+                self.rebuilds += 1
+            if active:
+                self._active_id = business_id
+            return config
+
+    def active(self, db) -> BusinessConfig | None:
+        """
+        The active business's config; queries only on a cold cache.
+        """
+        with self._lock:
+            config = self._configs.get(self._active_id)
+        if config is not None:
+            return config
+
+        self.loads += 1
+        business = db.query(Business).filter(Business.is_active == True).order_by(Business.created_at).first()
+        return self.observe(business) if business else None
+
+    def get(self, db, business_id) -> BusinessConfig | None:
+        with self._lock:
+            config = self._configs.get(str(business_id))
+        if config is not None:
+            return config
+
+        self.loads += 1
+        business = db.get(Business, business_id)
+        return self.observe(business, active=False) if business else None
+
+    def route(self, db, channel: str, number: str | None) -> BusinessConfig | None:
+        """
+        The business customers reach on this channel's number. A dict hit
+        in steady state; an unknown number costs one indexed query.
+
+        While no business has a number for the channel (single-salon
+        deployments), everything goes to the active business.
+        """
+        key = (channel, number)
+        with self._lock:
+            business_id = self._routes.get(key) or self._fallback_routes.get(key)
+            config = self._configs.get(business_id)
+        if config is not None:
+            return config
+
+        self.loads += 1
+        column = getattr(Business, ROUTE_FIELDS[channel])
+        if number:
+            business = db.query(Business).filter(column == number, Business.is_active == True).first()
+            if business is not None:
+                return self.observe(business, active=False)
+
+        if db.query(Business.id).filter(column.isnot(None)).first() is not None:
+            return None  # routing is set up and nobody owns this number
+
+        config = self.active(db)
+        if config is not None:
+            with self._lock:
+                self._fallback_routes[key] = config.id
+        return config
+
+    def reload(self, business_id=None):
+        """
+        Drop cached configs (all, or one business); the next lookup reloads.
+        """
+        with self._lock:
+            if business_id is None:
+                self._configs.clear()
+                self._routes.clear()
+                self._fallback_routes.clear()
+                self._active_id = None
+                return
+
+            config = self._configs.pop(str(business_id), None)
+            for route in config.routes if config else ():
+                self._routes.pop(route, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "businesses": len(self._configs),
+                "routes": len(self._routes),
+                "fallback_routes": len(self._fallback_routes),
+                "loads": self.loads,
+                "rebuilds": self.rebuilds,
+            }
+
+
+business_config_cache = BusinessConfigCache()
+metrics.register("business_config", business_config_cache.stats)
+
+
+def build_business_info(db):
+    config = business_config_cache.active(db)
+    return config.info if config else None
@@ -1,8 +1,10 @@
 from channels.whatsapp import send_whatsapp_message
 from channels.sms import send_sms_message
 
-def send_message(channel: str, phone: str, text: str):
+def send_message(channel: str, phone: str, text: str, business_info=None):
+    # Sent from the business's own number when it has one
+    business_info = business_info or {}
     if channel == "whatsapp":
-        send_whatsapp_message(phone, text)
+        send_whatsapp_message(phone, text, business_info.get("whatsapp_phone_number_id"))
     elif channel == "sms":
-        send_sms_message(phone, text)
+        send_sms_message(phone, text, business_info.get("sms_number"))
@@ -0,0 +1,107 @@
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. Slow successes count as failures.
+
+    CLOSED    → calls go through
+    OPEN      → calls skipped until reset_timeout_seconds have passed
+    HALF_OPEN → one probe call; success closes, failure re-opens.
+                A probe that reports nothing (cancelled turn) is given up on
+                after probe_timeout_seconds and another one is let through.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 3.0,
+        reset_timeout_seconds: float = 30.0,
+        probe_timeout_seconds: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.probe_started_at = None
+
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout_seconds:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+
+            if self.state == CLOSED:
+                return True
+
+            if self.state == HALF_OPEN and self.probe_in_flight:
+                if now - self.probe_started_at >= self.probe_timeout_seconds:
+                    self.probe_in_flight = False   # abandoned probe
+
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                self.probe_started_at = now
+                return True
+
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, latency_seconds: float):
+        if latency_seconds >= self.slow_call_seconds:
+            self.record_failure()
+            return
+
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """
+        The call ended without an outcome (cancelled): let the next one probe.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+            }
@@ -1,23 +1,40 @@
-import json
+import asyncio
 from datetime import datetime, timedelta, timezone
 from random import choice
 import os
 import time
 
-from groq import Groq
-from models import Booking, Session, Business, ConversationSession
+from groq import Groq, AsyncGroq, APITimeoutError
+from models import Session
+from sqlalchemy import func, inspect, update
 from sqlalchemy.orm import Session as DBSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from prompts import build_system_prompt
+from prompts import get_system_prompt
 from services.intent_normalizer import normalize_intent
 
 from services.booking_service import (
     extract_booking_ref_id,
+    find_booking,
+    get_latest_booking,
 )
 from services.faq_service import (
     handle_faq_reply,
     infer_faq_intent_from_text,
 )
+from services.lexical_classifier import classify_lexically, classify_degraded
+from services.llm_output_parser import parse_llm_output
+from services import metrics
+from services.circuit_breaker import CircuitBreaker
+from services.llm_cache import (
+    build_cache_key,
+    get_cached_classification,
+    store_classification,
+)
+from services.session_loader import load_session_context, lock_session
+from services.availability_index import availability_index
+from services.business_loader import business_config_cache
+from services.engine_pool import engine_pool
 from services.conversation_logger import (
     finalize_response
 )
@@ -68,8 +85,37 @@ SERVICE_QUESTIONS = [
     "What service are you looking for?"
 ]
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Initialize Groq clients (retries off: the per-turn deadline decides)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=LLM_MAX_RETRIES)
+async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=LLM_MAX_RETRIES)
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+
+# Model ladder: cheapest first. The next rung is asked only when the answer
+# is unparseable or below LLM_CONFIDENCE_THRESHOLD (and the deadline allows).
+LLM_MODEL_LADDER = [
+    m.strip()
+    for m in os.getenv("LLM_MODEL_LADDER", f"{LLM_MODEL},llama-3.3-70b-versatile").split(",")
+    if m.strip()
+]
+
+# Below this the turn counts as a failure (fail_count / handoff)
+LLM_CONFIDENCE_THRESHOLD = 0.6
+
+# Whole-turn budget for the LLM call; past it we degrade to regex extraction
+LLM_TURN_DEADLINE_SECONDS = float(os.getenv("LLM_TURN_DEADLINE_SECONDS", "6"))
+LLM_MIN_TIMEOUT_SECONDS = 0.5
+
+# Provider incidents: stop calling the LLM after repeated failures/slow calls,
+# probe again after the reset timeout. While open, turns run in degraded mode.
+llm_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "3")),
+    reset_timeout_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    # No probe call outlives its turn's deadline
+    probe_timeout_seconds=LLM_TURN_DEADLINE_SECONDS,
+)
+metrics.register("llm_breaker", llm_breaker.stats)
 
 def ensure_utc_aware(dt: datetime | None) -> datetime | None:
     """
@@ -119,35 +165,34 @@ def booking_continue_prompt(session: Session) -> str:
 
     return "To continue, please share the service, date, and time."
 
-def get_int(session: Session, field: str, default: int = 0) -> int:
-    val = getattr(session, field, None)
-    try:
-        return int(val)
-    except Exception:
-        return default
-
-def set_int(session: Session, field: str, value: int):
-    setattr(session, field, str(value))
-
 def reset_failures(session: Session):
-    set_int(session, "fail_count", 0)
-    set_int(session, "handoff_offered", 0)
+    session.fail_count = 0
+    session.handoff_offered = False
 
 def increment_failure(session: Session, db, now: datetime):
-    current = get_int(session, "fail_count", 0)
-    set_int(session, "fail_count", current + 1)
+    # Server-side increment: two concurrent turns for one phone both count.
+    # A reset earlier in this turn isn't flushed yet (autoflush is off) —
+    # increment from that value instead of the stored one.
+    history = inspect(session).attrs.fail_count.history
+    base = history.added[0] if history.added else func.coalesce(Session.fail_count, 0)
+
+    fail_count = db.execute(
+        update(Session)
+        .where(Session.business_id == session.business_id, Session.session_id == session.session_id)
+        .values(fail_count=base + 1)
+        .returning(Session.fail_count)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+    set_committed_value(session, "fail_count", fail_count)
     session.updated_at = now
-    db.commit()
 
 def should_handoff(session: Session) -> bool:
-    fail_count = get_int(session, "fail_count", 0)
-    offered = get_int(session, "handoff_offered", 0)
-    return fail_count >= 3 and offered == 0
+    return (session.fail_count or 0) >= 3 and not session.handoff_offered
 
 def offer_handoff(session: Session, db, now: datetime):
-    set_int(session, "handoff_offered", 1)
+    session.handoff_offered = True
     session.updated_at = now
-    db.commit()
 
 def apply_session_timeout_reset(session, now, db):
     """
@@ -162,7 +207,6 @@ def apply_session_timeout_reset(session, now, db):
         session.expired_last_turn = True
         session.expired_from_state = prev_state
 
-        db.commit()
         return True, prev_state
 
     return False, None
@@ -171,7 +215,6 @@ def clear_expired_flags(session, db):
     if getattr(session, "expired_last_turn", False):
         session.expired_last_turn = False
         session.expired_from_state = None
-        db.commit()
 
 def handle_expired_session_ux(session, intent, user_text, db):
     """
@@ -268,66 +311,109 @@ def reset_session(session: Session, now: datetime):
     session.handoff_offered = False
 
 
-def handle_message(
+def call_llm(user_text: str, system_prompt: str, timeout: float | None = None, model: str = LLM_MODEL) -> str:
+    completion = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text}
+        ],
+        temperature=0,
+        timeout=timeout
+    )
+    return completion_content(completion)
+
+async def call_llm_async(user_text: str, system_prompt: str, timeout: float | None = None, model: str = LLM_MODEL) -> str:
+    completion = await async_client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text}
+        ],
+        temperature=0,
+        timeout=timeout
+    )
+    return completion_content(completion)
+
+def completion_content(completion) -> str:
+    # Support both real Groq response and mocked test dict
+    if isinstance(completion, dict):
+        return completion["choices"][0]["message"]["content"]
+    return completion.choices[0].message.content
+
+def remaining_deadline(turn: dict) -> float:
+    elapsed = time.time() - turn["start_time"]
+    return max(LLM_MIN_TIMEOUT_SECONDS, LLM_TURN_DEADLINE_SECONDS - elapsed)
+
+def turn_business_id(db: DBSession, business_id=None) -> str | None:
+    """
+    The business a turn belongs to, as a str: business_id, or the active
+    business for unrouted traffic. Keys per-session turn ordering.
+    """
+    if business_id:
+        return str(business_id)
+    config = business_config_cache.active(db)
+    return config.id if config else None
+
+def start_turn(
     session_id: str,
     user_text: str,
     message_id: str | None,
     channel: str,
     db: DBSession,
-    business_info: dict,
-    calendar_service=None,
-    GOOGLE_CALENDAR_ID=None,
-):
-    start_time = time.time()
-    llm_raw = None
-    error_flag = False
-    session_id = session_id
-    user_text = user_text.strip()
-    now = datetime.now(timezone.utc)
+    coalesced_message_ids=None,
+    business_id=None,
+) -> dict:
+    """
+    Loads / creates the session rows (of business_id, or of the active
+    business), applies the FSM timeout reset and idempotency. Returns the per-turn context; turn["response"] is set
+    when the turn ends here (missing id / duplicate message).
+    """
+    turn = {
+        "session_id": session_id,
+        "user_text": user_text.strip(),
+        "now": datetime.now(timezone.utc),
+        "start_time": time.time(),
+        "data": None,
+        "llm_raw": None,
+        "error_flag": False,
+        "error_type": None,
+        "model_version": None,
+        "response": None,
+        "commits_before": db.info.get("commits", 0),
+        # ConversationSession deltas, applied atomically by finalize_response
+        "counters": {"fallback_count": 0, "handoff_count": 0},
+    }
+    now = turn["now"]
 
     if not session_id:
-        return {"intent": "error", "reply": "Something went wrong. Please try again."}
+        turn["response"] = {"intent": "error", "reply": "Something went wrong. Please try again."}
+        return turn
     
     # --------------------------------------------------
-    # FETCH / CREATE SESSION
-    # --------------------------------------------------
-    session = db.query(Session).filter(Session.session_id == session_id).first()
-    business = db.query(Business).filter(Business.is_active == True).first()
+    # FETCH / CREATE SESSION + CONVERSATION SESSION (ONE ROUND TRIP)
     # --------------------------------------------------
-    # FETCH / CREATE CONVERSATION SESSION
-    # --------------------------------------------------
-    conv_session = (
-        db.query(ConversationSession)
-        .filter(ConversationSession.session_id == session_id)
-        .first()
-    )
+    # Turns of this phone in other workers wait here until our commit
+    lock_session(db, turn_business_id(db, business_id), session_id)
+    context = load_session_context(db, session_id, channel, now, business_id)
+    if context is None:
+        print("No active business configured")
+        turn["response"] = {"intent": "error", "reply": "Something went wrong. Please try again."}
+        return turn
+
+    session = context.session
+    conv_session = context.conv_session
+    turn["active_bookings"] = context.active_bookings
+
+    # Days cached before another worker's booking commit go stale here
+    availability_index.observe_version(context.business.id, context.business.booking_version)
+    # Same for the business config: rebuilt only when config_version moved
+    turn["business_info"] = business_config_cache.observe(context.business, active=business_id is None).info
 
-    if not conv_session:
-        conv_session = ConversationSession(
-            session_id=session_id,
-            business_id=business.id,
-            phone_number=session_id
-        )
-        db.add(conv_session)
-        db.commit()
-    if not session:
-        session = Session(
-            session_id=session_id,
-            booking_state="IDLE",
-            processed_message_ids=[],
-            business_id=business.id
-        )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-    
     session.channel = channel
-    db.commit()
-    fsm_state_before = session.booking_state
-
-    # Track total messages in session
-    conv_session.total_messages += 1
-    db.commit()
+    turn["session"] = session
+    turn["conv_session"] = conv_session
+    turn["fsm_state_before"] = session.booking_state
 
     # --------------------------------------------------
     # FSM TIMEOUT RESET
@@ -337,114 +423,349 @@ def handle_message(
     # --------------------------------------------------
     # IDEMPOTENCY
     # --------------------------------------------------
+    # A coalesced burst is a duplicate only if every message in it was seen
     session.processed_message_ids = session.processed_message_ids or []
-    if message_id and message_id in session.processed_message_ids:
-        return {"intent": "ignored", "reply": None}
+    message_ids = [m for m in [message_id, *(coalesced_message_ids or [])] if m]
+    if message_ids and all(m in session.processed_message_ids for m in message_ids):
+        turn["response"] = {"intent": "ignored", "reply": None}
+        return turn
 
-    if message_id:
-        session.processed_message_ids.append(message_id)
-        session.processed_message_ids = session.processed_message_ids[-20:]
-        db.commit()
+    new_ids = [m for m in message_ids if m not in session.processed_message_ids]
+    if new_ids:
+        session.processed_message_ids = (session.processed_message_ids + new_ids)[-20:]
+
+    return turn
+
+def lookup_classification(turn: dict, db: DBSession, business_info: dict) -> bool:
+    """
+    Everything that can answer without calling the LLM.
+    Returns True when turn["data"] is filled.
+    """
+    session = turn["session"]
 
     # --------------------------------------------------
-    # LLM — ALWAYS PARSE FIRST
+    # LEXICAL FAST PATH — SKIPS THE LLM FOR YES/NO/HI/CANCEL/FAQ
     # --------------------------------------------------
-    completion = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {"role": "system", "content": build_system_prompt(business_info)},
-            {"role": "user", "content": user_text}
-        ],
-        temperature=0
+    data = classify_lexically(
+        turn["user_text"],
+        session.booking_state,
+        business_info,
+        YES_WORDS,
+        NO_WORDS,
     )
-    # Support both real Groq response and mocked test dict
-    if isinstance(completion, dict):
-        raw_content = completion["choices"][0]["message"]["content"]
+
+    # --------------------------------------------------
+    # LLM CACHE (PER TEXT + PROMPT + DAY)
+    # --------------------------------------------------
+    if data is not None:
+        turn["model_version"] = "fast_path"
     else:
-        raw_content = completion.choices[0].message.content
+        system_prompt = get_system_prompt(business_info, session.booking_state)
+        turn["system_prompt"] = system_prompt
+        turn["cache_key"] = build_cache_key(turn["user_text"], system_prompt.prompt_hash, business_info)
+        data = get_cached_classification(db, turn["cache_key"])
+        if data is not None:
+            turn["model_version"] = "cache"
+
+    turn["data"] = data
+    return data is not None
+
+def parse_llm_result(turn: dict, raw_content: str, model: str, business_info: dict):
+    """
+    Keeps the previous rung's answer if this one doesn't parse.
+    """
+    data = parse_llm_output(raw_content, business_info)
+    if data is None:
+        return
+
+    turn["data"] = data
+    turn["model_version"] = model
+
+def is_low_confidence(data) -> bool:
+    if not isinstance(data, dict):
+        return True
 
     try:
-        data = json.loads(raw_content)
-        llm_raw = data
-    except Exception:
-        error_flag = True
+        return float(data.get("confidence", 1)) < LLM_CONFIDENCE_THRESHOLD
+    except (TypeError, ValueError):
+        return True
+
+def should_escalate(turn: dict, rung: int) -> bool:
+    if rung >= len(LLM_MODEL_LADDER) - 1:
+        return False
+
+    if not is_low_confidence(turn["data"]):
+        return False
+
+    if time.time() - turn["start_time"] >= LLM_TURN_DEADLINE_SECONDS:
+        return False
+
+    metrics.incr("llm.escalations")
+    return True
+
+def store_llm_result(turn: dict, db: DBSession):
+    if turn["data"] is None or turn["model_version"] not in LLM_MODEL_LADDER:
+        return
+
+    store_classification(
+        db,
+        turn["cache_key"],
+        turn["data"],
+        turn["system_prompt"].prompt_hash,
+        turn["model_version"],
+    )
+
+def apply_degraded_mode(turn: dict, business_info: dict, error_type: str):
+    """
+    No LLM answer this turn (deadline, provider error, breaker open):
+    classify with regex extraction, or answer with a short holding reply.
+    """
+    if turn["data"] is not None:
+        # A lower rung of the model ladder already answered; keep it
+        return
+
+    turn["error_type"] = error_type
+    turn["model_version"] = "degraded"
+
+    data = classify_degraded(
+        turn["user_text"],
+        turn["session"].booking_state,
+        business_info,
+        YES_WORDS,
+        NO_WORDS,
+    )
+    turn["data"] = data
+
+    if data is None:
+        turn["response"] = {
+            "intent": "llm_timeout",
+            "reply": "One moment please — I’m a little slow right now. Could you send that again?"
+        }
+
+def apply_deadline_fallback(turn: dict, business_info: dict):
+    metrics.incr("llm.deadline_exceeded")
+    llm_breaker.record_failure()
+    apply_degraded_mode(turn, business_info, "llm_deadline")
+
+def apply_error_fallback(turn: dict, business_info: dict, error: Exception):
+    print("LLM call failed:", str(error))
+    metrics.incr("llm.errors")
+    llm_breaker.record_failure()
+    apply_degraded_mode(turn, business_info, "llm_error")
+
+def breaker_allows_call(turn: dict, business_info: dict) -> bool:
+    if llm_breaker.allow_request():
+        return True
+
+    metrics.incr("llm.circuit_open_skips")
+    apply_degraded_mode(turn, business_info, "llm_circuit_open")
+    return False
+
+def classify_turn(turn: dict, db: DBSession, business_info: dict):
+    """
+    Sync path: fast path → cache → LLM bounded by the turn deadline.
+    """
+    if lookup_classification(turn, db, business_info):
+        return
+
+    if not breaker_allows_call(turn, business_info):
+        return
+
+    for rung, model in enumerate(LLM_MODEL_LADDER):
+        started = time.monotonic()
+        try:
+            raw_content = call_llm(
+                turn["user_text"],
+                turn["system_prompt"].text,
+                timeout=remaining_deadline(turn),
+                model=model,
+            )
+        except APITimeoutError:
+            apply_deadline_fallback(turn, business_info)
+            break
+        except Exception as e:
+            apply_error_fallback(turn, business_info, e)
+            break
+
+        llm_breaker.record_success(time.monotonic() - started)
+        parse_llm_result(turn, raw_content, model, business_info)
+
+        if not should_escalate(turn, rung):
+            break
+
+    store_llm_result(turn, db)
+
+async def classify_turn_async(turn: dict, db: DBSession, business_info: dict):
+    """
+    Async path for async webhook handlers: the LLM wait doesn't block the
+    event loop, and the cache lookups run on the engine pool.
+    """
+    if await engine_pool.run(lookup_classification, turn, db, business_info):
+        return
+
+    if not breaker_allows_call(turn, business_info):
+        return
+
+    for rung, model in enumerate(LLM_MODEL_LADDER):
+        deadline = remaining_deadline(turn)
+        started = time.monotonic()
+        try:
+            raw_content = await asyncio.wait_for(
+                call_llm_async(turn["user_text"], turn["system_prompt"].text, timeout=deadline, model=model),
+                timeout=deadline,
+            )
+        except (asyncio.TimeoutError, APITimeoutError):
+            apply_deadline_fallback(turn, business_info)
+            break
+        except asyncio.CancelledError:
+            # Client gone / shutdown: no verdict on the provider, but free a half-open probe
+            llm_breaker.release_probe()
+            raise
+        except Exception as e:
+            apply_error_fallback(turn, business_info, e)
+            break
+
+        llm_breaker.record_success(time.monotonic() - started)
+        parse_llm_result(turn, raw_content, model, business_info)
+
+        if not should_escalate(turn, rung):
+            break
+
+    await engine_pool.run(store_llm_result, turn, db)
+
+def handle_message(
+    session_id: str,
+    user_text: str,
+    message_id: str | None,
+    channel: str,
+    db: DBSession,
+    business_info: dict | None = None,
+    calendar_service=None,
+    GOOGLE_CALENDAR_ID=None,
+    coalesced_message_ids=None,
+    business_id=None,
+    on_finalize=None,
+):
+    # on_finalize(response): changes the caller wants in the turn's own commit
+    # One turn per session at a time (see EnginePool); EngineBusy when the queue is full
+    business_key = turn_business_id(db, business_id)
+    with engine_pool.turn_sync((business_key, session_id), business_key):
+        try:
+            turn = start_turn(session_id, user_text, message_id, channel, db, coalesced_message_ids, business_id)
+            if turn["response"]:
+                # Duplicate delivery / bad request: nothing from this turn is kept
+                db.rollback()
+                return turn["response"]
+            turn["on_finalize"] = on_finalize
+
+            # Defaults to the active business's cached config
+            business_info = business_info or turn["business_info"]
+            classify_turn(turn, db, business_info)
+
+            return complete_turn(turn, db, business_info, calendar_service, GOOGLE_CALENDAR_ID)
+        except Exception:
+            db.rollback()
+            raise
+
+async def handle_message_async(
+    session_id: str,
+    user_text: str,
+    message_id: str | None,
+    channel: str,
+    db: DBSession,
+    business_info: dict | None = None,
+    calendar_service=None,
+    GOOGLE_CALENDAR_ID=None,
+    coalesced_message_ids=None,
+    business_id=None,
+):
+    """
+    handle_message for async handlers. Blocking work (DB, Stripe, Calendar)
+    runs on the engine pool, one call at a time, so the session is never
+    used by two threads at once; the LLM call is awaited on the loop.
+    """
+    # Routed channels always name the business; the fallback may query on a cold cache
+    business_key = str(business_id) if business_id else await engine_pool.run(turn_business_id, db, None)
+    async with engine_pool.turn((business_key, session_id), business_key):
+        try:
+            turn = await engine_pool.run(
+                start_turn, session_id, user_text, message_id, channel, db, coalesced_message_ids, business_id,
+            )
+            if turn["response"]:
+                await engine_pool.run(db.rollback)
+                return turn["response"]
+
+            business_info = business_info or turn["business_info"]
+            await classify_turn_async(turn, db, business_info)
+
+            return await engine_pool.run(
+                complete_turn, turn, db, business_info, calendar_service, GOOGLE_CALENDAR_ID,
+            )
+        except Exception:
+            await engine_pool.run(db.rollback)
+            raise
+
+def complete_turn(
+    turn: dict,
+    db: DBSession,
+    business_info: dict,
+    calendar_service=None,
+    GOOGLE_CALENDAR_ID=None,
+):
+    """
+    Failure handling + intent routing + FSM, once turn["data"] is known.
+    """
+    session = turn["session"]
+    conv_session = turn["conv_session"]
+    session_id = turn["session_id"]
+    user_text = turn["user_text"]
+    now = turn["now"]
+    data = turn["data"]
+    active_bookings = turn["active_bookings"]
+
+    # Deadline hit and nothing could be extracted
+    if turn["response"]:
+        return finalize_response(db, turn, turn["response"])
+
+    if data is not None:
+        turn["llm_raw"] = data
+    else:
+        turn["error_flag"] = True
         increment_failure(session, db, now)
 
         if should_handoff(session):
             offer_handoff(session, db, now)
             reset_session(session, now)
-            db.commit()
             response = {
                 "intent": "handoff",
                 "reply": "Sorry — I’m having trouble understanding. Would you like to speak to a human? Please call +1-XXX-XXX-XXXX 📞"
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         response = {"intent": "fallback", "reply": "Sorry, I didn’t quite catch that. Could you rephrase?"}
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
     confidence = data.get("confidence", 1)
 
     # safeguard
-    if confidence < 0.6:
+    if confidence < LLM_CONFIDENCE_THRESHOLD:
 
         increment_failure(session, db, now)
 
         if should_handoff(session):
             offer_handoff(session, db, now)
             reset_session(session, now)
-            db.commit()
 
             response = {
                 "intent": "handoff",
                 "reply": "Sorry — I’m having trouble understanding. Would you like to speak to a human?"
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         response = {
             "intent": "fallback",
             "reply": "Sorry, I didn’t quite catch that. Could you rephrase?"
         }
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
 
     intent = data.get("intent")
@@ -453,48 +774,26 @@ def handle_message(
         raw_intent=intent,
         user_text=user_text,
         session=session,
-        db=db
+        active_bookings=active_bookings
     )
     
     expiry_reply = handle_expired_session_ux(session, intent, user_text, db)
     if expiry_reply:
         response = expiry_reply
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     if intent == "fallback":
         increment_failure(session, db, now)
-        conv_session.fallback_count += 1
-        db.commit()
+        turn["counters"]["fallback_count"] += 1
 
         if should_handoff(session):
             offer_handoff(session, db, now)
             reset_session(session, now)
-            db.commit()
             response = {
                 "intent": "handoff",
                 "reply": "Sorry — I’m still not getting that. Would you like to speak to a human? Please call +1-XXX-XXX-XXXX"
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # FALLBACK FAQ ROUTING IF MODEL RETURNS "inquiry"
@@ -510,41 +809,19 @@ def handle_message(
     if intent in {"faq_hours", "faq_address", "faq_services", "faq_pricing"}:
         faq = handle_faq_reply(intent, business_info)
         reset_failures(session)
-        db.commit()
 
         # If user is in the middle of booking, answer + continue booking
         if session.booking_state in {"COLLECTING", "CONFIRMING"}:
             session.updated_at = now
-            db.commit()
             response = {
                 "intent": intent,
                 "reply": f"{faq}\n\n{booking_continue_prompt(session)}"
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         # If idle, just answer normally
         response = {"intent": intent, "reply": faq}
-        return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # HUMAN HANDOFF
@@ -552,48 +829,21 @@ def handle_message(
     if intent == "talk_to_human":
         reset_session(session, now)
         reset_failures(session)
-        conv_session.handoff_count += 1
-        db.commit()
+        turn["counters"]["handoff_count"] += 1
         response = {
             "intent": "talk_to_human",
             "reply": "Sure — please call the salon at +1-XXX-XXX-XXXX. (or reply with your name and we’ll have someone contact you)."
         }
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
     # --------------------------------------------------
     # BOOKING STATUS
     # --------------------------------------------------
     if intent == "booking_status":
-        latest = (
-            db.query(Booking)
-            .filter(Booking.phone_number == session_id)
-            .order_by(Booking.created_at.desc())
-            .first()
-        )
+        latest = get_latest_booking(db, session_id, session.business_id)
         reset_failures(session)
-        db.commit()
         if not latest:
             response = {"intent": "booking_status", "reply": "I don’t see any bookings yet. Would you like to make one?"}
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         response = {
             "intent": "booking_status",
@@ -606,37 +856,18 @@ def handle_message(
                 f"Ref ID: {latest.id}"
             )
         }
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
     
     # --------------------------------------------------
     # REMINDER REPLY INTERCEPTOR (NON-FSM)
     # --------------------------------------------------
     if session.last_reminder_booking_id:
 
-        booking = (
-            db.query(Booking)
-            .filter(
-                Booking.id == session.last_reminder_booking_id,
-                Booking.phone_number == session_id,
-                Booking.status == "CONFIRMED"
-            )
-            .first()
-        )
+        booking = find_booking(active_bookings, "CONFIRMED", session.last_reminder_booking_id)
 
         # If booking no longer valid, clear reminder context
         if not booking:
             session.last_reminder_booking_id = None
-            db.commit()
             # continue normal routing
 
         else:
@@ -648,28 +879,17 @@ def handle_message(
             if intent == "booking_confirm" or text_lower in YES_WORDS:
 
                 # 🔥 Calculate appointment time
-                appointment_time = booking_to_datetime(db, booking)
+                appointment_time = booking_to_datetime(booking, business_info)
 
                 # 🔥 Block late confirmations
                 if now > appointment_time:
                     session.last_reminder_booking_id = None
-                    db.commit()
 
                     response = {
                         "intent": "late_confirmation",
                         "reply": "That appointment time has already passed. Would you like to book a new slot?"
                     }
-                    return finalize_response(
-                        db,
-                        session,
-                        session_id,
-                        user_text,
-                        response,
-                        llm_raw,
-                        start_time,
-                        error_flag,
-                        fsm_state_before
-                    )
+                    return finalize_response(db, turn, response)
                             
                 # 🔥 Only clear risk after 2h confirmation
                 if booking.reminder_2h_sent:
@@ -679,23 +899,12 @@ def handle_message(
                 session.last_reminder_booking_id = None
                 session.updated_at = now
                 reset_failures(session)
-                db.commit()
 
                 response = {
                     "intent": "reminder_confirmed",
                     "reply": "Perfect 👍 We’ll see you then!"
                 }
-                return finalize_response(
-                    db,
-                    session,
-                    session_id,
-                    user_text,
-                    response,
-                    llm_raw,
-                    start_time,
-                    error_flag,
-                    fsm_state_before
-                )
+                return finalize_response(db, turn, response)
 
             # -------------------------------
             # CANCEL → move to cancel flow
@@ -709,7 +918,6 @@ def handle_message(
                 session.booking_state = "CANCEL_CONFIRM"
                 session.pending_booking_id = booking.id
                 session.updated_at = now
-                db.commit()
 
                 response = {
                     "intent": "cancel_confirmation",
@@ -719,24 +927,13 @@ def handle_message(
                         "Reply YES to cancel or NO to keep it."
                     )
                 }
-                return finalize_response(
-                    db,
-                    session,
-                    session_id,
-                    user_text,
-                    response,
-                    llm_raw,
-                    start_time,
-                    error_flag,
-                    fsm_state_before
-                )
+                return finalize_response(db, turn, response)
 
             # -------------------------------
             # Any other message → ignore reminder context
             # Let normal FSM handle it
             # -------------------------------
             session.last_reminder_booking_id = None
-            db.commit()
 
     # --------------------------------------------------
     # CANCEL CONFIRM STATE
@@ -753,38 +950,21 @@ def handle_message(
         YES_WORDS=YES_WORDS,
         NO_WORDS=NO_WORDS,
         reset_failures=reset_failures,
+        active_bookings=active_bookings,
     )
 
     if cancel_response:
         response = cancel_response
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # CONFIRMING STATE (PENDING BOOKINGS)
     # --------------------------------------------------
-    pending_booking = (
-        db.query(Booking)
-        .filter(
-            Booking.phone_number == session_id,
-            Booking.status == "PENDING"
-        )
-        .first()
-    )
+    pending_booking = find_booking(active_bookings, "PENDING")
     if pending_booking:
         if expire_payment_if_needed(pending_booking, db, now):
             session.booking_state = "IDLE"
             session.updated_at = now
-            db.commit()
 
             response = {
                 "intent": "payment_expired",
@@ -793,17 +973,7 @@ def handle_message(
                     "Would you like to try booking again?"
                 )
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
         
     confirming_response = handle_confirming_state(
         session=session,
@@ -824,17 +994,7 @@ def handle_message(
 
     if confirming_response:
         response = confirming_response
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # CANCEL FLOW (INITIATE CANCELLATION) - supports Ref ID
@@ -847,41 +1007,19 @@ def handle_message(
         session.last_question = None
 
         ref_id = extract_booking_ref_id(user_text)
-
-        q = db.query(Booking).filter(
-            Booking.phone_number == session_id,
-            Booking.status == "CONFIRMED"
-        )
-
-        if ref_id:
-            q = q.filter(Booking.id == ref_id)
-        else:
-            q = q.order_by(Booking.created_at.desc())
-
-        booking_to_cancel = q.first()
+        booking_to_cancel = find_booking(active_bookings, "CONFIRMED", ref_id)
 
         if not booking_to_cancel:
             response = {
                 "intent": "booking_cancel",
                 "reply": "I couldn’t find a confirmed appointment to cancel. If you have a reference ID, please share it."
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         session.booking_state = "CANCEL_CONFIRM"
         session.pending_booking_id = booking_to_cancel.id
         session.updated_at = now
         reset_failures(session)
-        db.commit()
 
         response = {
             "intent": "cancel_confirmation",
@@ -891,17 +1029,7 @@ def handle_message(
                 "Reply YES to cancel or NO to keep it."
             )
         }
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # RESCHEDULE FLOW (INITIATE) - supports Ref ID
@@ -914,35 +1042,14 @@ def handle_message(
         session.last_question = None
 
         ref_id = extract_booking_ref_id(user_text)
-
-        q = db.query(Booking).filter(
-            Booking.phone_number == session_id,
-            Booking.status == "CONFIRMED"
-        )
-
-        if ref_id:
-            q = q.filter(Booking.id == ref_id)
-        else:
-            q = q.order_by(Booking.created_at.desc())
-
-        booking_to_reschedule = q.first()
+        booking_to_reschedule = find_booking(active_bookings, "CONFIRMED", ref_id)
 
         if not booking_to_reschedule:
             response = {
                 "intent": "booking_reschedule",
                 "reply": "I couldn’t find a confirmed appointment to reschedule. If you have a reference ID, please share it."
             }
-            return finalize_response(
-                db,
-                session,
-                session_id,
-                user_text,
-                response,
-                llm_raw,
-                start_time,
-                error_flag,
-                fsm_state_before
-            )
+            return finalize_response(db, turn, response)
 
         session.booking_state = "RESCHEDULE_COLLECTING"
         session.reschedule_target_booking_id = booking_to_reschedule.id
@@ -950,7 +1057,6 @@ def handle_message(
         session.reschedule_new_time = booking_to_reschedule.time
         session.updated_at = now
         reset_failures(session)
-        db.commit()
         
     # --------------------------------------------------
     # RESCHEDULE COLLECTING & CONFIRM STATE
@@ -975,21 +1081,12 @@ def handle_message(
         TIME_QUESTIONS=TIME_QUESTIONS,
         YES_WORDS=YES_WORDS,
         NO_WORDS=NO_WORDS,
+        active_bookings=active_bookings,
     )
 
     if reschedule_response:
         response = reschedule_response
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # IDLE STATE (SMART START)
@@ -1014,7 +1111,6 @@ def handle_message(
             session.updated_at = now
             reset_failures(session)
 
-            db.commit()
 
             # Now COLLECTING block will ask only missing info
             # So we can fall-through by NOT returning here
@@ -1033,23 +1129,12 @@ def handle_message(
         session.updated_at = now
         reset_session(session, now)
         reset_failures(session)
-        db.commit()
 
         response = {
             "intent": "booking_cancelled",
             "reply": "Got it. I’ve cancelled this booking request. Would you like to book something else?"
         }
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
 
     # --------------------------------------------------
     # COLLECTING STATE
@@ -1071,34 +1156,15 @@ def handle_message(
         offer_handoff=offer_handoff,
         reset_session=reset_session,
         reset_failures=reset_failures,
+        active_bookings=active_bookings,
     )
 
     if collecting_response:
         response = collecting_response
-        return finalize_response(
-            db,
-            session,
-            session_id,
-            user_text,
-            response,
-            llm_raw,
-            start_time,
-            error_flag,
-            fsm_state_before
-        )
+        return finalize_response(db, turn, response)
     
     response = {
         "intent": intent or "fallback",
         "reply": data.get("reply") or f"Welcome to {business_info['name']}! How can I help you today?"
     }
-    return finalize_response(
-        db,
-        session,
-        session_id,
-        user_text,
-        response,
-        llm_raw,
-        start_time,
-        error_flag,
-        fsm_state_before
-    )
+    return finalize_response(db, turn, response)
@@ -1,6 +1,8 @@
 import json
 from datetime import datetime
-from models import ConversationMessage, FSMTransition
+from sqlalchemy import Float, case, cast, func, update
+from models import ConversationMessage, ConversationSession, FSMTransition
+from services import metrics
 import time
 
 def log_conversation_message(
@@ -16,7 +18,9 @@ def log_conversation_message(
     fsm_state_before=None,
     fsm_state_after=None,
     latency_ms=None,
-    error=False
+    error=False,
+    error_type=None,
+    model_version=None
 ):
 
     # ---------------------------
@@ -36,6 +40,8 @@ def log_conversation_message(
             fsm_state_after=fsm_state_after,
             latency_ms=latency_ms,
             is_error=error,
+            error_type=error_type,
+            model_version=model_version,
             created_at=datetime.utcnow()
         )
 
@@ -58,6 +64,8 @@ def log_conversation_message(
             fsm_state_after=fsm_state_after,
             latency_ms=latency_ms,
             is_error=error,
+            error_type=error_type,
+            model_version=model_version,
             created_at=datetime.utcnow()
         )
 
@@ -83,19 +91,41 @@ def log_fsm_transition(
 
     db.add(transition)
 
-def finalize_response(
-    db,
-    session,
-    session_id,
-    user_text,
-    response,
-    llm_raw,
-    start_time,
-    error_flag,
-    fsm_state_before
-):
+def update_conversation_counters(db, business_id, session_id, latency_ms, counters):
+    """
+    One UPDATE with server-side increments (no lost updates between
+    concurrent turns) and avg_latency_ms kept as a running mean.
+    """
+    total = func.coalesce(ConversationSession.total_messages, 0)
+    avg = ConversationSession.avg_latency_ms
+
+    values = {
+        "total_messages": total + 1,
+        "avg_latency_ms": case(
+            (avg.is_(None), latency_ms),
+            else_=func.round((avg * cast(total, Float) + latency_ms) / (total + 1)),
+        ),
+    }
+    for field, delta in counters.items():
+        if delta:
+            column = getattr(ConversationSession, field)
+            values[field] = func.coalesce(column, 0) + delta
+
+    db.execute(
+        update(ConversationSession)
+        .where(ConversationSession.business_id == business_id, ConversationSession.session_id == session_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+def finalize_response(db, turn, response):
 
-    latency_ms = int((time.time() - start_time) * 1000)
+    session = turn["session"]
+    session_id = turn["session_id"]
+    llm_raw = turn["llm_raw"]
+    fsm_state_before = turn["fsm_state_before"]
+
+    latency_ms = int((time.time() - turn["start_time"]) * 1000)
 
     fsm_state_after = session.booking_state
 
@@ -112,7 +142,7 @@ def finalize_response(
         business_id=session.business_id,
         session_id=session_id,
         phone_number=session_id,
-        user_message=user_text,
+        user_message=turn["user_text"],
         bot_reply=response.get("reply"),
         intent=response.get("intent"),
         llm_raw=llm_raw,
@@ -120,7 +150,9 @@ def finalize_response(
         fsm_state_before=fsm_state_before,  # ✅ NEW
         fsm_state_after=fsm_state_after,    # ✅ NEW
         latency_ms=latency_ms,
-        error=error_flag
+        error=turn["error_flag"],
+        error_type=turn.get("error_type"),
+        model_version=turn.get("model_version")
     )
 
     # -------------------------------
@@ -137,12 +169,38 @@ def finalize_response(
             intent=response.get("intent")
         )
 
+    # -------------------------------
+    # CONVERSATION COUNTERS
+    # -------------------------------
+    if turn.get("conv_session") is not None:
+        update_conversation_counters(db, session.business_id, session_id, latency_ms, turn["counters"])
+
+    on_finalize = turn.get("on_finalize")
+    if on_finalize is not None:
+        on_finalize(response)
+
+    # The turn's single unit-of-work commit
     db.commit()
 
+    metrics.incr("turns")
+    metrics.incr("turns.commits", db.info.get("commits", 0) - turn.get("commits_before", 0))
+
     print(
         f"[LOG] session={session_id} "
         f"intent={response.get('intent')} "
         f"state={fsm_state_before}->{fsm_state_after}"
     )
 
-    return response
\ No newline at end of file
+    return response
+
+def turn_commit_stats() -> dict:
+    turns = metrics.get("turns")
+    commits = metrics.get("turns.commits")
+    return {
+        "turns": turns,
+        "commits": commits,
+        "commits_per_turn": round(commits / turns, 4) if turns else 0.0,
+    }
+
+
+metrics.register("turn_commits", turn_commit_stats)
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+from services import metrics
+
+# Turns in flight per worker. Each holds a DB connection from start_turn
+# to its commit (LLM wait included); database.py sizes the SQLAlchemy pool
+# from this, so raising it raises the pool too.
+ENGINE_MAX_CONCURRENT_TURNS = int(os.getenv("ENGINE_MAX_CONCURRENT_TURNS", "10"))
+
+# Turns waiting for a slot, in total and per session; beyond that they're shed (EngineBusy)
+ENGINE_MAX_QUEUED_TURNS = int(os.getenv("ENGINE_MAX_QUEUED_TURNS", "100"))
+ENGINE_MAX_QUEUED_PER_SESSION = int(os.getenv("ENGINE_MAX_QUEUED_PER_SESSION", "3"))
+
+# How long a thread (/chat, inbound queue workers) waits for a slot before EngineBusy
+ENGINE_MAX_SYNC_WAIT_SECONDS = float(os.getenv("ENGINE_MAX_SYNC_WAIT_SECONDS", "10"))
+
+
+class EngineBusy(Exception):
+    """
+    The turn queue (or this session's share of it) is full.
+    """
+
+
+class _Waiter:
+    __slots__ = ("key", "tenant", "grant", "granted")
+
+    def __init__(self, key, tenant, grant):
+        self.key = key
+        self.tenant = tenant
+        self.grant = grant
+        self.granted = False
+
+
+class EnginePool:
+    """
+    Admission for engine turns, plus a bounded thread pool for the blocking
+    parts of async webhook handlers (SQLAlchemy, Stripe, Google Calendar,
+    outbound HTTP) so the event loop keeps serving other requests.
+
+    turn(key, tenant) / turn_sync(...) admit at most max_turns turns at
+    once, and never two with the same key (the session: its FSM row is
+    read and rewritten by the turn). A session's turns run in arrival
+    order; different sessions run in parallel. When a slot frees, tenants
+    (businesses) with waiting turns take it round-robin, so one busy salon
+    can't starve the others. Waiting turns are capped in total and per
+    session; past the cap, EngineBusy. Threads in turn_sync also give up
+    with EngineBusy after max_wait_seconds.
+
+    Across processes, start_turn's session lock does the same job; this
+    keeps a worker's own threads and connections from queueing on it.
+
+    A turn makes one blocking call at a time, so max_turns threads are
+    enough for all admitted async turns; the SMS handler's routing lookup
+    and session close share them and show up as calls_queued. Work that
+    must not wait behind turns (the WhatsApp ack) uses its own executor.
+    """
+
+    def __init__(
+        self,
+        max_turns: int,
+        max_queued: int = 100,
+        max_queued_per_session: int = 3,
+        max_wait_seconds: float = 10.0,
+    ):
+        self.max_turns = max(1, max_turns)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self._executor = ThreadPoolExecutor(max_workers=self.max_turns, thread_name_prefix="engine")
+        self._lock = threading.Lock()
+        self._running_keys = set()
+        self._queues = {}                   # tenant -> deque[_Waiter], arrival order
+        self._tenants = deque()             # tenants with waiting turns, round-robin order
+        self._waiting_per_key = Counter()
+        self.turns_waiting = 0
+        self.turns_running = 0
+        self.calls_queued = 0
+        self.calls_running = 0
+        self.max_turns_waiting = 0
+
+    # --------------------------------------------------
+    # Admission (call with self._lock held)
+    # --------------------------------------------------
+    def _start(self, waiter: _Waiter):
+        self.turns_running += 1
+        self._running_keys.add(waiter.key)
+        waiter.granted = True
+        waiter.grant()
+
+    def _enqueue(self, key, tenant, grant) -> _Waiter:
+        waiter = _Waiter(key, tenant, grant)
+
+        # Slots left over after a dispatch only mean every waiter's session is busy
+        if (
+            self.turns_running < self.max_turns
+            and key not in self._running_keys
+            and not self._waiting_per_key[key]
+        ):
+            self._start(waiter)
+            return waiter
+
+        if self.turns_waiting >= self.max_queued or self._waiting_per_key[key] >= self.max_queued_per_session:
+            metrics.incr("engine_pool.rejected")
+            raise EngineBusy(f"turn queue full ({self.turns_waiting} waiting)")
+
+        if tenant not in self._queues:
+            self._queues[tenant] = deque()
+            self._tenants.append(tenant)
+        self._queues[tenant].append(waiter)
+        self._waiting_per_key[key] += 1
+        self.turns_waiting += 1
+        self.max_turns_waiting = max(self.max_turns_waiting, self.turns_waiting)
+        return waiter
+
+    def _unqueue(self, waiter: _Waiter):
+        queue = self._queues[waiter.tenant]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.tenant]
+            self._tenants.remove(waiter.tenant)
+        self._waiting_per_key[waiter.key] -= 1
+        if not self._waiting_per_key[waiter.key]:
+            del self._waiting_per_key[waiter.key]
+        self.turns_waiting -= 1
+
+    def _dispatch(self):
+        while self.turns_running < self.max_turns and self._tenants:
+            for _ in range(len(self._tenants)):
+                tenant = self._tenants[0]
+                self._tenants.rotate(-1)
+                # A session's first waiter is its oldest; later ones wait behind it
+                waiter = next((w for w in self._queues[tenant] if w.key not in self._running_keys), None)
+                if waiter is not None:
+                    self._unqueue(waiter)
+                    self._start(waiter)
+                    break
+            else:
+                return
+
+    def _release(self, key):
+        with self._lock:
+            self.turns_running -= 1
+            self._running_keys.discard(key)
+            self._dispatch()
+
+    # --------------------------------------------------
+    # Turns
+    # --------------------------------------------------
+    @asynccontextmanager
+    async def turn(self, key=None, tenant=None):
+        """
+        One engine turn's admission slot, for async handlers.
+        """
+        key = key if key is not None else object()   # no session: orders with nothing
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        queued_at = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(key, tenant, grant)
+
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._unqueue(waiter)
+            if granted:
+                self._release(key)
+            raise
+
+        with self._admitted(key, queued_at):
+            yield
+
+    @contextmanager
+    def turn_sync(self, key=None, tenant=None):
+        """
+        turn() for threads (/chat, inbound queue workers): blocks until
+        admitted, at most max_wait_seconds.
+        """
+        key = key if key is not None else object()
+        admitted = threading.Event()
+
+        queued_at = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(key, tenant, admitted.set)
+
+        # A waiting thread is one the caller's threadpool (Starlette's, for /chat)
+        # can't use elsewhere; give up rather than pile them up
+        if not admitted.wait(self.max_wait_seconds):
+            with self._lock:
+                if not waiter.granted:
+                    self._unqueue(waiter)
+                    metrics.incr("engine_pool.rejected")
+                    raise EngineBusy(f"no turn slot within {self.max_wait_seconds}s")
+
+        with self._admitted(key, queued_at):
+            yield
+
+    @contextmanager
+    def _admitted(self, key, queued_at: float):
+        metrics.incr("engine_pool.turn_wait_ms", (time.monotonic() - queued_at) * 1000)
+        metrics.incr("engine_pool.turns")
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        await fn(*args, **kwargs) on a pool thread.
+        """
+        with self._lock:
+            self.calls_queued += 1
+
+        def call():
+            with self._lock:
+                self.calls_queued -= 1
+                self.calls_running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.calls_running -= 1
+
+        metrics.incr("engine_pool.calls")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self) -> dict:
+        turns = metrics.get("engine_pool.turns")
+        with self._lock:
+            return {
+                "max_turns": self.max_turns,
+                "turns_running": self.turns_running,
+                "turns_waiting": self.turns_waiting,
+                "max_turns_waiting": self.max_turns_waiting,
+                "tenants_waiting": len(self._tenants),
+                "rejected": metrics.get("engine_pool.rejected"),
+                "calls_running": self.calls_running,
+                "calls_queued": self.calls_queued,
+                "turns": turns,
+                "avg_turn_wait_ms": round(metrics.get("engine_pool.turn_wait_ms") / turns, 2) if turns else 0,
+            }
+
+
+engine_pool = EnginePool(
+    ENGINE_MAX_CONCURRENT_TURNS,
+    ENGINE_MAX_QUEUED_TURNS,
+    ENGINE_MAX_QUEUED_PER_SESSION,
+    ENGINE_MAX_SYNC_WAIT_SECONDS,
+)
+metrics.register("engine_pool", engine_pool.stats)
@@ -0,0 +1,404 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal
+from models import InboundMessage
+from services import metrics
+from services.conversation_engine import handle_message
+from services.engine_pool import EngineBusy
+from services.message_coalescer import (
+    Burst,
+    MESSAGE_COALESCE_MAX_WAIT_SECONDS,
+    MESSAGE_COALESCE_WINDOW_SECONDS,
+)
+
+# Worker threads per process (0 = enqueue only; another process drains)
+INBOUND_QUEUE_WORKERS = int(os.getenv("INBOUND_QUEUE_WORKERS", "4"))
+
+# Attempts before a message is dead-lettered (status 'dead', kept for inspection)
+INBOUND_MAX_ATTEMPTS = int(os.getenv("INBOUND_MAX_ATTEMPTS", "5"))
+INBOUND_RETRY_BASE_SECONDS = float(os.getenv("INBOUND_RETRY_BASE_SECONDS", "5"))
+INBOUND_RETRY_MAX_SECONDS = float(os.getenv("INBOUND_RETRY_MAX_SECONDS", "300"))
+
+# Delay before retrying a message the engine had no room for (EngineBusy)
+INBOUND_BUSY_RETRY_SECONDS = float(os.getenv("INBOUND_BUSY_RETRY_SECONDS", "1"))
+
+# A worker that dies mid-turn loses its claim after this long
+INBOUND_LEASE_SECONDS = float(os.getenv("INBOUND_LEASE_SECONDS", "120"))
+
+# Idle workers re-check the table this often (enqueues in this process wake them at once)
+INBOUND_POLL_SECONDS = float(os.getenv("INBOUND_POLL_SECONDS", "1"))
+
+# Handled messages are kept this long: the dedupe window for redelivered webhooks
+INBOUND_RETENTION_HOURS = float(os.getenv("INBOUND_RETENTION_HOURS", str(7 * 24)))
+
+PENDING_STATUSES = ("queued", "processing")
+
+
+def enqueue_messages(messages: list[dict]) -> int:
+    """
+    Durably store inbound messages (dicts of InboundMessage columns) in one
+    commit. Redeliveries of a stored message_id are dropped. Returns how
+    many were new.
+    """
+    if not messages:
+        return 0
+
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        stmt = (
+            insert(InboundMessage)
+            .values([{"status": "queued", "attempts": 0, "available_at": now, "received_at": now, **m} for m in messages])
+            .on_conflict_do_nothing(index_elements=["channel", "message_id"])
+            .returning(InboundMessage.id)
+        )
+        enqueued = len(db.execute(stmt).all())
+        db.commit()
+    finally:
+        db.close()
+
+    metrics.incr("inbound_queue.enqueued", enqueued)
+    metrics.incr("inbound_queue.duplicates", len(messages) - enqueued)
+    if enqueued:
+        inbound_workers.notify()
+    return enqueued
+
+
+def retry_delay(attempts: int) -> timedelta:
+    seconds = INBOUND_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, INBOUND_RETRY_MAX_SECONDS))
+
+
+def claim_next(db, now: datetime) -> list[InboundMessage]:
+    """
+    Claim the oldest ready message whose sender has nothing earlier still
+    pending (FOR UPDATE SKIP LOCKED: workers never wait on each other),
+    plus, with coalescing on, the sender's later queued messages.
+
+    Different senders are processed in parallel; one sender's messages
+    run one turn at a time, in arrival order. Returns [] when idle.
+    """
+    m = InboundMessage
+    earlier = aliased(InboundMessage)
+    same_sender = and_(earlier.business_id == m.business_id, earlier.session_id == m.session_id)
+
+    conditions = [
+        or_(
+            and_(m.status == "queued", m.available_at <= now),
+            and_(m.status == "processing", m.locked_until < now),   # worker died mid-turn
+        ),
+        ~exists().where(same_sender, earlier.id < m.id, earlier.status.in_(PENDING_STATUSES)),
+    ]
+
+    window = MESSAGE_COALESCE_WINDOW_SECONDS
+    if window > 0:
+        # Wait for the sender to go quiet, as the webhook-side coalescer did
+        still_typing = exists().where(
+            same_sender,
+            earlier.status == "queued",
+            earlier.received_at > now - timedelta(seconds=window),
+        )
+        conditions.append(
+            or_(~still_typing, m.received_at <= now - timedelta(seconds=MESSAGE_COALESCE_MAX_WAIT_SECONDS))
+        )
+
+    head = (
+        db.query(m)
+        .filter(*conditions)
+        .order_by(m.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if head is None:
+        return []
+
+    if head.attempts >= INBOUND_MAX_ATTEMPTS:
+        # Every claim so far ended with the worker dying: don't take the next one down too
+        head.status = "dead"
+        head.locked_until = None
+        head.last_error = head.last_error or "lease expired"
+        db.commit()
+        metrics.incr("inbound_queue.dead_lettered")
+        print(f"[INBOUND_DEAD] id={head.id} message_id={head.message_id} error=lease expired")
+        return claim_next(db, now)
+
+    rows = [head]
+    if window > 0:
+        rows += (
+            db.query(m)
+            .filter(
+                m.business_id == head.business_id,
+                m.session_id == head.session_id,
+                m.status == "queued",
+                m.id > head.id,
+            )
+            .order_by(m.id)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    for row in rows:
+        if row.attempts == 0:
+            metrics.incr("inbound_queue.lag_ms", (now - row.received_at).total_seconds() * 1000)
+            metrics.incr("inbound_queue.first_claims")
+        row.status = "processing"
+        row.attempts += 1
+        row.locked_until = now + timedelta(seconds=INBOUND_LEASE_SECONDS)
+    db.commit()
+
+    return rows
+
+
+def send_reply(row: InboundMessage, reply: str):
+    if row.channel == "whatsapp":
+        from channels.whatsapp import send_whatsapp_message
+        if not send_whatsapp_message(row.session_id, reply, row.reply_from):
+            raise RuntimeError("WhatsApp send failed")
+    else:
+        raise ValueError(f"no sender for channel {row.channel}")
+
+
+def fail_messages(db, rows: list[InboundMessage], error: Exception):
+    db.rollback()
+    now = datetime.now(timezone.utc)
+
+    for row in rows:
+        row.last_error = repr(error)[:1000]
+        row.locked_until = None
+        if row.attempts >= INBOUND_MAX_ATTEMPTS:
+            row.status = "dead"
+            metrics.incr("inbound_queue.dead_lettered")
+            print(f"[INBOUND_DEAD] id={row.id} message_id={row.message_id} error={error!r}")
+        else:
+            row.status = "queued"
+            row.available_at = now + retry_delay(row.attempts)
+            metrics.incr("inbound_queue.retried")
+            print(f"[INBOUND_RETRY] id={row.id} attempt={row.attempts} error={error!r}")
+    db.commit()
+
+
+def defer_messages(db, rows: list[InboundMessage]):
+    """
+    The engine's turn queue is full: not the message's fault. Requeue
+    shortly, handing back the attempt claim_next took.
+    """
+    db.rollback()
+    available_at = datetime.now(timezone.utc) + timedelta(seconds=INBOUND_BUSY_RETRY_SECONDS)
+
+    for row in rows:
+        row.status = "queued"
+        row.attempts -= 1
+        row.locked_until = None
+        row.available_at = available_at
+    db.commit()
+    metrics.incr("inbound_queue.deferred")
+
+
+def process_next() -> bool:
+    """
+    Claim and handle one turn's worth of messages. Returns False when
+    nothing was ready.
+    """
+    db = SessionLocal()
+    try:
+        rows = claim_next(db, datetime.now(timezone.utc))
+        if not rows:
+            return False
+
+        head = rows[0]
+        try:
+            if head.reply_text is None:
+                burst = Burst(head.text, head.message_id)
+                for row in rows[1:]:
+                    burst.add(row.text, row.message_id)
+
+                def keep_reply(response):
+                    # In the turn's own commit: a crash before the send resends it
+                    # instead of re-running the turn (which would be "ignored")
+                    head.reply_text = response.get("reply") or ""
+
+                from app import calendar_service, GOOGLE_CALENDAR_ID
+                response = handle_message(
+                    session_id=head.session_id,
+                    user_text=burst.text,
+                    message_id=burst.message_id,
+                    channel=head.channel,
+                    db=db,
+                    calendar_service=calendar_service,
+                    GOOGLE_CALENDAR_ID=GOOGLE_CALENDAR_ID,
+                    coalesced_message_ids=burst.coalesced_message_ids,
+                    business_id=head.business_id,
+                    on_finalize=keep_reply,
+                )
+                if head.reply_text is None:
+                    # Duplicate delivery: the turn committed nothing
+                    head.reply_text = response.get("reply") or ""
+                    db.commit()
+
+            if head.reply_text:
+                send_reply(head, head.reply_text)
+        except EngineBusy:
+            defer_messages(db, rows)
+            return True
+        except Exception as e:
+            fail_messages(db, rows, e)
+            return True
+
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            row.status = "done"
+            row.locked_until = None
+            row.processed_at = now
+        db.commit()
+        metrics.incr("inbound_queue.processed", len(rows))
+        return True
+    finally:
+        db.close()
+
+
+class InboundWorkerPool:
+    """
+    Threads draining inbound_messages. Any number of processes can run
+    them against the same table; SKIP LOCKED keeps claims disjoint.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"inbound-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        self._wake.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                worked = process_next()
+            except Exception as e:
+                print(f"[INBOUND_WORKER_ERROR] {e!r}")
+                worked = False
+
+            if not worked:
+                self._wake.wait(INBOUND_POLL_SECONDS)
+                self._wake.clear()
+
+    def drain(self, timeout: float = 10) -> bool:
+        """
+        Process until nothing is ready or in flight (helps the workers
+        along from the calling thread). Returns False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process_next():
+                continue
+            if pending_count(ready_only=True) == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+
+def pending_count(ready_only: bool = False) -> int:
+    db = SessionLocal()
+    try:
+        query = db.query(func.count(InboundMessage.id)).filter(InboundMessage.status.in_(PENDING_STATUSES))
+        if ready_only:
+            query = query.filter(
+                or_(InboundMessage.status == "processing", InboundMessage.available_at <= datetime.now(timezone.utc))
+            )
+        return query.scalar()
+    finally:
+        db.close()
+
+
+def purge_processed_inbound_messages():
+    """
+    Maintenance job: delete handled messages past the retention window
+    (uses the processed_at partial index). Dead letters are kept.
+    """
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(InboundMessage)
+            .filter(
+                InboundMessage.status == "done",
+                InboundMessage.processed_at <= datetime.now(timezone.utc) - timedelta(hours=INBOUND_RETENTION_HOURS),
+            )
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        metrics.incr("inbound_queue.purged", deleted)
+        return deleted
+    finally:
+        db.close()
+
+
+def inbound_queue_stats() -> dict:
+    db = SessionLocal()
+    try:
+        by_status = dict(
+            db.query(InboundMessage.status, func.count(InboundMessage.id))
+            .filter(InboundMessage.status.in_((*PENDING_STATUSES, "dead")))
+            .group_by(InboundMessage.status)
+            .all()
+        )
+        oldest = (
+            db.query(func.min(InboundMessage.received_at))
+            .filter(InboundMessage.status.in_(PENDING_STATUSES))
+            .scalar()
+        )
+    finally:
+        db.close()
+
+    first_claims = metrics.get("inbound_queue.first_claims")
+    return {
+        "workers": inbound_workers.workers,
+        "queued": by_status.get("queued", 0),
+        "processing": by_status.get("processing", 0),
+        "dead": by_status.get("dead", 0),
+        # How far behind the workers are right now
+        "oldest_pending_age_seconds": (
+            round((datetime.now(timezone.utc) - oldest).total_seconds(), 2) if oldest else 0
+        ),
+        # Enqueue -> first claim, averaged
+        "avg_lag_ms": round(metrics.get("inbound_queue.lag_ms") / first_claims, 2) if first_claims else 0,
+        "enqueued": metrics.get("inbound_queue.enqueued"),
+        "duplicates": metrics.get("inbound_queue.duplicates"),
+        "processed": metrics.get("inbound_queue.processed"),
+        "retried": metrics.get("inbound_queue.retried"),
+        "deferred": metrics.get("inbound_queue.deferred"),
+        "dead_lettered": metrics.get("inbound_queue.dead_lettered"),
+    }
+
+
+inbound_workers = InboundWorkerPool(INBOUND_QUEUE_WORKERS)
+metrics.register("inbound_queue", inbound_queue_stats)
@@ -1,4 +1,4 @@
-from models import Booking
+from services.booking_service import find_booking
 
 RESCHEDULE_VERBS = {
     "reschedule", "change", "modify", "move", "update", "shift"
@@ -8,11 +8,12 @@ def normalize_intent(
     raw_intent: str | None,
     user_text: str,
     session,
-    db
+    active_bookings
 ) -> str | None:
     """
     Deterministically correct LLM intent
-    using session state + booking data.
+    using session state + booking data
+    (the turn's preloaded PENDING/CONFIRMED bookings).
     """
 
     text = (user_text or "").lower().strip()
@@ -33,14 +34,7 @@ def normalize_intent(
     if raw_intent in {"booking_modify", "booking_request"}:
         if any(v in text for v in RESCHEDULE_VERBS):
 
-            confirmed = (
-                db.query(Booking)
-                .filter(
-                    Booking.phone_number == session.session_id,
-                    Booking.status == "CONFIRMED"
-                )
-                .first()
-            )
+            confirmed = find_booking(active_bookings, "CONFIRMED")
 
             if confirmed:
                 return "booking_reschedule"
@@ -52,14 +46,7 @@ def normalize_intent(
     if raw_intent == "booking_modify":
         if session.booking_state == "IDLE":
 
-            confirmed = (
-                db.query(Booking)
-                .filter(
-                    Booking.phone_number == session.session_id,
-                    Booking.status == "CONFIRMED"
-                )
-                .first()
-            )
+            confirmed = find_booking(active_bookings, "CONFIRMED")
 
             if confirmed:
                 return "booking_reschedule"
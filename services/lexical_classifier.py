@@ -0,0 +1,252 @@
+import re
+
+from services import metrics
+from services.booking_service import extract_booking_ref_id
+from services.faq_service import infer_faq_intent_from_text
+from utils.date_utils import user_mentioned_date
+from utils.extraction_utils import safe_extract_date, safe_extract_time
+from utils.time_utils import user_mentioned_time
+
+FAST_PATH_CONFIDENCE = 0.99
+
+# Regex-only guesses: above the engine's 0.6 failure threshold, below the fast path
+DEGRADED_CONFIDENCE = 0.7
+
+# States where a new service/date/time means "change what we have"
+MODIFY_STATES = {"CONFIRMING", "RESCHEDULE_COLLECTING", "RESCHEDULE_CONFIRM"}
+
+# States where the bot just asked a YES/NO question
+CONFIRMATION_STATES = {"CONFIRMING", "CANCEL_CONFIRM", "RESCHEDULE_CONFIRM"}
+
+# YES_WORDS/NO_WORDS answer "cancel this appointment?" ("keep" it, "stop",
+# "please" do). Asked to confirm a new booking or a move, only plain
+# yes/no words are certain; anything else goes to the LLM.
+AMBIGUOUS_YES_WORDS = {"please"}
+PLAIN_NO_WORDS = {"no", "n", "nope"}
+
+GREETING_PHRASES = {
+    "hi", "hello", "hey", "hiya", "hi there", "hello there", "hey there",
+    "good morning", "good afternoon", "good evening",
+}
+
+HUMAN_PHRASES = {
+    "human", "agent", "human please", "agent please",
+    "talk to a human", "talk to a person", "talk to someone",
+    "speak to a human", "speak to a person", "speak to someone",
+    "real person",
+}
+
+CANCEL_WORDS = {"cancel", "it", "my", "the", "this", "appointment", "booking", "please", "pls"}
+RESCHEDULE_WORDS = {"reschedule", "it", "my", "the", "this", "appointment", "booking", "please", "pls"}
+
+# FAQ questions mentioning any of these go to the LLM (mixed intent)
+BOOKING_KEYWORDS = ["book", "appointment", "schedule", "cancel", "change", "move", "slot", "available"]
+
+FAQ_QUESTION_STARTS = ("what", "when", "where", "how", "do you", "are you", "is there", "can you")
+FAQ_MAX_WORDS = 8
+
+# Degraded mode only: looser keyword rules the fast path leaves to the LLM
+DEGRADED_RESCHEDULE_WORDS = {"reschedule", "move", "shift", "push", "bump", "postpone"}
+DEGRADED_STATUS_PHRASES = ("my booking", "my appointment", "booking status", "appointment status")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase, drop punctuation (keeps ' and $), collapse whitespace.
+    "Yes!!" -> "yes", "  Cancel   it. " -> "cancel it"
+    """
+    t = (text or "").lower()
+    t = re.sub(r"[^\w\s'$-]", " ", t)
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def _result(
+    intent: str,
+    service=None,
+    date=None,
+    time=None,
+    ref_id=None,
+    faq_topic=None,
+    confidence=FAST_PATH_CONFIDENCE,
+) -> dict:
+    # Same shape as the LLM JSON schema in prompts.py
+    return {
+        "intent": intent,
+        "service": service,
+        "date": date,
+        "time": time,
+        "ref_id": ref_id,
+        "faq_topic": faq_topic,
+        "confidence": confidence,
+    }
+
+
+def _match_service(text: str, business_info: dict) -> str | None:
+    for service in business_info.get("services", []):
+        if service.lower() in text:
+            return service
+    return None
+
+
+def _classify(user_text: str, booking_state: str | None, business_info: dict, yes_words, no_words) -> dict | None:
+    t = normalize_text(user_text)
+    if not t:
+        return None
+
+    # -------------------------------
+    # YES / NO replies to a confirmation question
+    # -------------------------------
+    if booking_state in CONFIRMATION_STATES:
+        if booking_state != "CANCEL_CONFIRM":
+            yes_words = set(yes_words) - AMBIGUOUS_YES_WORDS
+            no_words = set(no_words) & PLAIN_NO_WORDS
+        if t in yes_words:
+            return _result("booking_confirm")
+        if t in no_words:
+            return _result("booking_cancel")
+
+    if t in GREETING_PHRASES:
+        return _result("greeting")
+
+    if t in HUMAN_PHRASES:
+        return _result("talk_to_human")
+
+    # -------------------------------
+    # "cancel", "cancel my appointment SALON-AB12CD34"
+    # -------------------------------
+    ref_id = extract_booking_ref_id(user_text)
+    words = set((t.replace(ref_id.lower(), " ") if ref_id else t).split())
+
+    if "cancel" in words and words <= CANCEL_WORDS:
+        return _result("booking_cancel", ref_id=ref_id)
+
+    if "reschedule" in words and words <= RESCHEDULE_WORDS:
+        return _result("booking_reschedule", ref_id=ref_id)
+
+    # -------------------------------
+    # Plain FAQ questions (no date/time/booking words)
+    # -------------------------------
+    is_question = user_text.strip().endswith("?") or t.startswith(FAQ_QUESTION_STARTS)
+    if not is_question or len(t.split()) > FAQ_MAX_WORDS:
+        return None
+
+    if any(k in t for k in BOOKING_KEYWORDS):
+        return None
+
+    if user_mentioned_date(t) or user_mentioned_time(t):
+        return None
+
+    faq_intent = infer_faq_intent_from_text(t)
+    if faq_intent:
+        return _result(
+            faq_intent,
+            service=_match_service(t, business_info),
+            faq_topic=faq_intent.removeprefix("faq_"),
+        )
+
+    return None
+
+
+def classify_lexically(
+    user_text: str,
+    booking_state: str | None,
+    business_info: dict,
+    yes_words,
+    no_words,
+) -> dict | None:
+    """
+    Deterministic pre-classifier that runs before the LLM.
+    Returns a dict shaped like the LLM output for high-certainty
+    inputs, or None to let the LLM decide.
+    """
+    data = _classify(user_text, booking_state, business_info, yes_words, no_words)
+    metrics.incr("fast_path.hits" if data else "fast_path.misses")
+    return data
+
+
+def classify_degraded(
+    user_text: str,
+    booking_state: str | None,
+    business_info: dict,
+    yes_words,
+    no_words,
+) -> dict | None:
+    """
+    Regex-only classification for when the LLM is slow, failing or
+    circuit-broken. Fast-path rules first, then looser keyword rules and
+    service/date/time extraction so booking flows keep moving.
+    None when nothing usable was found.
+    """
+    data = _classify(user_text, booking_state, business_info, yes_words, no_words)
+    if data:
+        return data
+
+    t = normalize_text(user_text)
+    if not t:
+        return None
+
+    words = set(t.split())
+    ref_id = extract_booking_ref_id(user_text)
+    mentions_date = user_mentioned_date(t)
+    mentions_time = user_mentioned_time(t)
+
+    service = _match_service(t, business_info)
+    date = safe_extract_date({}, user_text, business_info) if mentions_date else None
+    time = safe_extract_time({}, user_text) if mentions_time else None
+
+    # -------------------------------
+    # Existing bookings: cancel / reschedule / status
+    # -------------------------------
+    if "cancel" in words:
+        return _result("booking_cancel", ref_id=ref_id, confidence=DEGRADED_CONFIDENCE)
+
+    if words & DEGRADED_RESCHEDULE_WORDS and booking_state not in MODIFY_STATES:
+        return _result(
+            "booking_reschedule",
+            date=date,
+            time=time,
+            ref_id=ref_id,
+            confidence=DEGRADED_CONFIDENCE,
+        )
+
+    if any(p in t for p in DEGRADED_STATUS_PHRASES) and not (mentions_date or mentions_time):
+        return _result("booking_status", ref_id=ref_id, confidence=DEGRADED_CONFIDENCE)
+
+    # -------------------------------
+    # FAQ without the question-shape requirement
+    # -------------------------------
+    if not (mentions_date or mentions_time):
+        faq_intent = infer_faq_intent_from_text(t)
+        if faq_intent:
+            return _result(
+                faq_intent,
+                service=service,
+                faq_topic=faq_intent.removeprefix("faq_"),
+                confidence=DEGRADED_CONFIDENCE,
+            )
+
+    if not (service or date or time):
+        return None
+
+    intent = "booking_modify" if booking_state in MODIFY_STATES else "booking_request"
+    return _result(
+        intent,
+        service=service,
+        date=date,
+        time=time,
+        confidence=DEGRADED_CONFIDENCE,
+    )
+
+
+def fast_path_stats() -> dict:
+    hits = metrics.get("fast_path.hits")
+    misses = metrics.get("fast_path.misses")
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
+
+
+metrics.register("fast_path", fast_path_stats)
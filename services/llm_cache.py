@@ -0,0 +1,260 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.dialects.postgresql import insert
+
+from database import SessionLocal
+from models import LLMCacheEntry
+from services import metrics
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Postgres tier shared by all workers (needs the llm_result_cache migration)
+LLM_SHARED_CACHE_ENABLED = os.getenv("LLM_SHARED_CACHE_ENABLED", "false").lower() == "true"
+
+# Seconds a classification stays valid, per intent.
+# 0 = never cache (retrying may give a better answer).
+INTENT_TTL_SECONDS = {
+    "faq_hours": 24 * 3600,
+    "faq_address": 24 * 3600,
+    "faq_services": 24 * 3600,
+    "faq_pricing": 24 * 3600,
+    "greeting": 24 * 3600,
+    "talk_to_human": 24 * 3600,
+    "booking_status": 24 * 3600,
+    "booking_request": 3600,
+    "booking_modify": 3600,
+    "booking_confirm": 3600,
+    "booking_cancel": 3600,
+    "booking_reschedule": 3600,
+    "inquiry": 600,
+    "fallback": 0,
+}
+DEFAULT_TTL_SECONDS = 600
+
+# Low-confidence answers are treated as failures by the engine — don't keep them
+MIN_CACHEABLE_CONFIDENCE = 0.6
+
+
+def normalize_cache_text(text: str) -> str:
+    """
+    Conservative normalization: case, whitespace and trailing
+    punctuation only. "Book Haircut  tomorrow 3pm!" -> "book haircut tomorrow 3pm"
+    """
+    t = re.sub(r"\s+", " ", (text or "").lower()).strip()
+    return t.rstrip(".!?").strip()
+
+
+def build_cache_key(user_text: str, prompt_hash: str, business_info: dict) -> tuple:
+    """
+    (normalized text, prompt hash, business-local date).
+    The date keeps "tomorrow" / "next monday" from going stale at midnight.
+    """
+    tz = ZoneInfo(business_info.get("timezone", "America/New_York"))
+    local_date = datetime.now(tz).date().isoformat()
+    return (normalize_cache_text(user_text), prompt_hash, local_date)
+
+
+def ttl_for(data: dict) -> int:
+    if not isinstance(data, dict):
+        return 0
+
+    try:
+        confidence = float(data.get("confidence", 1))
+    except (TypeError, ValueError):
+        return 0
+
+    if confidence < MIN_CACHEABLE_CONFIDENCE:
+        return 0
+
+    return INTENT_TTL_SECONDS.get(data.get("intent"), DEFAULT_TTL_SECONDS)
+
+
+class LLMResultCache:
+    """
+    Bounded LRU cache with per-entry TTL for parsed LLM classifications.
+    Thread-safe; one instance per process.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, data)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key) -> dict | None:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, data = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(data)
+
+    def put(self, key, data: dict, ttl: float | None = None):
+        if ttl is None:
+            ttl = ttl_for(data)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, dict(data))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_cache = LLMResultCache()
+metrics.register("llm_cache", llm_cache.stats)
+
+
+# =========================================================
+# SHARED (POSTGRES) TIER
+# =========================================================
+def shared_cache_key(key: tuple) -> str:
+    return hashlib.sha256("\x1f".join(key).encode("utf-8")).hexdigest()
+
+
+def get_shared(db, key: tuple):
+    """
+    Single primary-key lookup. Returns (data, expires_at) or None.
+    """
+    now = datetime.now(timezone.utc)
+
+    row = (
+        db.query(LLMCacheEntry.result_json, LLMCacheEntry.expires_at)
+        .filter(
+            LLMCacheEntry.cache_key == shared_cache_key(key),
+            LLMCacheEntry.expires_at > now
+        )
+        .first()
+    )
+
+    if not row:
+        metrics.incr("llm_cache.shared_misses")
+        return None
+
+    metrics.incr("llm_cache.shared_hits")
+    return row.result_json, row.expires_at
+
+
+def put_shared(db, key: tuple, data: dict, prompt_hash: str, model_version: str | None):
+    ttl = ttl_for(data)
+    if ttl <= 0:
+        return
+
+    now = datetime.now(timezone.utc)
+    values = {
+        "cache_key": shared_cache_key(key),
+        "prompt_hash": prompt_hash,
+        "model_version": model_version,
+        "intent": data.get("intent"),
+        "result_json": data,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+
+    stmt = insert(LLMCacheEntry).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LLMCacheEntry.cache_key],
+        set_={
+            "model_version": stmt.excluded.model_version,
+            "intent": stmt.excluded.intent,
+            "result_json": stmt.excluded.result_json,
+            "created_at": stmt.excluded.created_at,
+            "expires_at": stmt.excluded.expires_at,
+        }
+    )
+
+    # Savepoint: a cache write must never break the conversation turn
+    try:
+        with db.begin_nested():
+            db.execute(stmt)
+    except Exception as e:
+        print("LLM cache write failed:", str(e))
+
+
+def get_cached_classification(db, key: tuple) -> dict | None:
+    """
+    Memory first, then Postgres (promoted into memory on hit).
+    """
+    data = llm_cache.get(key)
+    if data is not None or not LLM_SHARED_CACHE_ENABLED:
+        return data
+
+    shared = get_shared(db, key)
+    if not shared:
+        return None
+
+    data, expires_at = shared
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    llm_cache.put(key, data, ttl=remaining)
+    return dict(data)
+
+
+def store_classification(db, key: tuple, data: dict, prompt_hash: str, model_version: str | None):
+    llm_cache.put(key, data)
+
+    if LLM_SHARED_CACHE_ENABLED:
+        put_shared(db, key, data, prompt_hash, model_version)
+
+
+def purge_expired_llm_cache():
+    """
+    Maintenance job: bulk-delete expired shared entries (uses the expires_at index).
+    """
+    if not LLM_SHARED_CACHE_ENABLED:
+        return 0
+
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(LLMCacheEntry)
+            .filter(LLMCacheEntry.expires_at <= datetime.now(timezone.utc))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        metrics.incr("llm_cache.shared_purged", deleted)
+        return deleted
+    finally:
+        db.close()
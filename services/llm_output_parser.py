@@ -0,0 +1,219 @@
+import json
+import re
+import time
+
+from prompts import ALL_INTENTS
+from services import metrics
+
+try:
+    import orjson
+except ImportError:  # optional speedup, falls back to stdlib json
+    orjson = None
+
+VALID_INTENTS = set(ALL_INTENTS)
+FAQ_TOPICS = {"hours", "address", "services", "pricing"}
+NULLABLE_FIELDS = ("service", "date", "time", "ref_id", "faq_topic")
+NULL_STRINGS = {"", "null", "none", "n/a"}
+
+FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+SINGLE_QUOTED_RE = re.compile(r"'([^'\\]*)'")
+PY_LITERALS = {"None": "null", "True": "true", "False": "false"}
+
+
+def loads(text: str):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _try_loads(text: str):
+    try:
+        return loads(text)
+    except ValueError:  # orjson.JSONDecodeError and json.JSONDecodeError both subclass it
+        return None
+
+
+# --------------------------------------------------
+# REPAIRS — applied in order until the text parses
+# --------------------------------------------------
+def _strip_fences(text: str) -> str:
+    m = FENCE_RE.search(text)
+    return m.group(1).strip() if m else text
+
+
+def _extract_object(text: str) -> str:
+    # "Here is the JSON: {...} Hope this helps" -> "{...}"
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return text
+    return text[start:end + 1]
+
+
+def _fix_trailing_commas(text: str) -> str:
+    return TRAILING_COMMA_RE.sub(r"\1", text)
+
+
+def _fix_python_literals(text: str) -> str:
+    return re.sub(r"\b(None|True|False)\b", lambda m: PY_LITERALS[m.group(1)], text)
+
+
+def _fix_single_quotes(text: str) -> str:
+    # Only when the model used single quotes throughout — "what's" stays intact otherwise
+    if '"' in text:
+        return text
+    return SINGLE_QUOTED_RE.sub(lambda m: json.dumps(m.group(1)), text)
+
+
+REPAIRS = [
+    ("markdown_fence", _strip_fences),
+    ("surrounding_text", _extract_object),
+    ("trailing_comma", _fix_trailing_commas),
+    ("python_literal", _fix_python_literals),
+    ("single_quotes", _fix_single_quotes),
+]
+
+
+def decode_with_repairs(raw_content: str):
+    """
+    Returns (obj, [repair names]) — obj is None when nothing worked.
+    """
+    text = (raw_content or "").strip()
+
+    obj = _try_loads(text)
+    if obj is not None:
+        return obj, []
+
+    applied = []
+    for name, repair in REPAIRS:
+        fixed = repair(text)
+        if fixed == text:
+            continue
+
+        text = fixed
+        applied.append(name)
+
+        obj = _try_loads(text)
+        if obj is not None:
+            return obj, applied
+
+    return None, applied
+
+
+# --------------------------------------------------
+# SCHEMA
+# --------------------------------------------------
+def _clean_nullable(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+
+    value = value.strip()
+    return None if value.lower() in NULL_STRINGS else value
+
+
+def _squash(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def canonical_service(value: str | None, services) -> str | None:
+    """
+    Map the model's service to the business's own spelling.
+    "haircuts" / "Hair cut" -> "Haircut". Unknown services -> None.
+    """
+    if not value:
+        return None
+
+    wanted = _squash(value)
+    if not wanted:
+        return None
+
+    for service in services:
+        if _squash(service) == wanted:
+            return service
+
+    for service in services:
+        s = _squash(service)
+        if s and (s in wanted or wanted in s):
+            return service
+
+    return None
+
+
+def validate_llm_output(obj, business_info: dict) -> dict | None:
+    """
+    Normalize to the documented schema. None when the intent is unusable.
+    """
+    if not isinstance(obj, dict):
+        return None
+
+    intent = obj.get("intent")
+    intent = intent.strip().lower() if isinstance(intent, str) else None
+    if intent not in VALID_INTENTS:
+        metrics.incr("llm_parser.invalid_intent")
+        return None
+
+    data = {"intent": intent}
+    for field in NULLABLE_FIELDS:
+        data[field] = _clean_nullable(obj.get(field))
+
+    raw_service = data["service"]
+    data["service"] = canonical_service(raw_service, business_info.get("services", []))
+    if raw_service and data["service"] is None:
+        metrics.incr("llm_parser.unknown_service")
+
+    if intent.startswith("faq_"):
+        data["faq_topic"] = intent.removeprefix("faq_")
+    elif data["faq_topic"] not in FAQ_TOPICS:
+        data["faq_topic"] = None
+
+    # Missing confidence keeps the engine's old default; garbage counts as unsure
+    confidence = obj.get("confidence", 1)
+    try:
+        confidence = float(confidence)
+    except (TypeError, ValueError):
+        confidence = 0.0
+    data["confidence"] = min(1.0, max(0.0, confidence))
+
+    return data
+
+
+def parse_llm_output(raw_content: str, business_info: dict) -> dict | None:
+    """
+    Decode (repairing common defects), then validate against the schema.
+    """
+    started = time.perf_counter()
+
+    obj, repairs = decode_with_repairs(raw_content)
+    data = validate_llm_output(obj, business_info) if obj is not None else None
+
+    metrics.incr("llm_parser.parse_ms", (time.perf_counter() - started) * 1000)
+    metrics.incr("llm_parser.calls")
+
+    if data is None:
+        metrics.incr("llm_parser.failures")
+        return None
+
+    if repairs:
+        metrics.incr("llm_parser.repaired")
+        for name in repairs:
+            metrics.incr(f"llm_parser.repairs.{name}")
+
+    return data
+
+
+def llm_parser_stats() -> dict:
+    calls = metrics.get("llm_parser.calls")
+    return {
+        "backend": "orjson" if orjson is not None else "json",
+        "calls": calls,
+        "repaired": metrics.get("llm_parser.repaired"),
+        "failures": metrics.get("llm_parser.failures"),
+        "avg_parse_ms": round(metrics.get("llm_parser.parse_ms") / calls, 4) if calls else 0.0,
+    }
+
+
+metrics.register("llm_parser", llm_parser_stats)
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+
+from services import metrics
+
+# 0 = off: every inbound message is its own turn
+MESSAGE_COALESCE_WINDOW_SECONDS = float(os.getenv("MESSAGE_COALESCE_WINDOW_SECONDS", "0"))
+
+# A chatty user can't hold a burst open forever
+MESSAGE_COALESCE_MAX_WAIT_SECONDS = float(
+    os.getenv("MESSAGE_COALESCE_MAX_WAIT_SECONDS", str(MESSAGE_COALESCE_WINDOW_SECONDS * 3))
+)
+
+
+class Burst:
+    def __init__(self, text: str, message_id: str | None):
+        self.texts = []
+        self.message_ids = []
+        self.started = time.monotonic()
+        self.last_seen = self.started
+        self.add(text, message_id)
+
+    def add(self, text: str, message_id: str | None):
+        if text and text.strip():
+            self.texts.append(text.strip())
+        if message_id:
+            self.message_ids.append(message_id)
+        self.last_seen = time.monotonic()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+    @property
+    def message_id(self) -> str | None:
+        return self.message_ids[0] if self.message_ids else None
+
+    @property
+    def coalesced_message_ids(self) -> list:
+        return self.message_ids[1:]
+
+
+class MessageCoalescer:
+    """
+    Per-sender debounce for async webhook handlers.
+
+    The first message of a burst (the leader) waits until the sender has
+    been quiet for window_seconds, then runs one engine turn for the
+    merged text. Messages arriving meanwhile (followers) are folded into
+    the leader's burst and get no reply of their own.
+
+    State lives on the event loop of this worker: with several workers a
+    burst split across them just becomes several turns, as before.
+    """
+
+    def __init__(self, window_seconds: float, max_wait_seconds: float):
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max(max_wait_seconds, window_seconds)
+        self._bursts: dict[str, Burst] = {}
+
+    async def collect(self, key: str, text: str, message_id: str | None) -> Burst | None:
+        """
+        Returns the merged Burst for the leader, None for followers.
+        """
+        if self.window_seconds <= 0:
+            return Burst(text, message_id)
+
+        burst = self._bursts.get(key)
+        if burst is not None:
+            if not (message_id and message_id in burst.message_ids):
+                burst.add(text, message_id)
+                metrics.incr("coalescer.merged_messages")
+            return None
+
+        burst = Burst(text, message_id)
+        self._bursts[key] = burst
+
+        try:
+            while True:
+                quiet_at = burst.last_seen + self.window_seconds
+                hard_stop = burst.started + self.max_wait_seconds
+                wait = min(quiet_at, hard_stop) - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            self._bursts.pop(key, None)
+
+        metrics.incr("coalescer.turns")
+        return burst
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window_seconds,
+            "open_bursts": len(self._bursts),
+            "turns": metrics.get("coalescer.turns"),
+            "merged_messages": metrics.get("coalescer.merged_messages"),
+        }
+
+
+message_coalescer = MessageCoalescer(
+    MESSAGE_COALESCE_WINDOW_SECONDS,
+    MESSAGE_COALESCE_MAX_WAIT_SECONDS,
+)
+metrics.register("coalescer", message_coalescer.stats)
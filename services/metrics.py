@@ -0,0 +1,39 @@
+import threading
+
+# Process-local counters for engine instrumentation.
+# Exposed through GET /metrics (see app.py).
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_providers: dict = {}
+
+
+def incr(name: str, value: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str, default: float = 0) -> float:
+    with _lock:
+        return _counters.get(name, default)
+
+
+def register(name: str, provider):
+    """
+    Register a callable returning a dict of stats.
+    Its output is included in snapshot() under `name`.
+    """
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    with _lock:
+        data = {"counters": dict(_counters)}
+
+    for name, provider in list(_providers.items()):
+        try:
+            data[name] = provider()
+        except Exception as e:
+            data[name] = {"error": str(e)}
+
+    return data
@@ -1,36 +1,69 @@
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_
 from database import SessionLocal
-from models import Booking, Session
+from models import Booking, Business, Session
 from utils.time_utils import format_time_for_user
 from services.channel_router import send_message
 import os
 import logging
-from models import Business
-from utils.datetime_utils import booking_to_datetime
+from services.business_loader import business_config_cache
 
 FIRST_WINDOW = timedelta(hours=24)
 SECOND_WINDOW = timedelta(hours=2)
 
+def get_upcoming_confirmed_bookings(db, now):
+    # Only appointments inside the widest reminder window that still owe one
+    return (
+        db.query(Booking)
+        .filter(
+            Booking.status == "CONFIRMED",
+            Booking.slot_start > now,
+            Booking.slot_start <= now + FIRST_WINDOW,
+            or_(
+                Booking.reminder_24h_sent.isnot(True),
+                Booking.reminder_2h_sent.isnot(True),
+            ),
+        )
+        .all()
+    )
+
+def load_business_configs(db, bookings):
+    """
+    Configs for the bookings' businesses, by business_id. One query per run
+    also catches edits made by other processes (observe rebuilds a config
+    whose config_version moved). Deleted businesses are left out.
+    """
+    business_ids = {booking.business_id for booking in bookings if booking.business_id}
+    if not business_ids:
+        return {}
+
+    businesses = db.query(Business).filter(Business.id.in_(business_ids)).all()
+    return {business.id: business_config_cache.observe(business, active=False) for business in businesses}
+
 def run_reminder_job():
 
     db = SessionLocal()
     now = datetime.now(timezone.utc)
 
     try:
-        confirmed_bookings = (
-            db.query(Booking)
-            .filter(
-                Booking.status == "CONFIRMED",
-                Booking.date >= now.date().isoformat()
-            )
-            .all()
-        )
+        confirmed_bookings = get_upcoming_confirmed_bookings(db, now)
+        configs = load_business_configs(db, confirmed_bookings)
 
         for booking in confirmed_bookings:
 
-            appointment_time = booking_to_datetime(db, booking)
-            time_diff = appointment_time - now
+            time_diff = booking.slot_start - now
+
+            # Bookings from before multi-tenancy have no business: default numbers
+            business_info = None
+            if booking.business_id:
+                config = configs.get(booking.business_id)
+                if config is None:
+                    logging.getLogger(__name__).warning(
+                        "[REMINDER_NO_BUSINESS] booking=%s business=%s", booking.id, booking.business_id
+                    )
+                    continue
+                business_info = config.info
 
             # ------------------------------------------------
             # 1️⃣ FIRST REMINDER (24h in prod)
@@ -47,7 +80,8 @@ def run_reminder_job():
                         f"Reminder: You have a {booking.service} appointment "
                         f"on {booking.date} at {format_time_for_user(booking.time)}.\n"
                         "Reply YES to confirm or CANCEL to cancel."
-                    )
+                    ),
+                    business_info,
                 )
 
                 booking.reminder_24h_sent = True
@@ -72,7 +106,8 @@ def run_reminder_job():
                         f"⏰ Reminder: Your {booking.service} appointment "
                         f"is coming up at {format_time_for_user(booking.time)}.\n"
                         "Reply YES to confirm or CANCEL if needed."
-                    )
+                    ),
+                    business_info,
                 )
 
                 booking.reminder_2h_sent = True
@@ -96,7 +131,7 @@ def run_reminder_job():
 def bind_reminder_to_session(db, booking, now):
     session = (
         db.query(Session)
-        .filter(Session.session_id == booking.phone_number)
+        .filter(Session.business_id == booking.business_id, Session.session_id == booking.phone_number)
         .first()
     )
 
@@ -0,0 +1,136 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import and_, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+from models import Booking, Business, ConversationSession, Session
+
+ACTIVE_BOOKING_STATUSES = ("PENDING", "CONFIRMED")
+
+
+class SessionContext(NamedTuple):
+    session: Session
+    conv_session: ConversationSession
+    business: Business
+    active_bookings: list   # this phone's PENDING / CONFIRMED bookings
+
+
+def _get_or_create_cte(model, session_id: str, values: dict, business_cte):
+    """
+    INSERT ... SELECT (active business) ON CONFLICT DO NOTHING RETURNING *,
+    unioned with the existing row: exactly one row either way.
+    """
+    table = model.__table__
+
+    source = select(
+        business_cte.c.id,
+        *[literal(value, type_=table.c[name].type) for name, value in values.items()]
+    )
+
+    inserted = (
+        insert(table)
+        .from_select(["business_id", *values], source)
+        .on_conflict_do_nothing(index_elements=[table.c.business_id, table.c.session_id])
+        .returning(*table.c)
+        .cte(f"new_{table.name}")
+    )
+
+    existing = select(*table.c).where(
+        table.c.business_id == business_cte.c.id,
+        table.c.session_id == session_id,
+    )
+
+    return select(*inserted.c).union_all(existing).cte(f"{table.name}_row")
+
+
+def lock_session(db, business_id, session_id: str):
+    """
+    Transaction-scoped advisory lock per (business, phone) session: turns
+    that would read and rewrite the same FSM row run one after the other,
+    in any process. Taken before load_session_context so its snapshot
+    sees the previous turn's commit.
+    """
+    key = func.hashtextextended(f"session:{business_id}:{session_id}", 0)
+    db.execute(select(func.pg_advisory_xact_lock(key)))
+
+
+def build_session_context_query(session_id: str, channel: str, now: datetime, business_id=None):
+    # Routed turns name their business; unrouted ones get the first active one
+    business_query = select(Business).where(Business.is_active == True)
+    if business_id is not None:
+        business_query = business_query.where(Business.id == business_id)
+    else:
+        business_query = business_query.order_by(Business.created_at)
+    business_cte = business_query.limit(1).cte("active_business")
+
+    session_cte = _get_or_create_cte(Session, session_id, {
+        "session_id": session_id,
+        "booking_state": "IDLE",
+        "channel": channel,
+        "processed_message_ids": [],
+        "expired_last_turn": False,
+        "updated_at": now,
+        "fail_count": 0,
+        "handoff_offered": False,
+    }, business_cte)
+
+    conv_cte = _get_or_create_cte(ConversationSession, session_id, {
+        "session_id": session_id,
+        "phone_number": session_id,
+        "started_at": now,
+        "total_messages": 0,
+        "booking_created": False,
+        "booking_confirmed": False,
+        "booking_cancelled": False,
+        "booking_rescheduled": False,
+        "payment_completed": False,
+        "no_show": False,
+        "fallback_count": 0,
+        "handoff_count": 0,
+    }, business_cte)
+
+    session_row = aliased(Session, session_cte, adapt_on_names=True)
+    conv_row = aliased(ConversationSession, conv_cte, adapt_on_names=True)
+    business_row = aliased(Business, business_cte, adapt_on_names=True)
+
+    return (
+        select(session_row, conv_row, business_row, Booking)
+        .select_from(session_row)
+        .join(conv_row, true())
+        .join(business_row, true())
+        .outerjoin(
+            Booking,
+            and_(
+                Booking.phone_number == session_id,
+                Booking.business_id == business_row.id,
+                Booking.status.in_(ACTIVE_BOOKING_STATUSES),
+            ),
+        )
+    )
+
+
+def load_session_context(db, session_id: str, channel: str, now: datetime, business_id=None) -> SessionContext | None:
+    """
+    One statement: fetch-or-create this business's Session and
+    ConversationSession for the phone, the Business and the customer's
+    active bookings with it. None when the business isn't active
+    (or, without business_id, there is no active business).
+    """
+    stmt = build_session_context_query(session_id, channel, now, business_id)
+
+    # A concurrent first message can commit the rows after our snapshot
+    # was taken (DO NOTHING, but not visible yet) — a fresh statement sees them.
+    for _ in range(2):
+        rows = db.execute(stmt).all()
+        if rows:
+            break
+
+    if not rows:
+        return None
+
+    session, conv_session, business, _ = rows[0]
+    active_bookings = [row[3] for row in rows if row[3] is not None]
+
+    return SessionContext(session, conv_session, business, active_bookings)
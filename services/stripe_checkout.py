@@ -23,6 +23,10 @@ if STRIPE_SECRET_KEY:
 
 
 def create_checkout_session_for_booking(booking, db):
+    """
+    Updates the booking's payment fields; the caller commits
+    (the conversation turn, or the checkout endpoint).
+    """
 
     if not STRIPE_SECRET_KEY:
         raise HTTPException(status_code=500, detail="Stripe not configured")
@@ -83,7 +87,6 @@ def create_checkout_session_for_booking(booking, db):
         
         # 🔥 Default predictive risk
         booking.no_show_risk = True
-        db.commit()
         return {"status": "confirmed_without_payment"}
 
     try:
@@ -109,7 +112,6 @@ def create_checkout_session_for_booking(booking, db):
         )
     except Exception as e:
         booking.payment_last_error = str(e)
-        db.commit()
         raise HTTPException(status_code=500, detail="Stripe checkout creation failed")
 
     booking.payment_required = True
@@ -122,7 +124,6 @@ def create_checkout_session_for_booking(booking, db):
     booking.payment_expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
     booking.payment_attempt_count = (booking.payment_attempt_count or 0) + 1
 
-    db.commit()
 
     return {
         "checkout_url": checkout.url,
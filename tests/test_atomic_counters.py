@@ -0,0 +1,55 @@
+import json
+from unittest.mock import patch
+
+from conftest import send_message
+from database import SessionLocal
+from models import Business, ConversationSession, Session
+
+
+def llm_fallback(*args, **kwargs):
+
+    return json.dumps({
+        "intent": "fallback",
+        "service": None,
+        "date": None,
+        "time": None,
+        "ref_id": None,
+        "faq_topic": None,
+        "confidence": 0.95,
+    })
+
+
+def test_third_fallback_offers_handoff(client):
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_fallback):
+
+        send_message(client, "blorp one", "counter_user_1")
+        send_message(client, "blorp two", "counter_user_1")
+        reply = send_message(client, "blorp three", "counter_user_1")
+
+    assert reply["intent"] == "handoff"
+
+    db = SessionLocal()
+    business_id = db.query(Business.id).filter(Business.is_active == True).scalar()
+    session = db.get(Session, (business_id, "counter_user_1"))
+    conv = db.get(ConversationSession, (business_id, "counter_user_1"))
+    db.close()
+
+    assert session.fail_count == 3
+    assert conv.fallback_count == 3
+
+
+def test_conversation_counters_are_updated_per_turn(client):
+
+    send_message(client, "hello", "counter_user_2")
+    send_message(client, "what are your hours?", "counter_user_2")
+    send_message(client, "talk to a human", "counter_user_2")
+
+    db = SessionLocal()
+    business_id = db.query(Business.id).filter(Business.is_active == True).scalar()
+    conv = db.get(ConversationSession, (business_id, "counter_user_2"))
+    db.close()
+
+    assert conv.total_messages == 3
+    assert conv.handoff_count == 1
+    assert conv.avg_latency_ms is not None
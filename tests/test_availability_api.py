@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import event, update
+
+from database import SessionLocal, engine
+from models import Booking, Business
+from services.business_loader import build_business_info, business_config_cache
+
+
+def future_day(days_ahead):
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    db.close()
+
+    day = datetime.now(ZoneInfo(business_info["timezone"])).date() + timedelta(days=days_ahead)
+    return business_info, day.isoformat()
+
+
+def test_availability_lists_open_slots_per_day(client):
+
+    business_info, day = future_day(70)
+
+    db = SessionLocal()
+    db.add(Booking(
+        id="API-AVAIL-1", phone_number="api_user_1", business_id=business_info["id"],
+        service="Haircut", date=day, time="10:00", status="CONFIRMED",
+    ))
+    db.commit()
+    db.close()
+
+    response = client.get("/availability", params={"from": day, "to": day, "service": "haircut"})
+    body = response.json()
+
+    assert response.status_code == 200
+    assert body["service"] == "Haircut"
+    assert [d["date"] for d in body["days"]] == [day]
+
+    slots = body["days"][0]["slots"]
+    assert "10:00" not in slots
+    assert "09:30" in slots
+
+
+def test_default_range_is_two_weeks(client):
+
+    body = client.get("/availability").json()
+
+    assert len(body["days"]) == 14
+
+
+def test_etag_gives_304_until_a_booking_changes(client):
+
+    business_info, day = future_day(71)
+    params = {"from": day, "to": day}
+
+    first = client.get("/availability", params=params)
+    etag = first.headers["etag"]
+
+    again = client.get("/availability", params=params, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    db = SessionLocal()
+    db.add(Booking(
+        id="API-AVAIL-2", phone_number="api_user_2", business_id=business_info["id"],
+        service="Haircut", date=day, time="11:00", status="CONFIRMED",
+    ))
+    db.commit()
+    db.close()
+
+    changed = client.get("/availability", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert "11:00" not in changed.json()["days"][0]["slots"]
+
+
+def test_bad_requests(client):
+
+    assert client.get("/availability", params={"from": "not-a-date"}).status_code == 400
+    assert client.get("/availability", params={"from": "2030-01-10", "to": "2030-01-01"}).status_code == 400
+    assert client.get("/availability", params={"from": "2030-01-01", "to": "2030-12-31"}).status_code == 400
+    assert client.get("/availability", params={"service": "tattoo"}).status_code == 404
+
+
+def availability_statements(client, params):
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "businesses" in statement or "bookings" in statement:   # not the queue workers
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/availability", params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    return statements
+
+
+def test_a_request_is_one_statement(client):
+
+    business_info, day = future_day(72)
+    client.get("/availability")   # warm the business config
+
+    # Cold days: the business row comes back with the bookings
+    assert len(availability_statements(client, {"from": day, "to": day})) == 1
+    # Cached days: only the version check
+    assert len(availability_statements(client, {"from": day, "to": day})) == 1
+
+
+def test_config_edits_reach_the_api(client):
+
+    client.get("/availability")
+
+    db = SessionLocal()
+    business = db.query(Business).filter(Business.is_active == True).order_by(Business.created_at).first()
+    old_name = business.name
+    db.execute(update(Business).where(Business.id == business.id).values(name="Renamed Salon"))
+    db.commit()
+
+    try:
+        assert client.get("/availability").json()["business"] == "Renamed Salon"
+    finally:
+        db.execute(update(Business).where(Business.id == business.id).values(name=old_name))
+        db.commit()
+        db.close()
+        business_config_cache.reload()
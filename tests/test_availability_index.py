@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, update
+
+from database import SessionLocal, engine
+from models import Booking, Business
+from services.availability_index import DayAvailability, SlotGrid, availability_index
+from services.business_loader import build_business_info
+
+
+def count_statements(fn):
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    return result, len(statements)
+
+
+def test_day_intervals_overlap():
+
+    grid = SlotGrid({"business_hours": {"start": "09:00", "end": "11:00"}, "slot_duration_minutes": 30})
+    day = DayAvailability(grid, version=1).with_booking(9 * 60 + 30, None, True, 1).with_booking(10 * 60 + 15, 60, True, 1)
+
+    assert grid.size == 5
+    assert day.is_taken(9 * 60 + 30)
+    assert not day.is_taken(9 * 60)
+    assert day.is_taken(9 * 60, 45)     # runs into the 09:30 booking
+    assert day.is_taken(10 * 60 + 45)   # inside the off-grid 10:15-11:15 booking
+    assert not day.is_taken(10 * 60, 15)   # ends as the 10:15 booking starts
+    assert not day.with_booking(9 * 60 + 30, None, False, 2).is_taken(9 * 60 + 30)
+
+    # Overlapping legacy rows: a long booking hidden behind a later, shorter one
+    legacy = DayAvailability(grid, version=1, intervals=[(9 * 60, 12 * 60), (9 * 60 + 30, 10 * 60)])
+    assert legacy.is_taken(11 * 60)
+
+
+def test_own_commit_patches_cached_day(client):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=60)).date().isoformat()
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    version = db.get(Business, business_info["id"]).booking_version
+    availability_index.observe_version(business_info["id"], version)
+
+    assert not availability_index.is_taken(db, business_info, day, "10:00")
+
+    db.add(Booking(
+        id="AVAIL-1", phone_number="avail_user_1", business_id=business_info["id"],
+        service="Haircut", date=day, time="10:00", status="CONFIRMED",
+    ))
+    db.commit()
+
+    taken, queries = count_statements(
+        lambda: availability_index.is_taken(db, business_info, day, "10:00")
+    )
+
+    assert taken
+    assert queries == 0
+
+    db.get(Booking, "AVAIL-1").status = "CANCELLED"
+    db.commit()
+
+    assert not availability_index.is_taken(db, business_info, day, "10:00")
+    assert db.get(Business, business_info["id"]).booking_version == version + 2
+
+    db.close()
+
+
+def test_other_worker_commit_reloads_on_newer_version(client):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=61)).date().isoformat()
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    version = db.get(Business, business_info["id"]).booking_version
+    availability_index.observe_version(business_info["id"], version)
+
+    assert not availability_index.is_taken(db, business_info, day, "11:00")
+
+    # Another worker: a raw write and its version bump, invisible to this process
+    with engine.begin() as conn:
+        conn.execute(Booking.__table__.insert().values(
+            id="AVAIL-2", phone_number="avail_user_2", business_id=business_info["id"],
+            service="Haircut", date=day, time="11:00", status="CONFIRMED",
+            payment_required=False, payment_status="NOT_REQUIRED",
+            deposit_amount_cents=0, currency="usd",
+        ))
+        conn.execute(
+            update(Business)
+            .where(Business.id == business_info["id"])
+            .values(booking_version=Business.booking_version + 1)
+        )
+
+    # Still the cached answer until a turn observes the new version
+    assert not availability_index.is_taken(db, business_info, day, "11:00")
+
+    availability_index.observe_version(business_info["id"], version + 1)
+
+    assert availability_index.is_taken(db, business_info, day, "11:00")
+
+    db.close()
+
+
+def test_rolled_back_hold_never_reaches_index(client):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=62)).date().isoformat()
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+
+    db.add(Booking(
+        id="AVAIL-3", phone_number="avail_user_3", business_id=business_info["id"],
+        service="Haircut", date=day, time="12:00", status="PENDING",
+    ))
+    db.flush()
+
+    assert availability_index.is_taken(db, business_info, day, "12:00")
+
+    db.rollback()
+
+    assert not availability_index.is_taken(db, business_info, day, "12:00")
+
+    db.close()
@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, text
+
+from database import SessionLocal
+from services.booking_service import get_latest_booking, is_slot_taken
+from services.reminder_service import get_upcoming_confirmed_bookings
+from services.availability_index import availability_index
+from services.business_loader import build_business_info
+from app import seed_default_business
+from services.session_loader import build_session_context_query
+
+# Seeds a million bookings — opt in with RUN_DB_PERF_TESTS=true
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_DB_PERF_TESTS") != "true",
+    reason="set RUN_DB_PERF_TESTS=true to run EXPLAIN checks on a seeded bookings table",
+)
+
+SEED_ROWS = 1_000_000
+
+# ~4 years of history ending a month from now, 10 bookings per phone,
+# mostly finished (CANCELLED / EXPIRED)
+SEED_SQL = """
+INSERT INTO bookings (
+    id, business_id, phone_number, service, date, time, slot_start, status, created_at,
+    payment_required, payment_status, deposit_amount_cents, currency
+)
+SELECT
+    'SEED' || i,
+    (SELECT id FROM businesses WHERE is_active ORDER BY created_at LIMIT 1),
+    '+1555' || lpad((i % 100000)::text, 7, '0'),
+    'Haircut',
+    to_char(CURRENT_DATE + 30 - (i % 1460), 'YYYY-MM-DD'),
+    lpad((9 + i % 9)::text, 2, '0') || ':' || CASE WHEN i % 2 = 0 THEN '00' ELSE '30' END,
+    (CURRENT_DATE + 30 - (i % 1460)) + (9 + i % 9) * interval '1 hour' + (i % 2) * interval '30 minutes',
+    -- (date, time) repeats every 13140 rows: one active booking per slot
+    CASE WHEN i <= 13140
+        THEN (ARRAY['CONFIRMED', 'CONFIRMED', 'PENDING'])[1 + i % 3]
+        ELSE (ARRAY['CANCELLED', 'EXPIRED'])[1 + i % 2]
+    END,
+    now() - (i % 1460) * interval '1 day',
+    false, 'NOT_REQUIRED', 0, 'usd'
+FROM generate_series(1, :rows) AS i
+ON CONFLICT DO NOTHING  -- slots already held by other tests' bookings
+"""
+
+
+@pytest.fixture(scope="module")
+def seeded_db():
+
+    seed_default_business()
+
+    db = SessionLocal()
+    db.execute(text(SEED_SQL), {"rows": SEED_ROWS})
+    db.execute(text("ANALYZE bookings"))
+
+    yield db
+
+    # Seed rows and their statistics go away with the transaction
+    db.rollback()
+    db.close()
+
+
+def explain(db, statement) -> str:
+
+    compiled = statement.compile(
+        dialect=db.get_bind().dialect,
+        compile_kwargs={"render_postcompile": True},
+    )
+    rows = db.connection().exec_driver_sql("EXPLAIN " + str(compiled), compiled.params)
+    return "\n".join(row[0] for row in rows)
+
+
+def statement_of(helper, db, *args):
+
+    # Run the real helper and keep the statement it built
+    statements = []
+
+    def on_execute(orm_execute_state):
+        statements.append(orm_execute_state.statement)
+
+    event.listen(db, "do_orm_execute", on_execute)
+    try:
+        helper(db, *args)
+    finally:
+        event.remove(db, "do_orm_execute", on_execute)
+
+    return statements[0]
+
+
+def test_session_bootstrap_uses_active_phone_index(seeded_db):
+
+    stmt = build_session_context_query("+15550004242", "sms", datetime.now(timezone.utc))
+
+    assert "ix_bookings_phone_status_created" in explain(seeded_db, stmt)
+
+
+def test_booking_status_uses_phone_index(seeded_db):
+
+    stmt = statement_of(get_latest_booking, seeded_db, "+15550004242", build_business_info(seeded_db)["id"])
+
+    assert "ix_bookings_phone_status_created" in explain(seeded_db, stmt)
+
+
+def test_availability_load_uses_active_slot_index(seeded_db):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=3)).date().isoformat()
+    availability_index.clear()
+    stmt = statement_of(is_slot_taken, seeded_db, build_business_info(seeded_db), day, "10:00")
+
+    assert "ux_bookings_active_slot" in explain(seeded_db, stmt)
+
+
+def test_reminder_scan_uses_confirmed_slot_start_index(seeded_db):
+
+    stmt = statement_of(get_upcoming_confirmed_bookings, seeded_db, datetime.now(timezone.utc))
+
+    assert "ix_bookings_confirmed_slot_start" in explain(seeded_db, stmt)
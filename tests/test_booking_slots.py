@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import update
+
+from conftest import send_message
+from database import SessionLocal
+from models import Booking, Business
+from services.business_loader import build_business_info, business_config_cache
+from services.reminder_service import run_reminder_job
+
+
+def test_pending_booking_gets_typed_slot(client):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=44)).date()
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+
+    def llm_slot(*args, **kwargs):
+        return json.dumps({
+            "intent": "booking_request",
+            "service": "Haircut",
+            "date": day.isoformat(),
+            "time": "14:30",
+            "ref_id": None,
+            "faq_topic": None,
+            "confidence": 0.99,
+        })
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_slot):
+        reply = send_message(client, f"haircut {day} 2:30pm", "slots_user_1")
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    booking = db.query(Booking).filter(Booking.phone_number == "slots_user_1").first()
+    db.close()
+
+    local = datetime.fromisoformat(f"{day} 14:30").replace(
+        tzinfo=ZoneInfo(business_info["timezone"])
+    )
+
+    assert reply["intent"] == "booking_pending"
+    assert booking.slot_start == local
+    assert booking.slot_end - booking.slot_start == timedelta(
+        minutes=business_info["slot_duration_minutes"]
+    )
+
+
+def test_reminder_job_picks_bookings_by_slot_start(client):
+
+    now = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    tz = ZoneInfo(business_info["timezone"])
+
+    soon = (now + timedelta(hours=5)).astimezone(tz).replace(second=0, microsecond=0)
+    later = (now + timedelta(days=3)).astimezone(tz).replace(second=0, microsecond=0)
+
+    for booking_id, start in (("SLOTS-SOON", soon), ("SLOTS-LATER", later)):
+        db.add(Booking(
+            id=booking_id, phone_number="slots_user_2", business_id=business_info["id"],
+            service="Haircut", date=start.date().isoformat(), time=start.strftime("%H:%M"),
+            slot_start=start, slot_end=start + timedelta(minutes=30),
+            status="CONFIRMED", channel="sms",
+        ))
+    db.commit()
+    db.close()
+
+    with patch("services.reminder_service.send_message") as sent:
+        run_reminder_job()
+
+    db = SessionLocal()
+    soon_booking = db.get(Booking, "SLOTS-SOON")
+    later_booking = db.get(Booking, "SLOTS-LATER")
+    db.close()
+
+    assert soon_booking.reminder_24h_sent is True
+    assert later_booking.reminder_24h_sent is not True
+    assert any(call.args[1] == "slots_user_2" for call in sent.call_args_list)
+
+
+def test_reminder_job_picks_up_config_changes(client):
+
+    now = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    business_info = build_business_info(db)   # cached before the edit below
+    tz = ZoneInfo(business_info["timezone"])
+    start = (now + timedelta(hours=6)).astimezone(tz).replace(second=0, microsecond=0)
+
+    db.add(Booking(
+        id="SLOTS-CONFIG", phone_number="slots_user_3", business_id=business_info["id"],
+        service="Haircut", date=start.date().isoformat(), time=start.strftime("%H:%M"),
+        slot_start=start, slot_end=start + timedelta(minutes=30),
+        status="CONFIRMED", channel="sms",
+    ))
+    db.execute(update(Business).where(Business.id == business_info["id"]).values(sms_number="+15550001234"))
+    db.commit()
+
+    try:
+        with patch("services.reminder_service.send_message") as sent:
+            run_reminder_job()
+    finally:
+        db.execute(update(Business).where(Business.id == business_info["id"]).values(sms_number=None))
+        db.commit()
+        business_config_cache.reload()
+        db.close()
+
+    reminders = [call for call in sent.call_args_list if call.args[1] == "slots_user_3"]
+    assert len(reminders) == 1
+    assert reminders[0].args[3]["sms_number"] == "+15550001234"
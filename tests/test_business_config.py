@@ -0,0 +1,65 @@
+from sqlalchemy import event, update
+
+from conftest import send_message
+from database import SessionLocal, engine
+from models import Business
+from services.business_loader import build_business_info, business_config_cache
+
+
+def business_statements(fn):
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "businesses" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    return statements
+
+
+def test_turn_reads_business_only_through_session_context(client):
+
+    send_message(client, "hello", "config_user_a")
+
+    statements = business_statements(lambda: send_message(client, "what are your hours", "config_user_a"))
+
+    # The session context statement carries the Business row; nothing else reads it
+    assert len(statements) == 1
+    assert "active_business" in statements[0]
+
+
+def test_config_change_reaches_next_turn(client):
+
+    send_message(client, "hello", "config_user_b")
+
+    db = SessionLocal()
+    business = db.query(Business).filter(Business.is_active == True).first()
+    business_id, old_name, version = business.id, business.name, business.config_version
+
+    # Booking churn doesn't touch the config version
+    db.execute(update(Business).where(Business.id == business_id).values(booking_version=Business.booking_version + 1))
+    db.commit()
+    assert db.get(Business, business_id).config_version == version
+
+    db.execute(update(Business).where(Business.id == business_id).values(name="Renamed Salon"))
+    db.commit()
+    assert db.get(Business, business_id).config_version == version + 1
+
+    assert build_business_info(db)["name"] == old_name   # not seen by any turn yet
+
+    send_message(client, "hi again", "config_user_b")
+    assert build_business_info(db)["name"] == "Renamed Salon"
+    assert build_business_info(db)["config_version"] == version + 1   # keys the prompt memo
+
+    db.execute(update(Business).where(Business.id == business_id).values(name=old_name))
+    db.commit()
+    business_config_cache.reload()
+    assert build_business_info(db)["name"] == old_name
+
+    db.close()
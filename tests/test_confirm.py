@@ -1,4 +1,10 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
 from conftest import send_message
+from database import SessionLocal
+from models import Booking, Session
 
 
 CONFIRM_WORDS = [
@@ -48,4 +54,37 @@ def test_confirm_variations(client):
 
         reply = send_message(client, word, session)
 
-        assert reply["intent"] != "fallback"
\ No newline at end of file
+        assert reply["intent"] != "fallback"
+
+def test_checkout_failure_keeps_the_hold_and_the_error(client):
+
+    session = "confirm_checkout_failure"
+    day = (datetime.now(timezone.utc).date() + timedelta(days=45)).isoformat()
+    llm_reply = json.dumps({
+        "intent": "booking_request",
+        "service": "Haircut",
+        "date": day,
+        "time": "16:30",
+        "ref_id": None,
+        "faq_topic": None,
+        "confidence": 0.99,
+    })
+
+    with patch("services.conversation_engine.call_llm", return_value=llm_reply), \
+         patch("fsm.confirming.compute_deposit", return_value=2000), \
+         patch("services.stripe_checkout.compute_deposit", return_value=2000), \
+         patch("services.stripe_checkout.STRIPE_SECRET_KEY", "sk_test_dummy"), \
+         patch("stripe.checkout.Session.create", side_effect=RuntimeError("stripe down")):
+        pending = send_message(client, f"haircut {day} 4:30pm", session)
+        reply = send_message(client, "yes", session)
+
+    assert pending["intent"] == "booking_pending"
+    assert reply["intent"] == "payment_failed"
+
+    db = SessionLocal()
+    booking = db.query(Booking).filter(Booking.phone_number == session).one()
+    conv = db.query(Session).filter(Session.session_id == session).one()
+    assert booking.status == "PENDING"
+    assert booking.payment_last_error == "stripe down"
+    assert conv.booking_state == "CONFIRMING"
+    db.close()
@@ -0,0 +1,227 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+from sqlalchemy import func, select
+
+from database import SessionLocal, engine
+from services.engine_pool import EngineBusy, EnginePool, engine_pool
+from services.session_loader import lock_session
+
+
+def test_turns_beyond_the_limit_wait_in_line():
+
+    pool = EnginePool(max_turns=1)
+    seen = {}
+
+    async def turns():
+
+        release = asyncio.Event()
+
+        async def first():
+            async with pool.turn():
+                await release.wait()
+
+        async def second():
+            async with pool.turn():
+                seen["second_ran"] = True
+
+        tasks = [asyncio.create_task(first()), asyncio.create_task(second())]
+        await asyncio.sleep(0.01)
+        seen["during"] = pool.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        seen["after"] = pool.stats()
+
+    asyncio.run(turns())
+
+    assert seen["during"]["turns_running"] == 1
+    assert seen["during"]["turns_waiting"] == 1
+    assert seen["second_ran"]
+    assert seen["after"]["turns_waiting"] == 0
+    assert seen["after"]["max_turns_waiting"] == 1
+
+
+def test_blocking_calls_leave_the_event_loop_free():
+
+    pool = EnginePool(max_turns=2)
+
+    async def run():
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        thread_ids = await asyncio.gather(
+            pool.run(lambda: time.sleep(0.2) or threading.get_ident()),
+            pool.run(lambda: time.sleep(0.2) or threading.get_ident()),
+        )
+        task.cancel()
+        return ticks, thread_ids
+
+    started = time.monotonic()
+    ticks, thread_ids = asyncio.run(run())
+
+    assert ticks >= 5                               # the loop kept running
+    assert time.monotonic() - started < 0.35        # both calls ran side by side
+    assert threading.get_ident() not in thread_ids
+
+
+def admission_order(pool, turns):
+    """
+    Queue (key, tenant) turns behind one that holds every slot; returns
+    the order they were admitted in.
+    """
+    order = []
+
+    async def run():
+
+        release = asyncio.Event()
+
+        async def holder():
+            async with pool.turn("holder", "tenant-a"):
+                await release.wait()
+
+        async def turn(key, tenant):
+            async with pool.turn(key, tenant):
+                order.append((key, tenant))
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(holder())]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(turn(key, tenant)) for key, tenant in turns]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+
+def test_tenants_take_turns_and_a_session_keeps_its_order():
+
+    pool = EnginePool(max_turns=1)
+
+    order = admission_order(pool, [
+        ("+1555-a1", "tenant-a"),
+        ("+1555-a2", "tenant-a"),
+        ("+1555-a1", "tenant-a"),
+        ("+1555-b1", "tenant-b"),
+    ])
+
+    # tenant-b isn't stuck behind tenant-a's backlog
+    assert order == [
+        ("+1555-a1", "tenant-a"),
+        ("+1555-b1", "tenant-b"),
+        ("+1555-a2", "tenant-a"),
+        ("+1555-a1", "tenant-a"),
+    ]
+
+
+def test_one_session_never_runs_two_turns_at_once():
+
+    pool = EnginePool(max_turns=4)
+    running, overlaps = Counter(), []
+
+    def turn(key):
+        with pool.turn_sync(key, "tenant-a"):
+            running[key] += 1
+            overlaps.append(running[key])
+            time.sleep(0.02)
+            running[key] -= 1
+
+    threads = [threading.Thread(target=turn, args=(key,)) for key in ["+1555-c1"] * 3 + ["+1555-c2"] * 3]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(overlaps) == 1
+    assert time.monotonic() - started < 0.1         # the two sessions ran side by side
+
+
+def test_full_session_queue_sheds_turns():
+
+    pool = EnginePool(max_turns=1, max_queued=10, max_queued_per_session=1)
+
+    async def run():
+
+        release = asyncio.Event()
+
+        async def turn():
+            async with pool.turn("+1555-d1", "tenant-a"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(turn()), asyncio.create_task(turn())]
+        await asyncio.sleep(0.01)
+        with pytest.raises(EngineBusy):
+            async with pool.turn("+1555-d1", "tenant-a"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert pool.stats()["turns_waiting"] == 0
+
+
+def test_session_lock_holds_until_commit(client):
+
+    holder, other = SessionLocal(), SessionLocal()
+    lock_key = lambda business: func.hashtextextended(f"session:{business}:+1555-e1", 0)
+    try_lock = select(func.pg_try_advisory_xact_lock(lock_key("salon-a")))
+
+    try:
+        lock_session(holder, "salon-a", "+1555-e1")
+        assert other.execute(try_lock).scalar() is False
+        other.rollback()
+
+        # The same phone at another salon is a different session
+        assert other.execute(select(func.pg_try_advisory_xact_lock(lock_key("salon-b")))).scalar() is True
+        other.rollback()
+
+        holder.commit()
+        assert other.execute(try_lock).scalar() is True
+    finally:
+        holder.close()
+        other.close()
+
+
+def test_sync_waiter_gives_up_instead_of_holding_its_thread():
+
+    pool = EnginePool(max_turns=1, max_wait_seconds=0.05)
+    release = threading.Event()
+
+    def holder():
+        with pool.turn_sync("+1555-f1", "tenant-a"):
+            release.wait(5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    time.sleep(0.01)
+
+    try:
+        with pytest.raises(EngineBusy):
+            with pool.turn_sync("+1555-f2", "tenant-a"):
+                pass
+        assert pool.stats()["turns_waiting"] == 0
+    finally:
+        release.set()
+        thread.join()
+
+    with pool.turn_sync("+1555-f2", "tenant-a"):
+        pass
+
+
+def test_db_pool_covers_every_admitted_turn():
+
+    # Admitted turns hold their connection across the LLM call
+    assert engine.pool.size() >= engine_pool.max_turns
@@ -0,0 +1,75 @@
+from conftest import send_message
+
+from services.conversation_engine import YES_WORDS, NO_WORDS
+from services.lexical_classifier import classify_lexically
+from services import metrics
+
+
+BUSINESS_INFO = {"services": ["Haircut", "Beard Trim", "Facial"]}
+
+
+def classify(text, state="IDLE"):
+
+    return classify_lexically(text, state, BUSINESS_INFO, YES_WORDS, NO_WORDS)
+
+
+def test_confirmation_replies():
+
+    assert classify("Yes!", "CONFIRMING")["intent"] == "booking_confirm"
+
+    assert classify("nope", "CANCEL_CONFIRM")["intent"] == "booking_cancel"
+
+    # "keep" / "stop" / "please" only answer "cancel this appointment?"
+    assert classify("keep", "CANCEL_CONFIRM")["intent"] == "booking_cancel"
+    assert classify("please", "CANCEL_CONFIRM")["intent"] == "booking_confirm"
+    for state in ("CONFIRMING", "RESCHEDULE_CONFIRM"):
+        assert classify("no", state)["intent"] == "booking_cancel"
+        for word in ("keep", "stop", "please"):
+            data = classify(word, state)
+            assert data is None or data["intent"] not in {"booking_cancel", "booking_confirm"}
+
+    # YES/NO outside a confirmation question still goes to the LLM
+    assert classify("yes", "IDLE") is None
+
+
+def test_simple_intents():
+
+    assert classify("hi")["intent"] == "greeting"
+
+    assert classify("talk to a human")["intent"] == "talk_to_human"
+
+    data = classify("cancel SALON-AB12CD34")
+
+    assert data["intent"] == "booking_cancel"
+    assert data["ref_id"] == "SALON-AB12CD34"
+
+
+def test_faq_questions():
+
+    data = classify("how much is a facial?")
+
+    assert data["intent"] == "faq_pricing"
+    assert data["service"] == "Facial"
+
+    # mentions a date → LLM
+    assert classify("are you open tomorrow?") is None
+
+    # mentions booking → LLM
+    assert classify("can I book a haircut, what are your hours?") is None
+
+
+def test_fast_path_keeps_llm_shape():
+
+    data = classify("hello")
+
+    assert set(data) == {"intent", "service", "date", "time", "ref_id", "faq_topic", "confidence"}
+
+
+def test_greeting_counts_fast_path_hit(client):
+
+    hits_before = metrics.get("fast_path.hits")
+
+    reply = send_message(client, "good morning", "fast_path_user")
+
+    assert reply["intent"] != "fallback"
+    assert metrics.get("fast_path.hits") == hits_before + 1
@@ -0,0 +1,230 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from database import SessionLocal
+from models import Business, InboundMessage
+from services import inbound_queue
+from services.engine_pool import EngineBusy, engine_pool
+from services.inbound_queue import claim_next, enqueue_messages, inbound_workers
+
+
+def whatsapp_payload(phone, message_id, text="hello"):
+
+    return {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "wa-default"},
+        "messages": [{"from": phone, "id": message_id, "type": "text", "text": {"body": text}}],
+    }}]}]}
+
+
+def queued_rows(phone):
+
+    db = SessionLocal()
+    rows = db.query(InboundMessage).filter(InboundMessage.session_id == phone).order_by(InboundMessage.id).all()
+    db.close()
+    return rows
+
+
+@pytest.fixture
+def paused_workers(client):
+
+    inbound_workers.stop()
+    yield
+    inbound_workers.start()
+
+
+def test_webhook_acks_before_the_turn_and_dedupes_redeliveries(client, paused_workers):
+
+    payload = whatsapp_payload("15551240001", "wamid.queue-1")
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True) as sent:
+        first = client.post("/whatsapp/webhook", json=payload)
+        again = client.post("/whatsapp/webhook", json=payload)   # Meta redelivery
+
+        assert first.status_code == again.status_code == 200
+        assert [row.status for row in queued_rows("15551240001")] == ["queued"]
+        sent.assert_not_called()
+
+        assert inbound_workers.drain()
+
+    row, = queued_rows("15551240001")
+    assert row.status == "done"
+    assert row.reply_text
+    assert sent.call_count == 1
+
+
+def test_failed_sends_are_retried_then_dead_lettered(client, paused_workers, monkeypatch):
+
+    monkeypatch.setattr(inbound_queue, "INBOUND_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(inbound_queue, "INBOUND_RETRY_BASE_SECONDS", 0)
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=False) as sent, \
+         patch("services.inbound_queue.handle_message", wraps=inbound_queue.handle_message) as turn:
+        client.post("/whatsapp/webhook", json=whatsapp_payload("15551240002", "wamid.queue-2"))
+        assert inbound_workers.drain()
+
+    row, = queued_rows("15551240002")
+    assert row.status == "dead"
+    assert row.attempts == 2
+    assert "send failed" in row.last_error
+    assert sent.call_count == 2
+    assert turn.call_count == 1     # the retry only re-sent the stored reply
+
+
+def active_business_id():
+
+    db = SessionLocal()
+    business_id = db.query(Business).filter(Business.is_active == True).order_by(Business.created_at).first().id
+    db.close()
+    return business_id
+
+
+def test_one_sender_is_claimed_one_turn_at_a_time(client, paused_workers, monkeypatch):
+
+    monkeypatch.setattr(inbound_queue, "MESSAGE_COALESCE_WINDOW_SECONDS", 0)
+    business_id = active_business_id()
+
+    enqueue_messages([
+        {"channel": "whatsapp", "business_id": business_id, "session_id": phone, "message_id": message_id, "text": "hi"}
+        for phone, message_id in [
+            ("15551240003", "wamid.queue-3a"),
+            ("15551240003", "wamid.queue-3b"),
+            ("15551240004", "wamid.queue-4"),
+        ]
+    ])
+
+    first, second, third = SessionLocal(), SessionLocal(), SessionLocal()
+    now = datetime.now(timezone.utc)
+    try:
+        claims = [claim_next(db, now) for db in (first, second, third)]
+        claimed = [[row.message_id for row in rows] for rows in claims]
+    finally:
+        for db in (first, second, third):
+            db.close()
+
+    # 3b waits for 3a; the other sender isn't held up
+    assert claimed == [["wamid.queue-3a"], ["wamid.queue-4"], []]
+
+    # Hand the claims back (as an expired lease would) and let the workers finish
+    db = SessionLocal()
+    db.query(InboundMessage).filter(InboundMessage.status == "processing").update({"status": "queued"})
+    db.commit()
+    db.close()
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True):
+        assert inbound_workers.drain()
+
+    assert [row.status for row in queued_rows("15551240003")] == ["done", "done"]
+
+
+def test_a_burst_is_claimed_once_the_sender_goes_quiet(client, paused_workers, monkeypatch):
+
+    monkeypatch.setattr(inbound_queue, "MESSAGE_COALESCE_WINDOW_SECONDS", 0.05)
+    monkeypatch.setattr(inbound_queue, "MESSAGE_COALESCE_MAX_WAIT_SECONDS", 1)
+    business_id = active_business_id()
+
+    enqueue_messages([
+        {"channel": "whatsapp", "business_id": business_id, "session_id": "15551240005", "message_id": message_id, "text": text}
+        for message_id, text in [("wamid.queue-5a", "hi"), ("wamid.queue-5b", "haircut tomorrow 3pm")]
+    ])
+
+    db = SessionLocal()
+    try:
+        assert claim_next(db, datetime.now(timezone.utc)) == []     # still typing
+        rows = claim_next(db, datetime.now(timezone.utc) + timedelta(seconds=0.1))
+        assert [row.message_id for row in rows] == ["wamid.queue-5a", "wamid.queue-5b"]
+        db.query(InboundMessage).filter(InboundMessage.status == "processing").update({"status": "queued"})
+        db.commit()
+    finally:
+        db.close()
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True) as sent:
+        assert inbound_workers.drain()
+
+    assert sent.call_count == 1
+    assert [row.status for row in queued_rows("15551240005")] == ["done", "done"]
+
+
+def test_malformed_message_does_not_drop_the_rest_of_the_batch(client, paused_workers):
+
+    payload = whatsapp_payload("15551240006", "wamid.queue-6a")
+    messages = payload["entry"][0]["changes"][0]["value"]["messages"]
+    messages.insert(0, {"from": "15551240006", "type": "text", "text": {"body": "no id"}})
+    messages.append({"from": "15551240006", "id": "wamid.queue-6b", "type": "text", "text": {"body": "still here"}})
+
+    response = client.post("/whatsapp/webhook", json=payload)
+
+    assert response.status_code == 200
+    assert [row.message_id for row in queued_rows("15551240006")] == ["wamid.queue-6a", "wamid.queue-6b"]
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True):
+        assert inbound_workers.drain()
+
+
+def test_ack_does_not_wait_behind_busy_engine_threads(client, paused_workers):
+
+    busy = threading.Event()
+    blockers = [engine_pool._executor.submit(busy.wait, 5) for _ in range(engine_pool.max_turns)]
+
+    try:
+        started = time.monotonic()
+        response = client.post("/whatsapp/webhook", json=whatsapp_payload("15551240007", "wamid.queue-7"))
+        elapsed = time.monotonic() - started
+    finally:
+        busy.set()
+        for blocker in blockers:
+            blocker.result()
+
+    assert response.status_code == 200
+    assert elapsed < 1
+    assert [row.status for row in queued_rows("15551240007")] == ["queued"]
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True):
+        assert inbound_workers.drain()
+
+
+def test_busy_engine_requeues_without_using_up_attempts(client, paused_workers):
+
+    client.post("/whatsapp/webhook", json=whatsapp_payload("15551240008", "wamid.queue-8"))
+
+    with patch("services.inbound_queue.handle_message", side_effect=EngineBusy("turn queue full")):
+        assert inbound_queue.process_next()
+
+    row, = queued_rows("15551240008")
+    assert row.status == "queued"
+    assert row.attempts == 0
+    assert row.available_at > datetime.now(timezone.utc)
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True):
+        assert inbound_workers.drain()
+
+
+def test_crash_after_the_turn_commit_resends_the_stored_reply(client, paused_workers, monkeypatch):
+
+    monkeypatch.setattr(inbound_queue, "INBOUND_RETRY_BASE_SECONDS", 0)
+    run_turn = inbound_queue.handle_message
+
+    def turn_then_crash(*args, **kwargs):
+        run_turn(*args, **kwargs)
+        raise ConnectionError("connection lost after the turn commit")
+
+    client.post("/whatsapp/webhook", json=whatsapp_payload("15551240009", "wamid.queue-9", "what are your hours?"))
+
+    with patch("services.inbound_queue.handle_message", side_effect=turn_then_crash):
+        assert inbound_queue.process_next()
+
+    row, = queued_rows("15551240009")
+    assert row.status == "queued"
+    assert row.reply_text      # committed with the turn
+
+    with patch("channels.whatsapp.send_whatsapp_message", return_value=True) as sent, \
+         patch("services.inbound_queue.handle_message") as turn:
+        assert inbound_workers.drain()
+
+    row, = queued_rows("15551240009")
+    assert row.status == "done"
+    turn.assert_not_called()
+    assert sent.call_args.args[1] == row.reply_text
@@ -0,0 +1,150 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import SessionLocal
+from models import LLMCacheEntry
+from services import llm_cache as llm_cache_module
+from services.llm_cache import (
+    INTENT_TTL_SECONDS,
+    LLMResultCache,
+    build_cache_key,
+    get_cached_classification,
+    get_shared,
+    purge_expired_llm_cache,
+    put_shared,
+    shared_cache_key,
+    store_classification,
+)
+
+
+BUSINESS_INFO = {"timezone": "America/New_York"}
+
+
+def test_key_normalizes_text():
+
+    a = build_cache_key("Book Haircut  tomorrow 3pm!", "p1", BUSINESS_INFO)
+    b = build_cache_key("book haircut tomorrow 3pm", "p1", BUSINESS_INFO)
+    c = build_cache_key("book haircut tomorrow 3pm", "p2", BUSINESS_INFO)
+
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction_and_stats():
+
+    cache = LLMResultCache(max_entries=2)
+
+    cache.put("a", {"intent": "faq_hours", "confidence": 0.9})
+    cache.put("b", {"intent": "faq_hours", "confidence": 0.9})
+
+    assert cache.get("a")["intent"] == "faq_hours"
+
+    cache.put("c", {"intent": "faq_hours", "confidence": 0.9})
+
+    # "b" was least recently used
+    assert cache.get("b") is None
+
+    stats = cache.stats()
+
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_failures_are_not_cached():
+
+    cache = LLMResultCache(max_entries=10)
+
+    cache.put("fallback", {"intent": "fallback", "confidence": 0.9})
+    cache.put("unsure", {"intent": "booking_request", "confidence": 0.3})
+
+    assert cache.get("fallback") is None
+    assert cache.get("unsure") is None
+
+
+# -------------------------------------------------
+# Shared (Postgres) tier
+# -------------------------------------------------
+@pytest.fixture
+def shared_tier(monkeypatch):
+
+    monkeypatch.setattr(llm_cache_module, "LLM_SHARED_CACHE_ENABLED", True)
+
+    def new_process():
+        # Each worker process starts with its own empty in-memory tier
+        cache = LLMResultCache(max_entries=10)
+        monkeypatch.setattr(llm_cache_module, "llm_cache", cache)
+        return cache
+
+    return new_process
+
+
+def test_shared_tier_serves_a_cold_process(client, shared_tier):
+
+    key = build_cache_key("what time do you close", "shared-p1", BUSINESS_INFO)
+    data = {"intent": "faq_hours", "confidence": 0.9}
+
+    shared_tier()
+    db = SessionLocal()
+    store_classification(db, key, data, "shared-p1", "model-a")
+    db.commit()
+    db.close()
+
+    cold = shared_tier()
+    db = SessionLocal()
+    assert get_cached_classification(db, key) == data
+    db.close()
+
+    # Promoted with what's left of the row's TTL, not a fresh one
+    expires_at, _ = cold._entries[key]
+    assert 0 < expires_at - time.monotonic() <= INTENT_TTL_SECONDS["faq_hours"]
+    assert cold.get(key) == data
+
+
+def test_expired_shared_rows_are_ignored_and_purged(client, shared_tier):
+
+    shared_tier()
+    expired = build_cache_key("where are you located", "shared-p2", BUSINESS_INFO)
+    live = build_cache_key("where are you", "shared-p2", BUSINESS_INFO)
+    now = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    for key, expires_at in ((expired, now - timedelta(minutes=1)), (live, now + timedelta(hours=1))):
+        db.add(LLMCacheEntry(
+            cache_key=shared_cache_key(key), prompt_hash="shared-p2",
+            intent="faq_address", result_json={"intent": "faq_address", "confidence": 0.9},
+            expires_at=expires_at,
+        ))
+    db.commit()
+
+    assert get_shared(db, expired) is None
+    assert get_cached_classification(db, expired) is None
+    db.close()
+
+    assert purge_expired_llm_cache() >= 1
+
+    db = SessionLocal()
+    assert db.get(LLMCacheEntry, shared_cache_key(expired)) is None
+    assert db.get(LLMCacheEntry, shared_cache_key(live)) is not None
+    db.close()
+
+
+def test_failed_shared_write_keeps_the_callers_transaction(client, shared_tier):
+
+    shared_tier()
+    kept = build_cache_key("hello there friend", "shared-p3", BUSINESS_INFO)
+    broken = build_cache_key("hi there friend", "shared-p3", BUSINESS_INFO)
+    data = {"intent": "greeting", "confidence": 0.9}
+
+    db = SessionLocal()
+    put_shared(db, kept, data, "shared-p3", "model-a")
+    put_shared(db, broken, data, None, "model-a")   # prompt_hash NOT NULL violation
+    db.commit()
+    db.close()
+
+    db = SessionLocal()
+    assert db.get(LLMCacheEntry, shared_cache_key(kept)) is not None
+    assert db.get(LLMCacheEntry, shared_cache_key(broken)) is None
+    db.close()
@@ -0,0 +1,45 @@
+from services.llm_output_parser import parse_llm_output
+
+
+BUSINESS_INFO = {"services": ["Haircut", "Beard Trim", "Facial"]}
+
+
+def parse(raw):
+
+    return parse_llm_output(raw, BUSINESS_INFO)
+
+
+def test_valid_json_is_normalized():
+
+    data = parse('{"intent": "booking_request", "service": "haircuts", "date": "", "confidence": "0.9"}')
+
+    assert data["service"] == "Haircut"
+    assert data["date"] is None
+    assert data["confidence"] == 0.9
+    assert set(data) == {"intent", "service", "date", "time", "ref_id", "faq_topic", "confidence"}
+
+
+def test_repairs_common_defects():
+
+    fenced = '```json\n{"intent": "faq_pricing", "service": "beard trim", "confidence": 0.8,}\n```'
+    assert parse(fenced)["service"] == "Beard Trim"
+
+    chatty = "Sure! {'intent': 'greeting', 'service': None, 'confidence': 0.95} Hope that helps."
+    assert parse(chatty)["intent"] == "greeting"
+
+
+def test_rejects_unknown_intents_and_services():
+
+    assert parse('{"intent": "make_coffee", "confidence": 0.99}') is None
+
+    assert parse("not json at all") is None
+
+    data = parse('{"intent": "booking_request", "service": "Tattoo", "confidence": 0.9}')
+    assert data["service"] is None
+
+
+def test_faq_topic_follows_intent():
+
+    data = parse('{"intent": "faq_hours", "faq_topic": "weather", "confidence": 0.9}')
+
+    assert data["faq_topic"] == "hours"
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import httpx
+from groq import APITimeoutError
+
+from conftest import send_message
+from services import metrics
+
+
+def llm_timeout(*args, **kwargs):
+
+    raise APITimeoutError(request=httpx.Request("POST", "https://api.groq.com"))
+
+
+def test_deadline_falls_back_to_holding_reply(client):
+
+    fired_before = metrics.get("llm.deadline_exceeded")
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_timeout):
+
+        reply = send_message(client, "hmm not sure yet", "deadline_user_1")
+
+    assert reply["intent"] == "llm_timeout"
+    assert metrics.get("llm.deadline_exceeded") == fired_before + 1
+
+
+def test_deadline_keeps_booking_moving(client):
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_timeout):
+
+        reply = send_message(client, "facial tomorrow", "deadline_user_2")
+
+    assert reply["intent"] not in {"llm_timeout", "fallback"}
+
+
+def llm_down(*args, **kwargs):
+
+    raise RuntimeError("503 Service Unavailable")
+
+
+def test_breaker_opens_and_skips_llm(client):
+
+    from services.conversation_engine import llm_breaker
+
+    llm_breaker.reset()
+
+    try:
+        with patch("services.conversation_engine.call_llm", side_effect=llm_down) as llm:
+
+            for i in range(llm_breaker.failure_threshold):
+                send_message(client, f"hmm not sure yet {i}", "breaker_user_1")
+
+            assert llm_breaker.stats()["state"] == "open"
+            calls_when_opened = llm.call_count
+
+            # Breaker open: LLM skipped, regex extraction keeps the booking moving
+            reply = send_message(client, "facial tomorrow", "breaker_user_2")
+
+            assert llm.call_count == calls_when_opened
+            assert reply["intent"] not in {"llm_timeout", "fallback"}
+    finally:
+        llm_breaker.reset()
+
+
+def test_breaker_half_open_probe_closes_on_success():
+
+    from services.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=0)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    assert breaker.allow_request() is True      # half-open probe
+    assert breaker.allow_request() is False     # only one probe at a time
+
+    breaker.record_success(0.1)
+    assert breaker.state == "closed"
+
+
+def test_slow_calls_trip_breaker():
+
+    from services.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=1.0)
+
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+
+    assert breaker.state == "open"
+
+
+def test_abandoned_probe_does_not_keep_breaker_open():
+
+    from services.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0, probe_timeout_seconds=0.05)
+    breaker.record_failure()
+
+    assert breaker.allow_request() is True      # probe, never reports back
+    assert breaker.allow_request() is False
+
+    time.sleep(0.06)
+    assert breaker.allow_request() is True      # given up on; next call probes
+
+    breaker.release_probe()                     # e.g. cancelled
+    assert breaker.allow_request() is True
+
+
+def test_cancelled_async_probe_releases_breaker():
+
+    from services import conversation_engine
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    async def run():
+        turn = {"user_text": "book something", "start_time": time.time(), "system_prompt": SimpleNamespace(text="")}
+        task = asyncio.create_task(conversation_engine.classify_turn_async(turn, None, {}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    breaker = conversation_engine.llm_breaker
+    try:
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout_seconds   # due for a probe
+
+        with patch.object(conversation_engine, "lookup_classification", return_value=False), \
+             patch.object(conversation_engine, "call_llm_async", side_effect=hang):
+            asyncio.run(run())
+
+        assert breaker.state == "half_open"
+        assert breaker.probe_in_flight is False
+    finally:
+        breaker.reset()
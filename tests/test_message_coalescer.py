@@ -0,0 +1,38 @@
+import asyncio
+
+from services.message_coalescer import MessageCoalescer
+
+
+def test_burst_is_merged_into_one_turn():
+
+    coalescer = MessageCoalescer(window_seconds=0.05, max_wait_seconds=1)
+
+    async def burst():
+
+        async def later(delay, text, message_id):
+            await asyncio.sleep(delay)
+            return await coalescer.collect("+15550001", text, message_id)
+
+        return await asyncio.gather(
+            coalescer.collect("+15550001", "hi", "m1"),
+            later(0.01, "i want a haircut", "m2"),
+            later(0.02, "tomorrow 5pm", "m3"),
+            later(0.03, "tomorrow 5pm", "m3"),   # webhook retry
+        )
+
+    leader, *followers = asyncio.run(burst())
+
+    assert followers == [None, None, None]
+    assert leader.text == "hi\ni want a haircut\ntomorrow 5pm"
+    assert leader.message_id == "m1"
+    assert leader.coalesced_message_ids == ["m2", "m3"]
+
+
+def test_disabled_window_passes_messages_through():
+
+    coalescer = MessageCoalescer(window_seconds=0, max_wait_seconds=0)
+
+    burst = asyncio.run(coalescer.collect("+15550002", "hello", "m1"))
+
+    assert burst.text == "hello"
+    assert burst.coalesced_message_ids == []
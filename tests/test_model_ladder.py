@@ -0,0 +1,54 @@
+import json
+from unittest.mock import patch
+
+from conftest import send_message
+from services import metrics
+from services.conversation_engine import LLM_MODEL_LADDER
+
+
+def ladder_response(confidences):
+
+    def fake_call_llm(user_text, system_prompt, timeout=None, model=None):
+
+        return json.dumps({
+            "intent": "booking_request",
+            "service": "Facial",
+            "date": None,
+            "time": None,
+            "ref_id": None,
+            "faq_topic": None,
+            "confidence": confidences[model]
+        })
+
+    return fake_call_llm
+
+
+def test_low_confidence_escalates_to_next_model(client):
+
+    small, large = LLM_MODEL_LADDER[0], LLM_MODEL_LADDER[1]
+    escalations_before = metrics.get("llm.escalations")
+
+    with patch(
+        "services.conversation_engine.call_llm",
+        side_effect=ladder_response({small: 0.3, large: 0.95})
+    ) as llm:
+
+        reply = send_message(client, "umm facial i guess", "ladder_user_1")
+
+    assert [c.kwargs["model"] for c in llm.call_args_list] == [small, large]
+    assert metrics.get("llm.escalations") == escalations_before + 1
+    assert reply["intent"] not in {"fallback", "handoff"}
+
+
+def test_confident_small_model_answers_alone(client):
+
+    small, large = LLM_MODEL_LADDER[0], LLM_MODEL_LADDER[1]
+
+    with patch(
+        "services.conversation_engine.call_llm",
+        side_effect=ladder_response({small: 0.95, large: 0.95})
+    ) as llm:
+
+        send_message(client, "facial please whenever", "ladder_user_2")
+
+    assert [c.kwargs["model"] for c in llm.call_args_list] == [small]
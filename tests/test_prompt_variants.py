@@ -0,0 +1,68 @@
+import json
+import re
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from conftest import send_message
+from database import SessionLocal
+from models import Session
+from prompts import get_system_prompt
+from services.business_loader import build_business_info
+
+QUESTIONS = {
+    "could you tell me where my appointment stands": "booking_status",
+    "till when are you guys around today": "faq_hours",
+}
+
+
+def offers(system_prompt, intent):
+
+    return re.search(rf"^\d+\) {intent}$", system_prompt, re.MULTILINE) is not None
+
+
+def classify_by_question(user_text, system_prompt, timeout=None, model=None):
+
+    intent = QUESTIONS[user_text]
+    # The state's prompt has to offer the intent for the model to return it
+    assert offers(system_prompt, intent)
+
+    return json.dumps({
+        "intent": intent, "service": None, "date": None, "time": None,
+        "ref_id": None, "faq_topic": None, "confidence": 0.95,
+    })
+
+
+def put_session_in(phone, state):
+
+    db = SessionLocal()
+    session = db.query(Session).filter(Session.session_id == phone).one()
+    session.booking_state = state
+    session.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize("state", ["CONFIRMING", "CANCEL_CONFIRM"])
+def test_status_and_faq_questions_are_answered_while_confirming(client, state):
+
+    phone = f"variant_user_{state.lower()}"
+    send_message(client, "hello", phone)
+
+    db = SessionLocal()
+    prompt = get_system_prompt(build_business_info(db), state).text
+    db.close()
+    for intent in QUESTIONS.values():
+        assert offers(prompt, intent)
+
+    for text, intent in QUESTIONS.items():
+        put_session_in(phone, state)
+        with patch("services.conversation_engine.call_llm", side_effect=classify_by_question):
+            reply = send_message(client, text, phone)
+
+        assert reply["intent"] == intent
+
+    db = SessionLocal()
+    assert db.query(Session).filter(Session.session_id == phone).one().fail_count == 0
+    db.close()
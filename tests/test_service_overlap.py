@@ -0,0 +1,198 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import send_message
+from database import SessionLocal
+from models import Booking, Session
+from services.booking_service import (
+    create_pending_booking,
+    is_slot_taken,
+    list_open_slots,
+    move_booking,
+    set_booking_slot,
+    suggest_slots_around,
+)
+from services.business_loader import build_business_info, service_durations
+
+
+def next_weekday(days_ahead):
+
+    day = datetime.now(timezone.utc).date() + timedelta(days=days_ahead)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day.isoformat()
+
+
+def test_plain_service_names_take_one_slot():
+
+    assert service_durations(["Haircut", {"name": "Facial", "duration_minutes": 60}], 30) == {
+        "Haircut": 30,
+        "Facial": 60,
+    }
+
+
+def test_long_service_blocks_the_slots_it_runs_into(client):
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    day = next_weekday(80)
+
+    facial = create_pending_booking(
+        db, business_info, id="OVERLAP-1", phone_number="overlap_user_a",
+        business_id=business_info["id"], service="Facial", date=day, time="10:00",
+    )
+    haircut = create_pending_booking(
+        db, business_info, id="OVERLAP-2", phone_number="overlap_user_b",
+        business_id=business_info["id"], service="Haircut", date=day, time="10:30",
+    )
+    after = create_pending_booking(
+        db, business_info, id="OVERLAP-3", phone_number="overlap_user_c",
+        business_id=business_info["id"], service="Haircut", date=day, time="11:00",
+    )
+
+    assert facial.slot_end - facial.slot_start == timedelta(minutes=60)
+    assert haircut is None
+    assert after is not None
+
+    db.rollback()
+    db.close()
+
+
+def test_checks_and_suggestions_skip_overlapping_windows(client):
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    day = next_weekday(81)
+
+    booking = Booking(
+        id="OVERLAP-4", phone_number="overlap_user_d", business_id=business_info["id"],
+        service="Facial", status="CONFIRMED",
+    )
+    set_booking_slot(booking, day, "10:00", business_info)
+    db.add(booking)
+    db.commit()
+
+    assert is_slot_taken(db, business_info, day, "10:30", service="Haircut")
+    assert not is_slot_taken(db, business_info, day, "09:30", service="Haircut")
+    assert is_slot_taken(db, business_info, day, "09:30", service="Facial")
+    assert not is_slot_taken(db, business_info, day, "10:30", service="Facial", ignore=booking)
+
+    suggestions = suggest_slots_around(db, business_info, day, "10:30", count=4, service="Facial")
+    assert suggestions["same_day"] == ["11:00", "11:30", "09:00", "12:00"]
+
+    open_slots = list_open_slots(db, business_info, [day], datetime.now(timezone.utc), "Facial")
+    assert {"09:30", "10:00", "10:30"}.isdisjoint(open_slots[day])
+    assert {"09:00", "11:00"} <= set(open_slots[day])
+
+    db.close()
+
+
+def test_reschedule_into_overlapping_window_is_refused(client):
+
+    send_message(client, "hello", "overlap_user_e")
+
+    day = next_weekday(82)
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+
+    own = Booking(
+        id="OVERLAP-OWN", phone_number="overlap_user_e", business_id=business_info["id"],
+        service="Haircut", status="CONFIRMED",
+    )
+    other = Booking(
+        id="OVERLAP-OTHER", phone_number="overlap_user_f", business_id=business_info["id"],
+        service="Facial", status="CONFIRMED",
+    )
+    set_booking_slot(own, day, "09:00", business_info)
+    set_booking_slot(other, day, "13:00", business_info)
+    db.add_all([own, other])
+
+    session = db.get(Session, (own.business_id, "overlap_user_e"))
+    session.booking_state = "RESCHEDULE_CONFIRM"
+    session.reschedule_target_booking_id = own.id
+    session.reschedule_new_date = day
+    session.reschedule_new_time = "13:30"
+    db.commit()
+    db.close()
+
+    reply = send_message(client, "yes", "overlap_user_e")
+
+    db = SessionLocal()
+    own = db.get(Booking, "OVERLAP-OWN")
+    db.close()
+
+    assert reply["intent"] == "reschedule_unavailable"
+    assert own.time == "09:00"
+
+
+def test_engine_refuses_haircut_inside_a_facial(client):
+
+    day = next_weekday(83)
+
+    def llm_slot(service, time):
+        def llm(*args, **kwargs):
+            return json.dumps({
+                "intent": "booking_request",
+                "service": service,
+                "date": day,
+                "time": time,
+                "ref_id": None,
+                "faq_topic": None,
+                "confidence": 0.99,
+            })
+        return llm
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_slot("Facial", "15:00")):
+        first = send_message(client, f"facial {day} 15:00", "overlap_user_g")
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_slot("Haircut", "15:30")):
+        second = send_message(client, f"haircut {day} 15:30", "overlap_user_h")
+
+    assert first["intent"] == "booking_pending"
+    assert second["intent"] == "booking_unavailable"
+
+
+def test_overlapping_writes_fail_without_the_service(client):
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    day = next_weekday(84)
+
+    # Plain ORM writes, no helper: the database refuses the overlap itself
+    facial = Booking(
+        id="OVERLAP-RAW-1", phone_number="overlap_user_g", business_id=business_info["id"],
+        service="Facial", status="CONFIRMED",
+    )
+    set_booking_slot(facial, day, "10:00", business_info)
+    db.add(facial)
+    db.commit()
+
+    haircut = Booking(
+        id="OVERLAP-RAW-2", phone_number="overlap_user_h", business_id=business_info["id"],
+        service="Haircut", status="PENDING",
+    )
+    set_booking_slot(haircut, day, "10:30", business_info)
+    db.add(haircut)
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    # Moving a booking into the window is refused the same way
+    moved = Booking(
+        id="OVERLAP-RAW-3", phone_number="overlap_user_h", business_id=business_info["id"],
+        service="Haircut", status="PENDING",
+    )
+    set_booking_slot(moved, day, "11:00", business_info)
+    db.add(moved)
+    db.commit()
+
+    assert move_booking(db, moved, day, "10:30", business_info) is False
+    assert move_booking(db, moved, day, "11:30", business_info) is True
+    db.commit()
+
+    db.close()
@@ -0,0 +1,50 @@
+import json
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from conftest import send_message
+from database import engine
+
+
+def test_single_statement_before_llm_call(client):
+
+    statements = []
+    seen_before_llm = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def fake_call_llm(*args, **kwargs):
+        seen_before_llm.extend(statements)
+        return json.dumps({
+            "intent": "greeting",
+            "service": None,
+            "date": None,
+            "time": None,
+            "ref_id": None,
+            "faq_topic": None,
+            "confidence": 0.99
+        })
+
+    send_message(client, "hi", "bootstrap_user_1")
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with patch("services.conversation_engine.call_llm", side_effect=fake_call_llm):
+            send_message(client, "yo what's up with you guys", "bootstrap_user_1")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    session_statements = [s for s in seen_before_llm if "sessions" in s]
+
+    # Session + ConversationSession + Business + bookings: one statement
+    assert len(session_statements) == 1
+    assert "active_business" in session_statements[0]
+
+
+def test_first_message_creates_session_rows(client):
+
+    reply = send_message(client, "hello", "bootstrap_user_2")
+
+    assert reply["intent"] == "greeting"
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+from models import Booking
+from services.booking_service import suggest_slots_around
+from services.business_loader import build_business_info
+
+
+def test_suggestions_use_one_query_and_skip_booked_slots(client):
+
+    day = (datetime.now(timezone.utc) + timedelta(days=50)).date()
+    next_day = day + timedelta(days=1)
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+
+    # Whole morning of `day` (except 11:00) and first slot of the next day are taken
+    taken = [(day, t) for t in ("09:00", "09:30", "10:00", "10:30", "11:30")]
+    taken.append((next_day, "09:00"))
+    for i, (d, t) in enumerate(taken):
+        db.add(Booking(
+            id=f"SUGGEST-{i}", phone_number=f"suggest_user_{i}",
+            business_id=business_info["id"], service="Haircut",
+            date=d.isoformat(), time=t, status="CONFIRMED",
+        ))
+    db.flush()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        around = suggest_slots_around(db, business_info, day.isoformat(), "10:00", count=3)
+        closing = suggest_slots_around(db, business_info, day.isoformat(), "23:00", count=3)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    db.rollback()
+    db.close()
+
+    assert len(statements) == 2
+    assert around["same_day"] == ["11:00", "12:00", "12:30"]
+    assert "09:00" not in closing["next_day"]
+    assert closing["next_day"][0] == "09:30"
@@ -0,0 +1,189 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from conftest import send_message
+from database import SessionLocal, engine
+from models import Booking, Business, Session
+from services.booking_service import create_pending_booking
+from services.business_loader import build_business_info
+
+
+def next_weekday(days_ahead):
+
+    day = datetime.now(timezone.utc).date() + timedelta(days=days_ahead)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day.isoformat()
+
+
+def test_second_hold_on_same_slot_is_rejected(client):
+
+    db = SessionLocal()
+    business_info = build_business_info(db)
+    day = next_weekday(40)
+
+    first = create_pending_booking(
+        db, business_info, id="SLOT-TEST-1", phone_number="slot_user_a",
+        business_id=business_info["id"], service="Haircut", date=day, time="11:30",
+    )
+    second = create_pending_booking(
+        db, business_info, id="SLOT-TEST-2", phone_number="slot_user_b",
+        business_id=business_info["id"], service="Haircut", date=day, time="11:30",
+    )
+
+    assert first is not None and first.status == "PENDING"
+    assert second is None
+
+    db.rollback()
+    db.close()
+
+
+def test_taken_slot_gets_suggestions(client):
+
+    day = next_weekday(41)
+
+    def llm_slot(*args, **kwargs):
+        return json.dumps({
+            "intent": "booking_request",
+            "service": "Haircut",
+            "date": day,
+            "time": "10:30",
+            "ref_id": None,
+            "faq_topic": None,
+            "confidence": 0.99,
+        })
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_slot):
+
+        first = send_message(client, f"haircut {day} 10:30", "slot_user_c")
+        second = send_message(client, f"haircut {day} 10:30", "slot_user_d")
+
+    assert first["intent"] == "booking_pending"
+    assert second["intent"] == "booking_unavailable"
+
+
+def test_reschedule_into_slot_taken_meanwhile(client):
+
+    send_message(client, "hello", "slot_user_e")
+
+    day = next_weekday(42)
+
+    db = SessionLocal()
+    business = db.query(Business).filter(Business.is_active == True).first()
+    business_id = business.id
+
+    own = Booking(
+        id="SLOT-TEST-OWN", phone_number="slot_user_e", business_id=business.id,
+        service="Haircut", date=day, time="09:30", status="CONFIRMED",
+    )
+    # Another customer grabs the target slot after the proposal was accepted
+    other = Booking(
+        id="SLOT-TEST-OTHER", phone_number="slot_user_f", business_id=business.id,
+        service="Haircut", date=day, time="13:30", status="CONFIRMED",
+    )
+    db.add_all([own, other])
+
+    session = db.get(Session, (business_id, "slot_user_e"))
+    session.booking_state = "RESCHEDULE_CONFIRM"
+    session.reschedule_target_booking_id = own.id
+    session.reschedule_new_date = day
+    session.reschedule_new_time = "13:30"
+    db.commit()
+    db.close()
+
+    reply = send_message(client, "yes", "slot_user_e")
+
+    db = SessionLocal()
+    own = db.get(Booking, "SLOT-TEST-OWN")
+    session = db.get(Session, (business_id, "slot_user_e"))
+    db.close()
+
+    assert reply["intent"] == "reschedule_unavailable"
+    assert own.time == "09:30"
+    assert session.booking_state == "RESCHEDULE_COLLECTING"
+
+
+def test_losing_the_new_slot_keeps_the_earlier_hold(client):
+
+    day = next_weekday(43)
+    requested = {"time": "10:30"}
+
+    def llm_slot(*args, **kwargs):
+        return json.dumps({
+            "intent": "booking_request",
+            "service": "Haircut",
+            "date": day,
+            "time": requested["time"],
+            "ref_id": None,
+            "faq_topic": None,
+            "confidence": 0.99,
+        })
+
+    with patch("services.conversation_engine.call_llm", side_effect=llm_slot):
+        first = send_message(client, f"haircut {day} 10:30", "slot_user_h")
+
+        db = SessionLocal()
+        business_info = build_business_info(db)
+        taken = create_pending_booking(
+            db, business_info, id="SLOT-TEST-TAKEN", phone_number="slot_user_i",
+            business_id=business_info["id"], service="Haircut", date=day, time="11:30",
+        )
+        db.commit()
+        db.close()
+
+        requested["time"] = "11:30"
+        second = send_message(client, f"actually haircut {day} 11:30", "slot_user_h")
+
+    assert first["intent"] == "booking_pending"
+    assert taken is not None
+    assert second["intent"] == "booking_unavailable"
+
+    db = SessionLocal()
+    holds = db.query(Booking).filter(Booking.phone_number == "slot_user_h").all()
+    assert [(b.time, b.status) for b in holds] == [("10:30", "PENDING")]
+    db.close()
+
+
+def test_concurrent_overlapping_holds_one_wins(client):
+
+    day = next_weekday(47)
+    first_db, second_db = SessionLocal(), SessionLocal()
+    business_info = build_business_info(first_db)
+
+    statements = []
+    first_conn = first_db.connection()   # not the background queue workers'
+
+    def record(conn, cursor, statement, *args):
+        if conn is first_conn:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        first = create_pending_booking(
+            first_db, business_info, id="SLOT-TEST-RACE-1", phone_number="slot_user_j",
+            business_id=business_info["id"], service="Facial", date=day, time="10:00",
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # The second writer blocks on the first's uncommitted row, then loses
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        second = pool.submit(
+            create_pending_booking,
+            second_db, business_info, id="SLOT-TEST-RACE-2", phone_number="slot_user_k",
+            business_id=business_info["id"], service="Haircut", date=day, time="10:30",
+        )
+        first_db.commit()
+        second = second.result(timeout=10)
+
+    assert first is not None
+    assert [s.split()[0] for s in statements] == ["INSERT"]
+    assert second is None
+
+    second_db.rollback()
+    first_db.close()
+    second_db.close()
@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from prompts import get_system_prompt, invalidate_system_prompt
+
+
+BUSINESS_INFO = {
+    "id": "prompt-test-business",
+    "name": "Test Salon",
+    "timezone": "America/New_York",
+    "services": ["Haircut", "Facial"],
+    "business_hours": {"start": "09:00", "end": "19:00"},
+    "config_version": 1,
+}
+
+
+def test_prompt_is_memoized_per_config_version():
+
+    invalidate_system_prompt()
+    first = get_system_prompt(BUSINESS_INFO)
+
+    # A hit doesn't serialize, hash or render anything
+    with patch("prompts.business_fingerprint") as fingerprint, patch("prompts.render_system_prompt") as render:
+        assert get_system_prompt(BUSINESS_INFO) is first
+    fingerprint.assert_not_called()
+    render.assert_not_called()
+
+    assert first.token_count > 0
+
+    edited = {**BUSINESS_INFO, "name": "Renamed Salon", "config_version": 2}
+    assert "Renamed Salon" in get_system_prompt(edited).text
+
+
+def test_prompt_without_version_follows_the_config():
+
+    info = {key: value for key, value in BUSINESS_INFO.items() if key != "config_version"}
+    invalidate_system_prompt()
+
+    first = get_system_prompt(info)
+    assert get_system_prompt(dict(info)) is first
+    assert "Renamed Salon" in get_system_prompt({**info, "name": "Renamed Salon"}).text
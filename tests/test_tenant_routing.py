@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+from models import Business, Session
+from services.business_loader import business_config_cache
+from services.inbound_queue import inbound_workers
+
+
+@pytest.fixture
+def second_business(client):
+
+    db = SessionLocal()
+    default = db.query(Business).filter(Business.is_active == True).order_by(Business.created_at).first()
+
+    business = Business(
+        name="Uptown Salon",
+        type=default.type,
+        timezone=default.timezone,
+        slot_duration_minutes=default.slot_duration_minutes,
+        same_day_cutoff_hour=default.same_day_cutoff_hour,
+        business_hours=default.business_hours,
+        services=default.services,
+        sms_number="+15550009001",
+        whatsapp_phone_number_id="wa-9001",
+    )
+    db.add(business)
+    db.commit()
+    default_id, business_id = default.id, business.id
+    db.close()
+
+    yield default_id, business_id
+
+    # Back to a single routed-nowhere salon for the other tests
+    db = SessionLocal()
+    business = db.get(Business, business_id)
+    business.is_active = False
+    business.sms_number = None
+    business.whatsapp_phone_number_id = None
+    db.commit()
+    db.close()
+    business_config_cache.reload()
+
+
+def sessions_of(phone):
+
+    db = SessionLocal()
+    rows = {s.business_id: s.booking_state for s in db.query(Session).filter(Session.session_id == phone)}
+    db.close()
+    return rows
+
+
+def test_sms_to_a_salon_number_opens_that_salons_session(client, second_business):
+
+    default_id, business_id = second_business
+
+    response = client.post("/sms/webhook", data={
+        "From": "+15551230001", "To": "+15550009001", "Body": "hello", "MessageSid": "SM-route-1",
+    })
+    client.post("/chat", json={"session_id": "+15551230001", "text": "hello", "message_id": "web-route-1"})
+
+    assert response.status_code == 200
+    assert set(sessions_of("+15551230001")) == {default_id, business_id}
+
+
+def test_unknown_number_is_dropped_once_routing_is_set_up(client, second_business):
+
+    response = client.post("/sms/webhook", data={
+        "From": "+15551230002", "To": "+15550000000", "Body": "hello", "MessageSid": "SM-route-2",
+    })
+
+    assert response.status_code == 200
+    assert sessions_of("+15551230002") == {}
+
+
+def test_whatsapp_routes_by_phone_number_id_and_replies_from_it(client, second_business):
+
+    _, business_id = second_business
+
+    payload = {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "wa-9001"},
+        "messages": [{"from": "15551230003", "id": "wamid.route-3", "type": "text", "text": {"body": "hello"}}],
+    }}]}]}
+
+    with patch("channels.whatsapp.send_whatsapp_message") as sent:
+        client.post("/whatsapp/webhook", json=payload)
+        assert inbound_workers.drain()
+
+    assert set(sessions_of("15551230003")) == {business_id}
+    assert sent.call_args.args[2] == "wa-9001"
+
+
+def test_route_lookup_is_served_from_memory(client, second_business):
+
+    db = SessionLocal()
+    business_config_cache.route(db, "sms", "+15550009001")
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        config = business_config_cache.route(db, "sms", "+15550009001")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    db.close()
+
+    assert config.id == str(second_business[1])
+    assert statements == []
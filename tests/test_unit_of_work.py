@@ -0,0 +1,31 @@
+from conftest import send_message
+from services import metrics
+
+
+def test_each_turn_commits_once(client):
+
+    turns_before = metrics.get("turns")
+    commits_before = metrics.get("turns.commits")
+
+    send_message(client, "hello", "uow_user_1")
+    send_message(client, "what are your hours?", "uow_user_1")
+    send_message(client, "I want a haircut", "uow_user_1")
+    send_message(client, "talk to a human", "uow_user_1")
+
+    turns = metrics.get("turns") - turns_before
+    commits = metrics.get("turns.commits") - commits_before
+
+    assert turns == 4
+    assert commits == turns
+
+
+def test_duplicate_message_is_not_committed(client):
+
+    send_message(client, "hi", "uow_user_2")
+
+    commits_before = metrics.get("turns.commits")
+
+    reply = send_message(client, "hi", "uow_user_2")
+
+    assert reply["intent"] == "ignored"
+    assert metrics.get("turns.commits") == commits_before
@@ -1,13 +1,12 @@
 from zoneinfo import ZoneInfo
 from datetime import datetime, timezone
-from models import Business
 
-def booking_to_datetime(db, booking):
-    business = db.query(Business).filter(
-        Business.id == booking.business_id
-    ).first()
+def booking_to_datetime(booking, business_info: dict):
+    if booking.slot_start is not None:
+        return booking.slot_start.astimezone(timezone.utc)
 
-    local_tz = ZoneInfo(business.timezone)
+    # Rows the slot_start backfill couldn't parse
+    local_tz = ZoneInfo(business_info["timezone"])
 
     dt_str = f"{booking.date} {booking.time}"
     local_dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
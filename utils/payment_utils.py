@@ -21,7 +21,7 @@ def refund_booking(booking: Booking):
 def expire_payment_if_needed(booking: Booking, db, now: datetime) -> bool:
     """
     Expires a pending payment if timeout passed.
-    Returns True if booking was expired.
+    Returns True if booking was expired. The caller commits.
     """
 
     # Only care about unpaid, payment-required bookings
@@ -50,5 +50,4 @@ def expire_payment_if_needed(booking: Booking, db, now: datetime) -> bool:
     if booking.stripe_payment_intent_id:
         refund_booking(booking)
 
-    db.commit()
     return True
\ No newline at end of file